@@ -0,0 +1,287 @@
+# backend/benchmarks/run.py
+"""
+Offline micro-benchmarks for the serving hot paths.
+
+    python -m backend.benchmarks.run --scale small --output bench_results.json
+    python -m backend.benchmarks.run --data-dir /tmp/bench --compare old.json
+
+Generates (or reuses) a synthetic dataset/index/model under --data-dir, then times
+service construction, per-request latency and batch throughput, and records peak
+traced memory. Results are written as JSON with the git commit and library versions,
+so two runs can be compared with --compare.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .synthetic import INFO_FILE, SCALES, generate
+
+
+def _stats(samples_s: List[float]) -> Dict[str, float]:
+    a = np.asarray(samples_s) * 1000.0
+    return {
+        "n": int(len(a)),
+        "mean_ms": round(float(a.mean()), 4),
+        "p50_ms": round(float(np.percentile(a, 50)), 4),
+        "p90_ms": round(float(np.percentile(a, 90)), 4),
+        "p99_ms": round(float(np.percentile(a, 99)), 4),
+        "min_ms": round(float(a.min()), 4),
+    }
+
+
+def time_calls(fn: Callable[[int], Any], n: int, warmup: int = 5) -> Dict[str, float]:
+    """Latency of `fn(i)` over n calls (after `warmup` untimed calls)."""
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t0)
+    return _stats(samples)
+
+
+def peak_memory(fn: Callable[[], Any]) -> Dict[str, Any]:
+    """Wall time and peak traced allocation of one call."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        fn()
+    finally:
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"traced_seconds": round(elapsed, 4), "peak_mib": round(peak / 2**20, 2)}
+
+
+class Bench:
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.results: List[Dict[str, Any]] = []
+
+    def add(self, group: str, name: str, **values) -> None:
+        self.results.append({"group": group, "name": name, **values})
+        shown = ", ".join(f"{k}={v}" for k, v in values.items() if k in ("seconds", "p50_ms", "p99_ms", "rps", "peak_mib", "max_rss_mib"))
+        print(f"  {group:12s} {name:40s} {shown}", flush=True)
+
+    def construct(self, name: str, fn: Callable[[], Any]) -> Any:
+        t0 = time.perf_counter()
+        obj = fn()
+        values: Dict[str, Any] = {"seconds": round(time.perf_counter() - t0, 4)}
+        if self.memory:
+            values.update(peak_memory(fn))
+        self.add("construction", name, **values)
+        return obj
+
+    def latency(self, name: str, fn: Callable[[int], Any], n: int, warmup: int = 5) -> None:
+        self.add("latency", name, **time_calls(fn, n, warmup))
+
+    def throughput(self, name: str, fn: Callable[[], Any], n_items: int, repeat: int = 3) -> None:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        self.add("throughput", name, items=n_items, seconds=round(best, 4), rps=round(n_items / best, 1))
+
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _environment() -> Dict[str, Any]:
+    import pandas
+    import sklearn
+
+    return {
+        "git_sha": _git_sha(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _requests(route_index: Dict[str, list], n: int, seed: int = 0) -> List[Any]:
+    """Random segments (two stops of one route) at random weekday/hour."""
+    from ..schemas.route_eta import RouteEtaRequest
+
+    rng = random.Random(seed)
+    keys = [k for k, stops in route_index.items() if len(stops) >= 2]
+    out = []
+    for _ in range(n):
+        key = rng.choice(keys)
+        stops = route_index[key]
+        i, j = sorted(rng.sample(range(len(stops)), 2))
+        out.append(RouteEtaRequest(
+            route_short_name=key,
+            from_stop_id=int(stops[i]["stop_id"]),
+            to_stop_id=int(stops[j]["stop_id"]),
+            timestamp_iso=f"2026-01-{rng.randint(5, 11):02d}T{rng.randint(5, 22):02d}:{rng.randint(0, 59):02d}:00",
+        ))
+    return out
+
+
+def run(data: Dict[str, Any], n: int = 200, batch_size: int = 500, memory: bool = True) -> List[Dict[str, Any]]:
+    from ..models.prediction import PredictionModel
+    from ..services.ai_routing import AIRoutingService
+    from ..services.eta import ETAService
+    from ..utils.array_store import remove_dir
+    from ..utils.preprocessing import build_feature_vector, get_route_encoder
+    from ..utils.response_cache import ResponseCache
+    from ..utils.route_index import find_nearest_stop, load_route_index
+    from ..utils.spatial_index import StopSpatialIndex
+
+    import sklearn.ensemble  # noqa: F401  (keep the import cost out of the first model load)
+
+    bench = Bench(memory=memory)
+    no_cache = lambda: ResponseCache(maxsize=0)  # noqa: E731
+    work = Path(tempfile.mkdtemp(prefix="routeminds-bench-"))
+    try:
+        # ----- construction -----
+        snapshot = work / "snapshot"
+        bench.construct("eta_service.csv", lambda: (remove_dir(snapshot),
+                                                    ETAService(data["csv_path"], str(snapshot)))[1])
+        eta = bench.construct("eta_service.snapshot", lambda: ETAService(data["csv_path"], str(snapshot)))
+
+        json_index = work / "route_index.json"
+        index = load_route_index(data["index_path"])
+        with open(json_index, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        for label, path in (("npz", data["index_path"]), ("json", str(json_index))):
+            bench.construct(f"route_index.{label}",
+                            lambda path=path: (load_route_index.cache_clear(), load_route_index(path))[1])
+        load_route_index.cache_clear()
+        index = load_route_index(data["index_path"])
+        spatial = bench.construct("spatial_index", lambda: StopSpatialIndex(index))
+
+        model_dir = Path(data["model_dir"]) if data.get("model_dir") else None
+        routing = None
+        if model_dir is not None:
+            paths = (str(model_dir / "trained_model.pkl"), str(model_dir / "route_label_encoder.pkl"))
+            model = bench.construct("prediction_model.sklearn", lambda: PredictionModel(*paths, engine="sklearn"))
+            compiled = bench.construct("prediction_model.compiled", lambda: PredictionModel(*paths, engine="compiled"))
+            routing = bench.construct("ai_routing_service", lambda: AIRoutingService(
+                model_wrapper=model, index_path=data["index_path"], cache=no_cache()))
+
+        # ----- per-request latency -----
+        reqs = _requests(index, max(n, batch_size))
+        eta.cache = no_cache()
+        bench.latency("eta.get_eta", lambda i: eta.get_eta(reqs[i % n]), n)
+        eta.cache = ResponseCache()
+        bench.latency("eta.get_eta.cached", lambda i: eta.get_eta(reqs[i % 10]), n, warmup=10)
+
+        if routing is not None:
+            bench.latency("ai_routing.compute_route_eta", lambda i: routing.compute_route_eta(reqs[i % n]), n)
+            routing_compiled = AIRoutingService(model_wrapper=compiled, index_path=data["index_path"], cache=no_cache())
+            bench.latency("ai_routing.compute_route_eta.compiled",
+                          lambda i: routing_compiled.compute_route_eta(reqs[i % n]), n)
+            routing.cache = ResponseCache()
+            bench.latency("ai_routing.compute_route_eta.cached",
+                          lambda i: routing.compute_route_eta(reqs[i % 10]), n, warmup=10)
+            routing.cache = no_cache()
+
+        rng = np.random.default_rng(0)
+        keys = list(index)
+        coords = [(float(28.61 + rng.uniform(-0.15, 0.15)), float(77.21 + rng.uniform(-0.15, 0.15))) for _ in range(n)]
+        bench.latency("find_nearest_stop", lambda i: find_nearest_stop(coords[i % n], index[keys[i % len(keys)]]), n)
+        bench.latency("spatial_index.nearest", lambda i: spatial.nearest(coords[i % n], k=5), n)
+        bench.latency("spatial_index.nearest_on_route",
+                      lambda i: spatial.nearest_on_route(keys[i % len(keys)], coords[i % n]), n)
+        # build_feature_vector encodes with the active model's encoder (model registry), not the synthetic one
+        encoder = get_route_encoder()
+        route = str(encoder.classes_[0]) if encoder is not None else "1"
+        feature_reqs = [{"route_short_name": route, "stop_sequence": 3, "day_of_week": i % 7,
+                         "hour_of_day": 8, "holiday_flag": 0, "stop_lat": 28.6, "stop_lon": 77.2} for i in range(n)]
+        bench.latency("build_feature_vector", lambda i: build_feature_vector(feature_reqs[i % n]), n)
+
+        # ----- batch throughput -----
+        batch = reqs[:batch_size]
+        bench.throughput("eta.get_eta.loop", lambda: [eta.get_eta(r) for r in batch], len(batch))
+        if routing is not None:
+            bench.throughput("ai_routing.compute_route_eta.loop",
+                             lambda: [routing.compute_route_eta(r) for r in batch], len(batch))
+            bench.throughput("ai_routing.compute_route_eta_batch",
+                             lambda: routing.compute_route_eta_batch(batch), len(batch))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    try:
+        import resource
+
+        bench.add("memory", "process.max_rss", max_rss_mib=round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10), 1))
+    except ImportError:
+        pass
+    return bench.results
+
+
+def compare(current: List[Dict[str, Any]], baseline_path) -> None:
+    """Print new/old ratios of each benchmark's headline metric (p50 latency, rps, seconds, RSS)."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["group"], r["name"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}:")
+    for r in current:
+        old = baseline.get((r["group"], r["name"]))
+        metric = next((m for m in ("p50_ms", "rps", "seconds", "max_rss_mib") if m in r), None)
+        if old is None or metric is None or not old.get(metric):
+            continue
+        print(f"  {r['group']:12s} {r['name']:40s} {metric} {old[metric]} -> {r[metric]} ({r[metric] / old[metric]:.2f}x)")
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="RouteMinds micro-benchmarks")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--data-dir", help="synthetic data directory (reused if it already has data)")
+    parser.add_argument("--requests", type=int, default=200, help="timed calls per latency benchmark")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc construction runs")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    data_dir = Path(args.data_dir or Path(tempfile.gettempdir()) / f"routeminds-bench-{args.scale}")
+    info_path = data_dir / INFO_FILE
+    if info_path.exists():
+        with open(info_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        print(f"Generating {args.scale} synthetic data in {data_dir} ...", flush=True)
+        data = generate(data_dir, args.scale)  # also writes INFO_FILE for the next run
+
+    print(f"Benchmarking ({data['rows']} rows, {data['routes']} routes)", flush=True)
+    results = run(data, n=args.requests, batch_size=args.batch_size, memory=not args.no_memory)
+    report = {"environment": _environment(), "scale": args.scale, "dataset": data, "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main()
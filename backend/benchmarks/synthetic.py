@@ -0,0 +1,185 @@
+# backend/benchmarks/synthetic.py
+"""
+Synthetic GTFS-style data for offline benchmarks.
+
+Writes a `bus_delay_dataset.csv` with the processed-dataset columns, the columnar route
+index built from it (scripts/make_route_index.py) and, optionally, a small model version
+trained on it, so every service can be constructed without the real feed. `dataset.json`
+describes what was written; benchmarks/run.py reuses a directory that has one.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+# name -> (routes, stops per route, trips per route); rows = routes * stops * trips
+SCALES = {
+    "tiny": (5, 10, 4),
+    "small": (50, 25, 20),
+    "medium": (300, 40, 40),
+    "large": (1500, 50, 60),
+}
+
+INFO_FILE = "dataset.json"
+CENTER = (28.61, 77.21)  # Delhi
+
+
+def generate_dataset(
+    out_dir,
+    n_routes: int,
+    stops_per_route: int,
+    trips_per_route: int,
+    seed: int = 0,
+    shared_stop_ratio: float = 0.2,
+) -> Dict[str, Any]:
+    """
+    Routes are jittered lines through a ~30 km square; `shared_stop_ratio` of each
+    route's stops are drawn from a common pool so routes intersect (transfers, spatial
+    queries). Trips are spread over the week and service day; delays follow a
+    peak-hour + per-route + noise model so trained models have something to learn.
+    """
+    rng = np.random.default_rng(seed)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    n_pool = max(1, n_routes * stops_per_route // 10)
+    pool_lat = CENTER[0] + rng.uniform(-0.15, 0.15, n_pool)
+    pool_lon = CENTER[1] + rng.uniform(-0.15, 0.15, n_pool)
+
+    # per route: stop ids/coords in travel order
+    route_stop_ids = np.empty((n_routes, stops_per_route), dtype=np.int64)
+    route_lat = np.empty((n_routes, stops_per_route))
+    route_lon = np.empty((n_routes, stops_per_route))
+    for r in range(n_routes):
+        start = np.array(CENTER) + rng.uniform(-0.12, 0.12, 2)
+        heading = rng.uniform(0, 2 * np.pi)
+        steps = np.arange(stops_per_route) * 0.004
+        lat = start[0] + steps * np.sin(heading) + rng.normal(0, 0.0005, stops_per_route)
+        lon = start[1] + steps * np.cos(heading) + rng.normal(0, 0.0005, stops_per_route)
+        ids = 1_000_000 + r * stops_per_route + np.arange(stops_per_route)
+        shared = rng.random(stops_per_route) < shared_stop_ratio
+        picks = rng.integers(0, n_pool, stops_per_route)
+        ids = np.where(shared, 500_000 + picks, ids)
+        lat = np.where(shared, pool_lat[picks], lat)
+        lon = np.where(shared, pool_lon[picks], lon)
+        route_stop_ids[r], route_lat[r], route_lon[r] = ids, lat, lon
+
+    route_effect = rng.normal(0, 2.0, n_routes)
+    # trips: start minute of day and day of week
+    trip_start = rng.integers(5 * 60, 22 * 60, (n_routes, trips_per_route))
+    trip_dow = rng.integers(0, 7, (n_routes, trips_per_route))
+    trip_holiday = (rng.random((n_routes, trips_per_route)) < 0.05).astype(np.int64)
+
+    r_idx, t_idx, s_idx = np.meshgrid(np.arange(n_routes), np.arange(trips_per_route),
+                                      np.arange(stops_per_route), indexing="ij")
+    r_idx, t_idx, s_idx = r_idx.ravel(), t_idx.ravel(), s_idx.ravel()
+    minute = trip_start[r_idx, t_idx] + s_idx * 3
+    hour = (minute // 60) % 24
+    dow = trip_dow[r_idx, t_idx]
+    holiday = trip_holiday[r_idx, t_idx]
+    peak = ((hour >= 8) & (hour <= 10)) | ((hour >= 17) & (hour <= 20))
+    delay = (2.0 + 4.0 * peak + 0.08 * s_idx + route_effect[r_idx] - 1.5 * holiday
+             + rng.normal(0, 1.5, len(r_idx)))
+
+    stop_id = route_stop_ids[r_idx, s_idx]
+    df = pd.DataFrame({
+        "trip_id": [f"T{r}_{t}" for r, t in zip(r_idx, t_idx)],
+        "route_id": [f"R{r}" for r in r_idx],
+        "route_short_name": (r_idx + 1).astype(str),
+        "stop_id": stop_id,
+        "stop_name": [f"Stop {s}" for s in stop_id],
+        "stop_lat": route_lat[r_idx, s_idx].round(6),
+        "stop_lon": route_lon[r_idx, s_idx].round(6),
+        "stop_sequence": s_idx + 1,
+        "scheduled_arrival_time": [f"{(m // 60) % 24:02d}:{m % 60:02d}:00" for m in minute],
+        "day_of_week": dow,
+        "hour_of_day": hour,
+        "holiday_flag": holiday,
+        "delay_minutes": delay.round(3),
+    })
+    csv_path = out_dir / "bus_delay_dataset.csv"
+    df.to_csv(csv_path, index=False)
+
+    from ..scripts.make_route_index import build_route_index
+
+    index_path = build_route_index(csv_path, out_dir / "route_index.npz")
+    return {
+        "csv_path": str(csv_path),
+        "index_path": str(index_path),
+        "rows": int(len(df)),
+        "routes": n_routes,
+        "stops_per_route": stops_per_route,
+        "trips_per_route": trips_per_route,
+        "csv_bytes": csv_path.stat().st_size,
+    }
+
+
+def train_model(csv_path, versions_dir, version: str = "bench", n_estimators: int = 30,
+                max_depth: int = 12, seed: int = 0) -> Path:
+    """A RandomForest on the synthetic rows, saved in the model registry's version layout."""
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import LabelEncoder
+
+    df = pd.read_csv(csv_path, dtype={"route_short_name": str})
+    encoder = LabelEncoder().fit(df["route_short_name"])
+    X = np.column_stack([
+        encoder.transform(df["route_short_name"]),
+        df["stop_sequence"], df["day_of_week"], df["hour_of_day"], df["holiday_flag"],
+        df["stop_lat"], df["stop_lon"],
+    ]).astype(float)
+    t0 = time.perf_counter()
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, n_jobs=-1, random_state=seed)
+    model.fit(X, df["delay_minutes"].to_numpy())
+
+    out = Path(versions_dir) / version
+    out.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, out / "trained_model.pkl")
+    joblib.dump(encoder, out / "route_label_encoder.pkl")
+    with open(out / "model_metadata.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "model_type": "RandomForest",
+            "feature_columns": ["route_encoded", "stop_sequence", "day_of_week", "hour_of_day",
+                                "holiday_flag", "stop_lat", "stop_lon"],
+            "synthetic": True,
+            "train_seconds": round(time.perf_counter() - t0, 3),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f, indent=2)
+    return out
+
+
+def generate(out_dir, scale: str = "small", with_model: bool = True, seed: int = 0, **overrides) -> Dict[str, Any]:
+    n_routes, n_stops, n_trips = SCALES[scale]
+    info = generate_dataset(
+        out_dir,
+        overrides.get("routes") or n_routes,
+        overrides.get("stops") or n_stops,
+        overrides.get("trips") or n_trips,
+        seed=seed,
+    )
+    if with_model:
+        info["model_dir"] = str(train_model(info["csv_path"], Path(out_dir) / "versions", seed=seed))
+    with open(Path(out_dir) / INFO_FILE, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    return info
+
+
+if __name__ == "__main__":
+    # python -m backend.benchmarks.synthetic out_dir --scale medium [--routes N --stops N --trips N]
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset, route index and model")
+    parser.add_argument("out_dir")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--routes", type=int)
+    parser.add_argument("--stops", type=int)
+    parser.add_argument("--trips", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-model", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(generate(args.out_dir, args.scale, not args.no_model, args.seed,
+                              routes=args.routes, stops=args.stops, trips=args.trips), indent=2))
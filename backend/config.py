@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -7,5 +8,106 @@ MODEL_PATH = MODELS_DIR / "trained_model.pkl"
 ENCODER_PATH = MODELS_DIR / "route_label_encoder.pkl"
 METADATA_PATH = MODELS_DIR / "model_metadata.json"
 
+# Versioned models: models/versions/<version>/ (see models/registry.py); pin one with ROUTEMINDS_MODEL_VERSION
+MODEL_VERSIONS_DIR = Path(os.getenv("ROUTEMINDS_MODEL_VERSIONS_DIR", MODELS_DIR / "versions"))
+MODEL_VERSION = os.getenv("ROUTEMINDS_MODEL_VERSION", "")
+
+# "sklearn" (model.predict) or "compiled" (models/tree_engine.py flat-array evaluator)
+INFERENCE_ENGINE = os.getenv("ROUTEMINDS_INFERENCE_ENGINE", "sklearn")
+COMPILED_MAX_BATCH = int(os.getenv("ROUTEMINDS_COMPILED_MAX_BATCH", "512"))
+
+# Route ETA predictions: "model" scores every request, "table" serves them from the grid
+# precomputed by scripts/build_delay_table.py and only scores stops missing from it.
+# The table defaults to <model version dir>/delay_table so it swaps with the model.
+PREDICTION_SOURCE = os.getenv("ROUTEMINDS_PREDICTION_SOURCE", "model")
+DELAY_TABLE_DIR = os.getenv("ROUTEMINDS_DELAY_TABLE_DIR", "")
+
 # If you keep models one level up (you mentioned backend/models/), adjust accordingly.
 # The above assumes config.py is in backend/ and models/ sibling to this file.
+
+# Processed data lives at <repo>/data/processed (see backend/scripts/)
+DATA_DIR = (BASE_DIR.parent / "data" / "processed").resolve()
+DATASET_PATH = Path(os.getenv("ROUTEMINDS_DATASET", DATA_DIR / "bus_delay_dataset.csv"))
+# scripts/make_route_index.py writes the columnar route_index.npz and
+# scripts/build_serving_bundle.py a mappable route_index/ directory; plain JSON indexes still load
+def _default_route_index() -> Path:
+    exported, npz = DATA_DIR / "route_index", DATA_DIR / "route_index.npz"
+    # the exported directory is only used while it is not older than the .npz it was made
+    # from; after make_route_index.py runs again the .npz is served until the bundle is rebuilt
+    if (exported / "meta.json").exists() and (
+            not npz.exists() or (exported / "meta.json").stat().st_mtime >= npz.stat().st_mtime):
+        return exported
+    return npz if npz.exists() else DATA_DIR / "route_index.json"
+
+
+_DEFAULT_ROUTE_INDEX = _default_route_index()
+ROUTE_INDEX_PATH = Path(os.getenv("ROUTEMINDS_ROUTE_INDEX", _DEFAULT_ROUTE_INDEX))
+# Road-following stop-to-stop geometry from scripts/build_route_geometry.py; without it
+# ETA responses carry no `geometry` and the geometry endpoint draws straight lines
+ROUTE_GEOMETRY_PATH = Path(os.getenv("ROUTEMINDS_ROUTE_GEOMETRY", DATA_DIR / "route_geometry"))
+
+# Read-only serving data built once at deploy time by scripts/build_serving_bundle.py
+# (ETA route tables, delay aggregates, compiled forest) is opened with mmap, so uvicorn
+# workers share one copy through the page cache. 0 = always build private copies.
+SHARED_ARTIFACTS = os.getenv("ROUTEMINDS_SHARED_ARTIFACTS", "1") == "1"
+# Model pickles are loaded once per process (models/store.py); 1 = open their numpy
+# arrays with mmap so forked workers share those pages.
+MODEL_MMAP = os.getenv("ROUTEMINDS_MODEL_MMAP", "0") == "1"
+
+# Startup: load services in the background when the app starts, then run one
+# synthetic request per route (0 = every route) before reporting ready.
+PRELOAD_ON_STARTUP = os.getenv("ROUTEMINDS_PRELOAD", "1") == "1"
+WARMUP_ON_STARTUP = os.getenv("ROUTEMINDS_WARMUP", "1") == "1"
+WARMUP_MAX_ROUTES = int(os.getenv("ROUTEMINDS_WARMUP_MAX_ROUTES", "0"))
+
+# Auth: "firebase" verifies ID tokens with firebase_admin; "local" accepts HS256 JWTs
+# signed with ROUTEMINDS_LOCAL_AUTH_SECRET (tests/benchmarks only).
+AUTH_BACKEND = os.getenv("ROUTEMINDS_AUTH_BACKEND", "firebase")
+LOCAL_AUTH_SECRET = os.getenv("ROUTEMINDS_LOCAL_AUTH_SECRET", "")
+TOKEN_CACHE_SIZE = int(os.getenv("ROUTEMINDS_TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_MAX_TTL = float(os.getenv("ROUTEMINDS_TOKEN_CACHE_MAX_TTL", "300"))
+# Operator endpoints (model activation, cache stats) need a token with the custom claim
+# ROUTEMINDS_ADMIN_CLAIM set to true, or a uid listed in ROUTEMINDS_ADMIN_UIDS (comma separated).
+ADMIN_CLAIM = os.getenv("ROUTEMINDS_ADMIN_CLAIM", "admin")
+ADMIN_UIDS = frozenset(u.strip() for u in os.getenv("ROUTEMINDS_ADMIN_UIDS", "").split(",") if u.strip())
+
+# Prediction cache in front of ETA services: entries are keyed by route/segment/
+# day_of_week/hour/holiday, so a TTL of minutes keeps them well within one hour bucket.
+RESPONSE_CACHE_SIZE = int(os.getenv("ROUTEMINDS_RESPONSE_CACHE_SIZE", "4096"))
+RESPONSE_CACHE_TTL = float(os.getenv("ROUTEMINDS_RESPONSE_CACHE_TTL", "900"))
+
+# Observability: GET /metrics (Prometheus text) and, optionally, a Server-Timing header
+# with per-stage timings on every response.
+METRICS_ENABLED = os.getenv("ROUTEMINDS_METRICS", "1") == "1"
+SERVER_TIMING_HEADER = os.getenv("ROUTEMINDS_SERVER_TIMING", "0") == "1"
+
+# Execution of ETA/prediction calls: "thread" runs them in a bounded thread pool in this
+# process, "process" in worker processes that each load the model and indexes (no GIL
+# contention). Calls beyond concurrency + queue get an immediate 503 with Retry-After.
+EXECUTOR_MODE = os.getenv("ROUTEMINDS_EXECUTOR", "thread")
+EXECUTOR_WORKERS = int(os.getenv("ROUTEMINDS_EXECUTOR_WORKERS", str(os.cpu_count() or 1)))
+EXECUTOR_MAX_CONCURRENCY = int(os.getenv("ROUTEMINDS_EXECUTOR_MAX_CONCURRENCY", "0"))  # 0 = one per worker
+EXECUTOR_MAX_QUEUE = int(os.getenv("ROUTEMINDS_EXECUTOR_MAX_QUEUE", "64"))
+EXECUTOR_RETRY_AFTER = int(os.getenv("ROUTEMINDS_EXECUTOR_RETRY_AFTER", "1"))
+EXECUTOR_START_METHOD = os.getenv("ROUTEMINDS_EXECUTOR_START_METHOD", "spawn")
+
+# Observed arrivals (POST /api/eta/observations) update running per-(route, stop, dow, hour)
+# delay means that ETAService blends with the historical ones: (k * hist + w * live) / (k + w)
+# with k = LIVE_PRIOR_WEIGHT. A half-life > 0 decays old observations. The state is a
+# memory-mapped directory (default <dataset>.live/) flushed every LIVE_FLUSH_INTERVAL seconds.
+LIVE_DELAYS_ENABLED = os.getenv("ROUTEMINDS_LIVE_DELAYS", "1") == "1"
+LIVE_STATE_DIR = os.getenv("ROUTEMINDS_LIVE_STATE_DIR", "")
+LIVE_HALF_LIFE_HOURS = float(os.getenv("ROUTEMINDS_LIVE_HALF_LIFE_HOURS", "0"))
+LIVE_PRIOR_WEIGHT = float(os.getenv("ROUTEMINDS_LIVE_PRIOR_WEIGHT", "5"))
+LIVE_FLUSH_INTERVAL = float(os.getenv("ROUTEMINDS_LIVE_FLUSH_INTERVAL", "30"))
+LIVE_QUEUE_MAX = int(os.getenv("ROUTEMINDS_LIVE_QUEUE_MAX", "256"))  # pending batches
+
+# Journey planner (POST /api/eta/journey): stops within JOURNEY_TRANSFER_RADIUS_M are walkable
+# transfers (fixed when the network is built), origin/destination coordinates connect to stops
+# within JOURNEY_ACCESS_RADIUS_M. Walking is straight-line distance at JOURNEY_WALK_SPEED_MPS;
+# changing buses needs JOURNEY_TRANSFER_SLACK_S on top.
+JOURNEY_MAX_TRANSFERS = int(os.getenv("ROUTEMINDS_JOURNEY_MAX_TRANSFERS", "3"))
+JOURNEY_TRANSFER_RADIUS_M = float(os.getenv("ROUTEMINDS_JOURNEY_TRANSFER_RADIUS_M", "300"))
+JOURNEY_ACCESS_RADIUS_M = float(os.getenv("ROUTEMINDS_JOURNEY_ACCESS_RADIUS_M", "800"))
+JOURNEY_WALK_SPEED_MPS = float(os.getenv("ROUTEMINDS_JOURNEY_WALK_SPEED_MPS", "1.2"))
+JOURNEY_TRANSFER_SLACK_S = float(os.getenv("ROUTEMINDS_JOURNEY_TRANSFER_SLACK_S", "60"))
@@ -1,11 +1,6 @@
 # utils/dependencies.py
-from functools import lru_cache
-from backend.models.prediction import PredictionModel
-from pathlib import Path
+from backend.models.registry import model_registry
 
-MODEL_PATH = Path(__file__).resolve().parents[1] / "models/trained_model.pkl"
-ENCODER_PATH = Path(__file__).resolve().parents[1] / "models/route_label_encoder.pkl"
-
-@lru_cache()
 def get_prediction_model():
-    return PredictionModel(str(MODEL_PATH), str(ENCODER_PATH))
+    # the registry's active model, the same instance every service holds
+    return model_registry.active_model()
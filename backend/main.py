@@ -1,17 +1,54 @@
 from __future__ import annotations
 import os
 import json
+from contextlib import asynccontextmanager
 from typing import Dict, Any, List
 from fastapi import FastAPI, Depends, HTTPException, Security, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_admin import credentials
+from .config import (
+    PRELOAD_ON_STARTUP,
+    WARMUP_ON_STARTUP,
+    WARMUP_MAX_ROUTES,
+    AUTH_BACKEND,
+    LOCAL_AUTH_SECRET,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_MAX_TTL,
+    ADMIN_CLAIM,
+    ADMIN_UIDS,
+    METRICS_ENABLED,
+    SERVER_TIMING_HEADER,
+    EXECUTOR_MODE,
+)
+from .services.registry import registry
+from .services.executor import executor, ExecutorSaturated, ServiceUnavailable
+from .services.ingest import consumer
+from .models.registry import model_registry
+from .utils.token_cache import VerifiedTokenCache, LocalTokenVerifier, TokenVerifier, firebase_verifier
+from .utils.metrics import MetricsMiddleware, metrics, stage
+
+# Models, dataset and route index are loaded by the service registry, not at import.
+# With preload on, loading (and warmup) runs in a background thread so /ping answers
+# immediately and /ready flips once everything is loaded. In process executor mode the
+# worker processes load them instead, and this process stays light.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if EXECUTOR_MODE == "process":
+        executor.start(warmup=WARMUP_ON_STARTUP, max_routes=WARMUP_MAX_ROUTES)
+    elif PRELOAD_ON_STARTUP:
+        registry.start_background(warmup=WARMUP_ON_STARTUP, max_routes=WARMUP_MAX_ROUTES)
+    yield
+    consumer.stop()  # applies what is queued and flushes the live delay state (through the executor)
+    executor.shutdown()
 
 app = FastAPI(
     title="Dynamic Route Rationalisation API",
     description="API backend for predicting bus delays and route rationalisation",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS settings
@@ -24,8 +61,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"] if SERVER_TIMING_HEADER else [],
 )
 
+# per-endpoint latency histograms (+ Server-Timing header when enabled)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, server_timing=SERVER_TIMING_HEADER)
+
+# Saturated executor: fail fast instead of queueing without bound
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request, exc: ExecutorSaturated):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+# A service failed to load: generic 503, the cause (paths etc.) stays in the server log
+@app.exception_handler(ServiceUnavailable)
+async def service_unavailable_handler(request, exc: ServiceUnavailable):
+    return JSONResponse({"detail": f"{exc.service} service unavailable"}, status_code=503)
+
 # Firebase initialization
 def init_firebase() -> None:
     if firebase_admin._apps:
@@ -52,7 +104,21 @@ def init_firebase() -> None:
 
     firebase_admin.initialize_app(cred_obj)
 
-init_firebase()
+if AUTH_BACKEND == "local":
+    if not LOCAL_AUTH_SECRET:
+        raise RuntimeError("ROUTEMINDS_AUTH_BACKEND=local requires ROUTEMINDS_LOCAL_AUTH_SECRET")
+    _verifier: TokenVerifier = LocalTokenVerifier(LOCAL_AUTH_SECRET)
+else:
+    init_firebase()
+    _verifier = firebase_verifier
+
+# Verified ID tokens are cached until their exp (capped), keyed by token hash
+token_cache = VerifiedTokenCache(_verifier, maxsize=TOKEN_CACHE_SIZE, max_ttl_s=TOKEN_CACHE_MAX_TTL)
+
+def set_token_verifier(verifier: TokenVerifier) -> None:
+    """Swap the verification backend (e.g. a local stand-in in tests); drops cached tokens."""
+    token_cache.verifier = verifier
+    token_cache.clear()
 
 bearer = HTTPBearer(auto_error=False)
 
@@ -66,14 +132,21 @@ def verify_token(
         )
     token = credentials.credentials
     try:
-        decoded = auth.verify_id_token(token)
-        return decoded  
+        with stage("verify_token", "auth"):
+            decoded = token_cache.verify(token)
+        return decoded
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         )
 
+def require_admin(user: Dict[str, Any] = Depends(verify_token)) -> Dict[str, Any]:
+    # custom claim (set with firebase_admin.auth.set_custom_user_claims) or allow-listed uid
+    if user.get(ADMIN_CLAIM) is True or user.get("uid") in ADMIN_UIDS:
+        return user
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
 # ===== Relative imports =====
 from .routes.prediction import router as prediction_router
 from .routes.route_eta import router as route_eta_router
@@ -98,6 +171,76 @@ app.include_router(
 def health_check():
     return {"status": "Backend is working"}
 
+@app.get("/ready")
+def readiness_check():
+    # 200 only once models/indexes are loaded (and warmed, if enabled); 503 otherwise
+    body = registry.status()
+    body["executor"] = executor.status()
+    if EXECUTOR_MODE == "process":
+        body["ready"] = executor.ready
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
 @app.get("/protected")
 def protected(user: Dict[str, Any] = Depends(verify_token)):
     return {"message": "Hello from protected route!", "uid": user.get("uid")}
+
+@app.get("/auth/token_cache")
+def token_cache_stats(user: Dict[str, Any] = Depends(require_admin)):
+    return token_cache.stats()
+
+@app.post("/auth/token_cache/invalidate")
+def invalidate_cached_tokens(uid: str, user: Dict[str, Any] = Depends(require_admin)):
+    # after revoking a user's sessions (firebase_admin.auth.revoke_refresh_tokens) their
+    # cached tokens would otherwise stay valid here for up to ROUTEMINDS_TOKEN_CACHE_MAX_TTL
+    return {"uid": uid, "dropped": token_cache.invalidate_uid(uid)}
+
+@app.get("/models")
+def list_models(user: Dict[str, Any] = Depends(require_admin)):
+    # admin only: version directories and loaded artifacts are reported with their server paths
+    return {"versions": model_registry.list_versions(), **model_registry.status()}
+
+@app.post("/models/activate", status_code=status.HTTP_202_ACCEPTED)
+def activate_model(version: str | None = None, user: Dict[str, Any] = Depends(require_admin)):
+    # loads + warms in the background, then swaps atomically for every service
+    target = version or model_registry.default_version()
+    if target not in {v["version"] for v in model_registry.list_versions()}:
+        raise HTTPException(status_code=404, detail=f"Model version '{target}' not found")
+    model_registry.activate(target, background=True)
+    return {"activating": target, **model_registry.status()}
+
+@app.get("/cache/stats")
+def response_cache_stats(user: Dict[str, Any] = Depends(require_admin)):
+    # only services that are already loaded; this must not trigger a load
+    return {
+        name: registry.get(name).cache.stats()
+        for name in ("eta", "ai_routing")
+        if registry.is_loaded(name)
+    }
+
+# ===== Metrics =====
+def _collect_runtime_metrics():
+    # values owned by the caches/registries, read at scrape time
+    caches = [(name, registry.get(name).cache.stats()) for name in ("eta", "ai_routing") if registry.is_loaded(name)]
+    for field in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        yield (f"routeminds_response_cache_{field}_total", "counter", f"Response cache {field}",
+               [({"service": name}, st[field]) for name, st in caches])
+    yield ("routeminds_response_cache_entries", "gauge", "Response cache entries",
+           [({"service": name}, st["size"]) for name, st in caches])
+
+    tc = token_cache.stats()
+    for field in ("hits", "misses", "evictions", "expirations"):
+        yield (f"routeminds_token_cache_{field}_total", "counter", f"Verified token cache {field}",
+               [({}, tc[field])])
+
+    active = model_registry.status(detail=False)["active"]
+    yield ("routeminds_model_info", "gauge", "Active model version",
+           [({"version": active["version"], "model_type": str(active.get("model_type"))}, 1)] if active else [])
+    yield ("routeminds_ready", "gauge", "1 once services are loaded (and warmed)", [({}, int(registry.ready))])
+
+metrics.register_collector(_collect_runtime_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
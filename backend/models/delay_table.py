@@ -0,0 +1,213 @@
+# backend/models/delay_table.py
+"""
+Precomputed model output over the full feature grid.
+
+Every model feature except the stop is discrete (day_of_week x hour_of_day x holiday_flag
+= 7 x 24 x 2), and stop_sequence/lat/lon are fixed per route stop, so the model can be
+evaluated ahead of time for every (route, stop, dow, hour, holiday). The table is a
+float32 array `values[slot, dow, hour, holiday]` saved as .npy and opened with mmap.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.array_store import publish_dir
+
+logger = logging.getLogger(__name__)
+
+N_DOW, N_HOUR, N_HOLIDAY = 7, 24, 2
+GRID = N_DOW * N_HOUR * N_HOLIDAY
+
+
+def source_identity(path) -> Dict[str, int]:
+    """Size and mtime of a file (of its meta.json for a directory store): what a table was built from."""
+    p = Path(path)
+    st = os.stat(p / "meta.json" if p.is_dir() else p)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _grid_features(seq: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """(n_stops * GRID, 6) rows [stop_sequence, dow, hour, holiday, lat, lon], stop-major."""
+    dow, hour, hol = np.meshgrid(np.arange(N_DOW), np.arange(N_HOUR), np.arange(N_HOLIDAY), indexing="ij")
+    grid = np.column_stack([dow.ravel(), hour.ravel(), hol.ravel()]).astype(float)
+    n = len(seq)
+    X = np.empty((n * GRID, 6), dtype=float)
+    X[:, 0] = np.repeat(seq, GRID)
+    X[:, 1:4] = np.tile(grid, (n, 1))
+    X[:, 4] = np.repeat(lat, GRID)
+    X[:, 5] = np.repeat(lon, GRID)
+    return X
+
+
+def _score_routes(model_path: str, jobs: List[Tuple[int, np.ndarray]],
+                  feature_columns: Optional[List[str]] = None) -> List[np.ndarray]:
+    """Worker: score the grid for a chunk of routes; jobs are (route_code, [seq, lat, lon] per stop)."""
+    import joblib
+
+    from ..utils.preprocessing import FeaturePipeline
+
+    pipeline = FeaturePipeline.for_columns(None, feature_columns)
+    model = joblib.load(model_path)
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = 1  # parallelism comes from the chunks
+    if hasattr(model, "verbose"):
+        model.verbose = 0
+    out = []
+    for code, stops in jobs:
+        X = pipeline.from_inputs(code, _grid_features(stops[:, 0], stops[:, 1], stops[:, 2]))
+        out.append(np.asarray(model.predict(X), dtype=np.float32).reshape(len(stops), N_DOW, N_HOUR, N_HOLIDAY))
+    return out
+
+
+class DelayTable:
+    def __init__(
+        self,
+        values: np.ndarray,
+        route_names: np.ndarray,
+        route_offsets: np.ndarray,
+        slot_stop: np.ndarray,
+        slot_seq: np.ndarray,
+        meta: Dict[str, Any],
+    ):
+        self.values = values                # (n_slots, 7, 24, 2) float32
+        self.route_names = route_names      # (n_routes,) str
+        self.route_offsets = route_offsets  # (n_routes + 1,) slots of route r are [off[r], off[r+1])
+        self.slot_stop = slot_stop          # (n_slots,) int64 stop_id
+        self.slot_seq = slot_seq            # (n_slots,) int64 stop_sequence
+        self.meta = meta
+        # (stop_id, stop_sequence) -> slot per route; loop routes visit a stop twice
+        self._slots: Dict[str, Dict[Tuple[int, int], int]] = {}
+        for r, name in enumerate(route_names.tolist()):
+            lo, hi = int(route_offsets[r]), int(route_offsets[r + 1])
+            keys = zip(slot_stop[lo:hi].tolist(), slot_seq[lo:hi].tolist())
+            self._slots[name] = {k: lo + i for i, k in enumerate(keys)}
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.meta.get("model_version")
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes)
+
+    def slots_for(self, route_name: str, stops: List[dict]) -> np.ndarray:
+        """Slot per stop dict, -1 where the (route, stop) pair is not in the table."""
+        slots = self._slots.get(str(route_name), {})
+        return np.fromiter(
+            (slots.get((int(s.get("stop_id")), int(s.get("stop_sequence", 0))), -1) for s in stops),
+            dtype=np.int64, count=len(stops),
+        )
+
+    def stale_reason(self, model_version: str, model_path, index_path) -> Optional[str]:
+        """Why the table cannot serve this model + route index, or None if it was built from them."""
+        if self.model_version != model_version:
+            return f"built for model {self.model_version}, not {model_version}"
+        if self.meta.get("model_source") != source_identity(model_path):
+            return f"built from another {Path(model_path).name} (model retrained since)"
+        try:
+            index = source_identity(index_path)
+        except OSError:
+            index = None
+        if self.meta.get("route_index_source") != index:
+            return "built from another route index"
+        return None
+
+    def lookup(self, slots: np.ndarray, dow: int, hour: int, holiday: int) -> np.ndarray:
+        """Delays for known slots (callers handle -1 = unknown)."""
+        return self.values[slots, dow, hour, holiday]
+
+    # ----- build / persist -----
+    @classmethod
+    def build(
+        cls,
+        model_path: str,
+        route_index: Dict[str, list],
+        route_codes: Dict[str, int],
+        n_jobs: int = -1,
+        model_version: Optional[str] = None,
+        feature_columns: Optional[List[str]] = None,
+    ) -> "DelayTable":
+        from joblib import Parallel, delayed
+
+        names, stop_ids, stop_seqs, jobs = [], [], [], []
+        for name, stops in route_index.items():
+            code = route_codes.get(str(name))
+            stops = [s for s in stops if isinstance(s, dict) and s.get("stop_id") is not None]
+            if code is None or not stops:
+                continue
+            names.append(str(name))
+            stop_ids.append(np.asarray([int(s["stop_id"]) for s in stops], dtype=np.int64))
+            stop_seqs.append(np.asarray([int(s.get("stop_sequence", 0)) for s in stops], dtype=np.int64))
+            jobs.append((code, np.column_stack([
+                stop_seqs[-1].astype(float),
+                [float(s.get("lat") or s.get("stop_lat") or 0.0) for s in stops],
+                [float(s.get("lon") or s.get("stop_lon") or 0.0) for s in stops],
+            ])))
+
+        t0 = time.perf_counter()
+        n_workers = (os.cpu_count() or 1) if n_jobs in (-1, 0, None) else int(n_jobs)
+        chunks = [jobs[i::n_workers] for i in range(n_workers) if jobs[i::n_workers]]
+        scored = Parallel(n_jobs=len(chunks) or 1)(
+            delayed(_score_routes)(model_path, chunk, feature_columns) for chunk in chunks
+        )
+        # undo the round-robin chunking
+        per_route: List[Optional[np.ndarray]] = [None] * len(jobs)
+        for c, result in enumerate(scored):
+            for j, arr in enumerate(result):
+                per_route[c + j * len(chunks)] = arr
+
+        values = np.concatenate(per_route) if per_route else np.zeros((0, N_DOW, N_HOUR, N_HOLIDAY), np.float32)
+        offsets = np.concatenate([[0], np.cumsum([len(s) for s in stop_ids])]).astype(np.int64)
+        meta = {
+            "model_version": model_version,
+            # the version name alone does not change when a model file is retrained in place
+            # (e.g. the legacy models/trained_model.pkl), see stale_reason
+            "model_source": source_identity(model_path),
+            "n_routes": len(names),
+            "n_slots": int(len(values)),
+            "build_seconds": round(time.perf_counter() - t0, 2),
+            "created_at": time.time(),
+        }
+        empty = np.zeros(0, np.int64)
+        return cls(values, np.asarray(names, dtype=str), offsets,
+                   np.concatenate(stop_ids) if stop_ids else empty,
+                   np.concatenate(stop_seqs) if stop_seqs else empty, meta)
+
+    def save(self, out_dir) -> Path:
+        out_dir = Path(out_dir)
+        tmp = out_dir.with_name(f".{out_dir.name}.tmp-{os.getpid()}")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "values.npy", self.values)
+        np.save(tmp / "route_names.npy", self.route_names)
+        np.save(tmp / "route_offsets.npy", self.route_offsets)
+        np.save(tmp / "slot_stop.npy", self.slot_stop)
+        np.save(tmp / "slot_seq.npy", self.slot_seq)
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        return publish_dir(tmp, out_dir)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "DelayTable":
+        path = Path(path)
+        if not (path / "meta.json").exists():
+            raise FileNotFoundError(f"Delay table not found at {path}")
+        with open(path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            np.load(path / "values.npy", mmap_mode="r" if mmap else None),
+            np.load(path / "route_names.npy"),
+            np.load(path / "route_offsets.npy"),
+            np.load(path / "slot_stop.npy"),
+            np.load(path / "slot_seq.npy"),
+            meta,
+        )
@@ -1,22 +1,132 @@
-import joblib
+import json
+import logging
+import os
+import threading
 from pathlib import Path
+from typing import Optional
 import numpy as np
+from ..config import INFERENCE_ENGINE, COMPILED_MAX_BATCH, SHARED_ARTIFACTS
+from .store import artifact_store
+from .tree_engine import CompiledForest, compile_and_validate
+from ..utils.metrics import metrics
+from ..utils.preprocessing import FeaturePipeline, RouteEncoder
+
+logger = logging.getLogger(__name__)
+
+MODEL_ROWS = metrics.counter("routeminds_model_rows_total", "Feature rows scored by the model")
+MODEL_CALLS = metrics.counter("routeminds_model_calls_total", "Model inference calls")
+
+
+COMPILED_DIR = "compiled_forest"
+
+
+def _model_source(model_path: Path) -> dict:
+    st = os.stat(model_path)
+    return {"model_size": st.st_size, "model_mtime_ns": st.st_mtime_ns}
 
 
 class PredictionModel:
-    def __init__(self, model_path: str, encoder_path: str):
+    def __init__(self, model_path: str, encoder_path: str, engine: Optional[str] = None):
         base_path = Path(__file__).parent
-        self.model = joblib.load(base_path / model_path)
-        self.encoder = joblib.load(base_path / encoder_path)
+        self.model_path = base_path / model_path
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.encoder_path = base_path / encoder_path
+        # both files come from the process-wide store: one copy however many wrappers ask
+        self.encoder = artifact_store.load(self.encoder_path)
+        # "compiled": flat-array tree evaluator (validated against model.predict), else sklearn/xgboost.
+        # A forest prebuilt next to the model (scripts/build_serving_bundle.py) is mapped instead,
+        # and the sklearn model itself is then only loaded for batches above COMPILED_MAX_BATCH.
+        self.engine = engine or INFERENCE_ENGINE
+        self.compiled = None
+        if self.engine == "compiled":
+            self.compiled = self._attach_compiled() or compile_and_validate(self.model)
+        # the columns this model was trained on (incl. derived ones), from the metadata next to it
+        self.features = FeaturePipeline.for_columns(RouteEncoder.from_label_encoder(self.encoder),
+                                                    self._feature_columns())
+        self.route_codes = self.features.routes.codes
+        # set by the model registry for versioned models
+        self.version = None
+        self.metadata = {}
+
+    def _feature_columns(self) -> Optional[list]:
+        try:
+            with open(self.model_path.parent / "model_metadata.json", "r", encoding="utf-8") as f:
+                return json.load(f).get("feature_columns")
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = artifact_store.load(self.model_path)
+        return self._model
+
+    def artifacts(self) -> list:
+        """Load time and memory of this model's files (see models/store.py)."""
+        return artifact_store.stats([self.model_path, self.encoder_path])
+
+    @property
+    def n_features(self) -> int:
+        if self.compiled is not None and self.compiled.n_features:
+            return self.compiled.n_features
+        return int(getattr(self.model, "n_features_in_", 7))
+
+    def _attach_compiled(self) -> Optional[CompiledForest]:
+        path = self.model_path.parent / COMPILED_DIR
+        if not SHARED_ARTIFACTS or not path.exists():
+            return None
+        try:
+            forest = CompiledForest.load(path)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Could not map compiled forest at %s: %s", path, e)
+            return None
+        if forest.source != _model_source(self.model_path):
+            logger.warning("Compiled forest at %s was built from another model file; recompiling", path)
+            return None
+        logger.info("Mapped compiled %s forest from %s (%d trees)", forest.kind, path, forest.n_trees)
+        return forest
+
+    def save_compiled(self) -> Optional[Path]:
+        """Compile + validate the model and store the forest next to it for workers to map."""
+        forest = compile_and_validate(self.model)
+        if forest is None:
+            return None
+        return forest.save(self.model_path.parent / COMPILED_DIR, source=_model_source(self.model_path))
 
     def encode_route(self, route_id: str) -> int:
         """Convert route_id string into encoded integer"""
-        if route_id not in self.encoder.classes_:
-            raise ValueError(f"Route ID '{route_id}' not found in encoder classes.")
-        return int(self.encoder.transform([route_id])[0])
+        return self.features.routes.code(route_id)
 
     def predict(self, route_id: str, features: list[float]) -> float:
         """Make a single prediction"""
-        encoded_route = self.encode_route(route_id)
-        X = np.array([encoded_route] + features).reshape(1, -1)
-        return float(self.model.predict(X)[0])
+        return float(self.predict_encoded(self.encode_route(route_id), features)[0])
+
+    def _predict_matrix(self, X: np.ndarray) -> np.ndarray:
+        # the compiled walker wins on small batches; sklearn's threaded predict on large ones
+        engine = "compiled" if self.compiled is not None and len(X) <= COMPILED_MAX_BATCH else "sklearn"
+        MODEL_CALLS.inc(engine=engine, version=self.version)
+        MODEL_ROWS.inc(len(X), engine=engine, version=self.version)
+        if engine == "compiled":
+            return self.compiled.predict(X)
+        return np.asarray(self.model.predict(X), dtype=float)
+
+    def predict_batch(self, route_id: str, features: np.ndarray) -> np.ndarray:
+        """
+        Score many rows of the same route in one model call.
+        `features` is (n_rows, 6) in INPUT_COLUMNS order; the route and derived columns are added.
+        """
+        return self.predict_encoded(self.encode_route(route_id), features)
+
+    def predict_encoded(self, route_codes, features: np.ndarray) -> np.ndarray:
+        """
+        Score rows that may belong to different routes in one model call.
+        `route_codes` is a scalar or one already-encoded route per row.
+        """
+        return self._predict_matrix(self.features.from_inputs(route_codes, features))
+
+    def predict_frame(self, data) -> np.ndarray:
+        """Score a DataFrame (or dict of columns) with route_short_name and the input columns."""
+        return self._predict_matrix(self.features.transform(data))
@@ -0,0 +1,214 @@
+# backend/models/registry.py
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .prediction import PredictionModel
+from .store import artifact_store
+from ..utils.preprocessing import INPUT_COLUMNS
+from ..config import MODELS_DIR, MODEL_VERSIONS_DIR, MODEL_VERSION
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = "trained_model.pkl"
+ENCODER_FILE = "route_label_encoder.pkl"
+METADATA_FILE = "model_metadata.json"
+LEGACY_VERSION = "legacy"
+
+
+class ModelHandle:
+    """A loaded, warmed model version."""
+
+    def __init__(self, version: str, path: Path, model: PredictionModel, metadata: Dict[str, Any], load_seconds: float):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.metadata = metadata
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "path": str(self.path),
+            "model_type": self.metadata.get("model_type"),
+            "performance": self.metadata.get("performance"),
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "artifacts": self.model.artifacts(),
+        }
+
+
+class ModelRegistry:
+    """
+    Versioned model directories with atomic hot swap.
+
+    Layout: `<versions_dir>/<version>/{trained_model.pkl, route_label_encoder.pkl, model_metadata.json}`.
+    The flat files in `backend/models/` are exposed as version "legacy" so existing
+    deployments keep working. The active version is, in order: `pinned_version`, the
+    `ACTIVE` file in versions_dir, the newest version directory, then "legacy".
+
+    `activate()` loads and warms a version (optionally in a background thread) and only
+    then swaps it in; subscribers (services holding the model) are notified after the swap.
+    """
+
+    def __init__(self, models_dir: Path, versions_dir: Path, pinned_version: Optional[str] = None):
+        self.models_dir = Path(models_dir)
+        self.versions_dir = Path(versions_dir)
+        self.pinned_version = pinned_version or None
+        self._active: Optional[ModelHandle] = None
+        self._lock = threading.Lock()         # serializes loads/swaps, never held by readers
+        self._subscribers: List[Callable[[ModelHandle], None]] = []
+        self.loading: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    # ----- discovery -----
+    def _version_path(self, version: str) -> Path:
+        if version == LEGACY_VERSION:
+            return self.models_dir
+        return self.versions_dir / version
+
+    @staticmethod
+    def _read_metadata(path: Path) -> Dict[str, Any]:
+        try:
+            with open(path / METADATA_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        out = []
+        if self.versions_dir.is_dir():
+            for p in sorted(self.versions_dir.iterdir()):
+                if p.name.startswith("."):
+                    continue  # training scratch and half-written versions (models/training.py)
+                if p.is_dir() and (p / MODEL_FILE).exists() and (p / ENCODER_FILE).exists():
+                    meta = self._read_metadata(p)
+                    out.append({"version": p.name, "path": str(p), "created_at": meta.get("created_at"),
+                                "model_type": meta.get("model_type")})
+        if (self.models_dir / MODEL_FILE).exists():
+            out.append({"version": LEGACY_VERSION, "path": str(self.models_dir), "created_at": None,
+                        "model_type": self._read_metadata(self.models_dir).get("model_type")})
+        return out
+
+    def default_version(self) -> str:
+        if self.pinned_version:
+            return self.pinned_version
+        active_file = self.versions_dir / "ACTIVE"
+        if active_file.exists():
+            name = active_file.read_text(encoding="utf-8").strip()
+            if name:
+                return name
+        versioned = [v for v in self.list_versions() if v["version"] != LEGACY_VERSION]
+        if versioned:
+            # newest by metadata created_at, then by directory name
+            versioned.sort(key=lambda v: (str(v["created_at"] or ""), v["version"]))
+            return versioned[-1]["version"]
+        return LEGACY_VERSION
+
+    # ----- loading / swapping -----
+    def load(self, version: str) -> ModelHandle:
+        path = self._version_path(version)
+        if not (path / MODEL_FILE).exists():
+            raise FileNotFoundError(f"Model version '{version}' not found at {path}")
+        t0 = time.perf_counter()
+        model = PredictionModel(str(path / MODEL_FILE), str(path / ENCODER_FILE))
+        metadata = self._read_metadata(path)
+        model.version = version
+        model.metadata = metadata
+        self._warm(model)
+        return ModelHandle(version, path, model, metadata, round(time.perf_counter() - t0, 3))
+
+    @staticmethod
+    def _warm(model: PredictionModel) -> None:
+        # one tiny batch so lazy sklearn/joblib state is initialised before the swap
+        classes = list(model.route_codes)
+        if classes:
+            model.predict_batch(classes[0], np.zeros((1, len(INPUT_COLUMNS))))
+
+    def activate(self, version: Optional[str] = None, background: bool = False):
+        version = version or self.default_version()
+        if background:
+            t = threading.Thread(target=self._activate_logged, args=(version,), name=f"model-load-{version}", daemon=True)
+            t.start()
+            return t
+        return self._activate(version)
+
+    def _activate_logged(self, version: str) -> None:
+        try:
+            self._activate(version)
+        except Exception:
+            logger.exception("Activating model version %s failed", version)
+
+    def _activate(self, version: str, only_if_empty: bool = False) -> ModelHandle:
+        with self._lock:
+            if only_if_empty and self._active is not None:
+                return self._active
+            self.loading = version
+            try:
+                handle = self.load(version)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self.loading = None
+            previous = self._active
+            self._active = handle  # single reference assignment: readers see old or new, never half
+            self.last_error = None
+            subscribers = list(self._subscribers)
+        logger.info("Activated model version %s (was %s) in %.2fs", version,
+                    previous.version if previous else None, handle.load_seconds)
+        for cb in subscribers:
+            try:
+                cb(handle)
+            except Exception:
+                logger.exception("Model swap subscriber failed")
+        return handle
+
+    @property
+    def active(self) -> ModelHandle:
+        handle = self._active
+        if handle is None:
+            # first use: load the default version (concurrent callers wait on the lock)
+            handle = self._activate(self.default_version(), only_if_empty=True)
+        return handle
+
+    @property
+    def active_version(self) -> Optional[str]:
+        # without triggering a load
+        handle = self._active
+        return handle.version if handle else None
+
+    def active_model(self) -> PredictionModel:
+        return self.active.model
+
+    def subscribe(self, callback: Callable[[ModelHandle], None]) -> None:
+        self._subscribers.append(callback)
+
+    def status(self, detail: bool = True) -> Dict[str, Any]:
+        handle = self._active
+        if not detail:
+            # for unauthenticated callers (/ready): no server paths or load errors
+            return {
+                "active": {"version": handle.version, "model_type": handle.metadata.get("model_type"),
+                           "loaded_at": handle.loaded_at} if handle else None,
+                "loading": self.loading,
+                "failed": self.last_error is not None,
+            }
+        return {
+            "active": handle.describe() if handle else None,
+            "loading": self.loading,
+            "last_error": self.last_error,
+            # every model file loaded in this process, active or not (models/store.py)
+            "artifacts": artifact_store.stats(),
+        }
+
+
+model_registry = ModelRegistry(MODELS_DIR, MODEL_VERSIONS_DIR, MODEL_VERSION)
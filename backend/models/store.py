@@ -0,0 +1,112 @@
+# backend/models/store.py
+"""
+Process-wide store for model artifacts (pickled models and encoders).
+
+Every PredictionModel loads its files through `artifact_store`, so a file is unpickled
+once per process no matter how many services or wrappers ask for it; later loads get
+the same object. Entries are held weakly where the object allows it, so an old model
+version is freed once the registry and services drop it after a swap.
+
+With ROUTEMINDS_MODEL_MMAP=1, joblib opens the numpy arrays inside a pickle with
+mmap_mode="r": their pages come from the page cache and are shared between forked
+workers. This only covers arrays kept as-is after unpickling; sklearn trees copy their
+node arrays into private memory (the compiled forest in models/tree_engine.py is the
+mapped alternative for those).
+
+Each load records its time, file size and the change in resident memory it caused
+(which includes libraries the unpickling imports, e.g. sklearn on the first load),
+reported by `stats()` (and the /models endpoint through the model registry).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import joblib
+
+from ..config import MODEL_MMAP
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes() -> Optional[int]:
+    # current resident set size (Linux); None where /proc is not available
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ArtifactStore:
+    def __init__(self, mmap: bool = MODEL_MMAP):
+        self.mmap = mmap
+        self._lock = threading.Lock()
+        self._objects: Dict[Tuple[str, int, int], Any] = {}  # weakref.ref, or the object itself
+        self._stats: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+
+    @staticmethod
+    def _key(path: Path) -> Tuple[str, int, int]:
+        # a rewritten file (same path, new size/mtime) is a new artifact
+        st = os.stat(path)
+        return str(path.resolve()), st.st_size, st.st_mtime_ns
+
+    def _cached(self, key) -> Any:
+        ref = self._objects.get(key)
+        if isinstance(ref, weakref.ref):
+            obj = ref()
+            if obj is None:
+                # collected after its last user let go
+                del self._objects[key]
+                self._stats.pop(key, None)
+            return obj
+        return ref
+
+    def load(self, path, mmap: Optional[bool] = None) -> Any:
+        """The unpickled artifact at `path`, loaded at most once per process."""
+        path = Path(path)
+        key = self._key(path)
+        mmap = self.mmap if mmap is None else mmap
+        with self._lock:
+            obj = self._cached(key)
+            if obj is not None:
+                self._stats[key]["hits"] += 1
+                return obj
+            rss0 = _rss_bytes()
+            t0 = time.perf_counter()
+            obj = joblib.load(path, mmap_mode="r" if mmap else None)
+            seconds = time.perf_counter() - t0
+            rss1 = _rss_bytes()
+            try:
+                self._objects[key] = weakref.ref(obj)
+            except TypeError:
+                self._objects[key] = obj  # dicts, lists, ... cannot be weakly referenced
+            self._stats[key] = {
+                "path": key[0],
+                "type": type(obj).__name__,
+                "file_bytes": key[1],
+                "rss_delta_mib": round((rss1 - rss0) / 2**20, 2) if rss0 is not None and rss1 is not None else None,
+                "load_seconds": round(seconds, 3),
+                "mmap": bool(mmap),
+                "loaded_at": time.time(),
+                "hits": 0,
+            }
+        logger.info("Loaded %s (%s, %.1f MiB on disk) in %.2fs%s", path, type(obj).__name__, key[1] / 2**20,
+                    seconds, " with mmap" if mmap else "")
+        return obj
+
+    def stats(self, paths: Optional[Iterable] = None) -> List[Dict[str, Any]]:
+        """Load stats of live artifacts, optionally only those at `paths`."""
+        wanted = {str(Path(p).resolve()) for p in paths} if paths is not None else None
+        with self._lock:
+            for key in list(self._objects):
+                self._cached(key)  # prunes collected entries
+            return [dict(s) for s in self._stats.values() if wanted is None or s["path"] in wanted]
+
+
+artifact_store = ArtifactStore()
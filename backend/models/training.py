@@ -0,0 +1,366 @@
+# backend/models/training.py
+"""
+Out-of-core training of the delay model (replaces the 50k-row sample in notebooks/training.ipynb).
+
+1. spool:    the CSV is streamed in chunks (only the needed columns), downcast with the
+             notebook's `reduce_memory_usage`, split by trip (train/val/test, a stable hash of
+             trip_id, or the notebook's train/val/test CSVs) and spooled as binary chunks.
+2. features: one worker per core turns spooled chunks into float32 feature rows (the shared
+             FeaturePipeline in utils/preprocessing.py, plus any derived features), written
+             straight into per-split memory-mapped .npy files at precomputed offsets.
+3. train:    RandomForest fits every tree on a bootstrap sample (`max_samples`) of the mapped
+             rows; XGBoost builds quantile histograms chunk by chunk (QuantileDMatrix over a
+             DataIter). Neither needs the full matrix in RAM.
+4. evaluate: MAE/MSE/R² are accumulated chunk by chunk; the lower validation MAE wins and
+             is scored on the test split.
+5. save:     models/versions/<version>/ in the model registry's layout, with the metadata
+             the notebook wrote plus every candidate's metrics, parameters and stage timings.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .registry import ENCODER_FILE, METADATA_FILE, MODEL_FILE
+from ..utils.preprocessing import INPUT_COLUMNS, FeaturePipeline, RouteEncoder, route_keys
+
+logger = logging.getLogger(__name__)
+
+TARGET = "delay_minutes"
+USECOLS = ["trip_id", "route_id", "route_short_name", *INPUT_COLUMNS, TARGET]
+SPLITS = ("train", "val", "test")
+
+CHUNK_ROWS = 500_000
+
+# notebook hyperparameters; RF trees each see at most RF_MAX_SAMPLES bootstrap rows
+RF_PARAMS = {"n_estimators": 30, "max_depth": 10, "min_samples_split": 5, "min_samples_leaf": 2,
+             "max_features": "sqrt"}
+RF_MAX_SAMPLES = 2_000_000
+XGB_PARAMS = {"eta": 0.1, "max_depth": 6, "subsample": 0.8, "colsample_bytree": 0.8,
+              "tree_method": "hist", "max_bin": 256, "objective": "reg:squarederror"}
+XGB_ROUNDS = 50
+
+
+def reduce_memory_usage(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Downcast numeric columns to the smallest dtype holding their range (notebook version).
+    Floats stop at float32: float16 rounds stop coordinates to ~1 km.
+    """
+    for col in df.columns:
+        col_type = df[col].dtype
+        if col_type == object or not np.issubdtype(col_type, np.number) or not len(df):
+            continue
+        c_min, c_max = df[col].min(), df[col].max()
+        if np.issubdtype(col_type, np.integer):
+            for t in (np.int8, np.int16, np.int32, np.int64):
+                if np.iinfo(t).min < c_min and c_max < np.iinfo(t).max:
+                    df[col] = df[col].astype(t)
+                    break
+        elif np.finfo(np.float32).min < c_min and c_max < np.finfo(np.float32).max:
+            df[col] = df[col].astype(np.float32)
+    return df
+
+
+def split_by_trip(trip_ids: pd.Series, val_frac: float, test_frac: float, seed: int) -> np.ndarray:
+    """0/1/2 = train/val/test; a stable hash of trip_id, so every row of a trip lands together."""
+    h = pd.util.hash_pandas_object(trip_ids.astype(str), index=False, hash_key=f"routeminds{seed:06d}"[:16])
+    u = (h.to_numpy() % np.uint64(1_000_000)).astype(np.float64) / 1_000_000.0
+    return np.where(u < test_frac, 2, np.where(u < test_frac + val_frac, 1, 0)).astype(np.int8)
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.perf_counter() - t0, 3)
+        logger.info("%s: %.2fs", name, timings[name])
+
+
+# ----- 1. spool -----
+def _spool(sources: List[Tuple[Path, Optional[int]]], work_dir: Path, chunk_rows: int,
+           val_frac: float, test_frac: float, seed: int) -> Dict[str, Any]:
+    """Stream the CSV(s) once; returns the chunk files, per-chunk split counts and route keys."""
+    chunks, counts, keys = [], [], set()
+    raw_bytes = reduced_bytes = 0
+    for path, fixed_split in sources:
+        header = pd.read_csv(path, nrows=0).columns
+        missing = set(USECOLS) - set(header) - {"route_id"}
+        if missing:
+            raise ValueError(f"{path} is missing columns: {sorted(missing)}")
+        reader = pd.read_csv(path, usecols=[c for c in USECOLS if c in header], chunksize=chunk_rows,
+                             dtype={"trip_id": str, "route_id": str, "route_short_name": str})
+        for df in reader:
+            raw_bytes += int(df.memory_usage(deep=True).sum())
+            for col in INPUT_COLUMNS + [TARGET]:
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+            df = df.dropna(subset=INPUT_COLUMNS + [TARGET])
+            split = (np.full(len(df), fixed_split, dtype=np.int8) if fixed_split is not None
+                     else split_by_trip(df["trip_id"], val_frac, test_frac, seed))
+            key = route_keys(df).to_numpy()
+            df = reduce_memory_usage(df[INPUT_COLUMNS + [TARGET]].copy())
+            reduced_bytes += int(df.memory_usage(deep=True).sum())
+
+            out = work_dir / f"chunk_{len(chunks):05d}.npz"
+            np.savez(out, route_key=key.astype(str), split=split,
+                     **{c: df[c].to_numpy() for c in INPUT_COLUMNS + [TARGET]})
+            chunks.append(out)
+            counts.append(np.bincount(split, minlength=len(SPLITS)))
+            keys.update(np.unique(key).tolist())
+            logger.info("Spooled chunk %d (%d rows)", len(chunks), len(df))
+    counts_arr = np.asarray(counts, dtype=np.int64).reshape(-1, len(SPLITS))
+    return {"chunks": chunks, "counts": counts_arr, "classes": np.asarray(sorted(keys), dtype=str),
+            "raw_mib": round(raw_bytes / 2**20, 1), "reduced_mib": round(reduced_bytes / 2**20, 1)}
+
+
+# ----- 2. features -----
+def _featurize_chunk(chunk_path: Path, pipeline: FeaturePipeline, work_dir: Path, offsets: Sequence[int]) -> int:
+    """Worker: write one spooled chunk's feature rows into the mapped split matrices."""
+    with np.load(chunk_path) as z:
+        split = z["split"]
+        X = pipeline.matrix(pipeline.routes.encode(z["route_key"]), *(z[c] for c in INPUT_COLUMNS), dtype=np.float32)
+        y = z[TARGET].astype(np.float32)
+    for s, name in enumerate(SPLITS):
+        rows = split == s
+        n = int(rows.sum())
+        if not n:
+            continue
+        Xm = np.load(work_dir / f"X_{name}.npy", mmap_mode="r+")
+        ym = np.load(work_dir / f"y_{name}.npy", mmap_mode="r+")
+        Xm[offsets[s]:offsets[s] + n] = X[rows]
+        ym[offsets[s]:offsets[s] + n] = y[rows]
+        Xm.flush()
+        ym.flush()
+        del Xm, ym
+    return len(y)
+
+
+def _build_features(spool: Dict[str, Any], pipeline: FeaturePipeline, work_dir: Path,
+                    n_jobs: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    from joblib import Parallel, delayed
+
+    counts = spool["counts"]
+    totals = counts.sum(axis=0)
+    for s, name in enumerate(SPLITS):
+        np.lib.format.open_memmap(work_dir / f"X_{name}.npy", mode="w+", dtype=np.float32,
+                                  shape=(int(totals[s]), pipeline.n_features)).flush()
+        np.lib.format.open_memmap(work_dir / f"y_{name}.npy", mode="w+", dtype=np.float32,
+                                  shape=(int(totals[s]),)).flush()
+    # row offset of every chunk inside each split
+    starts = np.vstack([np.zeros(len(SPLITS), dtype=np.int64), np.cumsum(counts, axis=0)[:-1]]) \
+        if len(counts) else np.zeros((0, len(SPLITS)), dtype=np.int64)
+    Parallel(n_jobs=n_jobs)(
+        delayed(_featurize_chunk)(path, pipeline, work_dir, starts[i].tolist())
+        for i, path in enumerate(spool["chunks"])
+    )
+    return {name: (np.load(work_dir / f"X_{name}.npy", mmap_mode="r"), np.load(work_dir / f"y_{name}.npy", mmap_mode="r"))
+            for name in SPLITS}
+
+
+# ----- 3. train -----
+def train_random_forest(X: np.ndarray, y: np.ndarray, n_jobs: int, seed: int, params: Optional[dict] = None):
+    from sklearn.ensemble import RandomForestRegressor
+
+    params = {**RF_PARAMS, **(params or {})}
+    max_samples = min(len(y), int(params.pop("max_samples", RF_MAX_SAMPLES)))
+    model = RandomForestRegressor(**params, max_samples=max_samples, n_jobs=n_jobs, random_state=seed)
+    model.fit(X, y)
+    return model, {**params, "max_samples": max_samples}
+
+
+def _row_batches(X: np.ndarray, y: np.ndarray, batch_rows: int):
+    for lo in range(0, len(y), batch_rows):
+        yield np.ascontiguousarray(X[lo:lo + batch_rows]), np.ascontiguousarray(y[lo:lo + batch_rows])
+
+
+def train_xgboost(X: np.ndarray, y: np.ndarray, n_jobs: int, seed: int, batch_rows: int = CHUNK_ROWS,
+                  params: Optional[dict] = None, rounds: int = XGB_ROUNDS):
+    import xgboost as xgb
+
+    class _Batches(xgb.DataIter):
+        def __init__(self):
+            self._it = None
+            super().__init__()
+
+        def next(self, input_data) -> int:
+            if self._it is None:
+                self._it = _row_batches(X, y, batch_rows)
+            batch = next(self._it, None)
+            if batch is None:
+                return 0
+            input_data(data=batch[0], label=batch[1])
+            return 1
+
+        def reset(self) -> None:
+            self._it = None
+
+    params = {**XGB_PARAMS, **(params or {}), "nthread": os.cpu_count() if n_jobs in (-1, 0, None) else n_jobs,
+              "seed": seed}
+    dtrain = xgb.QuantileDMatrix(_Batches(), max_bin=params["max_bin"])
+    booster = xgb.train(params, dtrain, num_boost_round=rounds)
+    # the sklearn wrapper, so serving calls model.predict(ndarray) like for the forest
+    model = xgb.XGBRegressor()
+    model.load_model(bytearray(booster.save_raw("json")))
+    return model, {**params, "n_estimators": rounds}
+
+
+# ----- 4. evaluate -----
+def evaluate(model: Any, X: np.ndarray, y: np.ndarray, batch_rows: int = CHUNK_ROWS) -> Dict[str, Optional[float]]:
+    """MAE/MSE/R² accumulated over row batches."""
+    n, abs_sum, sq_sum, y_sum, y_sq = 0, 0.0, 0.0, 0.0, 0.0
+    for Xb, yb in _row_batches(X, y, batch_rows):
+        err = np.asarray(model.predict(Xb), dtype=np.float64) - yb
+        yb = yb.astype(np.float64)
+        n += len(yb)
+        abs_sum += float(np.abs(err).sum())
+        sq_sum += float((err ** 2).sum())
+        y_sum += float(yb.sum())
+        y_sq += float((yb ** 2).sum())
+    if not n:
+        return {"mae": None, "mse": None, "r2": None, "rows": 0}
+    ss_tot = y_sq - y_sum ** 2 / n
+    return {"mae": abs_sum / n, "mse": sq_sum / n, "r2": 1.0 - sq_sum / ss_tot if ss_tot > 0 else None, "rows": n}
+
+
+# ----- pipeline -----
+def train(
+    sources: List[Tuple[Path, Optional[int]]],
+    versions_dir: Path,
+    version: Optional[str] = None,
+    candidates: Sequence[str] = ("RandomForest", "XGBoost"),
+    derived: Sequence[str] = (),
+    chunk_rows: int = CHUNK_ROWS,
+    n_jobs: int = -1,
+    val_frac: float = 0.1,
+    test_frac: float = 0.1,
+    seed: int = 42,
+    work_dir: Optional[Path] = None,
+    keep_work: bool = False,
+    rf_params: Optional[dict] = None,
+    xgb_params: Optional[dict] = None,
+    xgb_rounds: int = XGB_ROUNDS,
+    activate: bool = False,
+    force: bool = False,
+) -> Path:
+    """
+    Train on `sources` ((csv, None) = hash split by trip, (csv, 0/1/2) = a fixed split) and
+    write models/versions/<version>/ (and point ACTIVE at it if `activate`). Returns the version directory.
+    An existing version is only replaced with `force` (it may be the one being served).
+    """
+    import joblib
+    from sklearn.preprocessing import LabelEncoder
+
+    t_start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    versions_dir = Path(versions_dir)
+    if version.startswith(".") or Path(version).name != version:
+        raise ValueError(f"Invalid model version name {version!r}")
+    out = versions_dir / version
+    # checked before hours of training, not at the end
+    if out.exists() and not force:
+        raise FileExistsError(f"Model version '{version}' already exists at {out}; use --force to replace it")
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    own_work = work_dir is None
+    # scratch space is dot-prefixed: ModelRegistry.list_versions skips those directories
+    work = Path(work_dir) if work_dir else Path(tempfile.mkdtemp(prefix=f".train-{version}-", dir=versions_dir))
+    work.mkdir(parents=True, exist_ok=True)
+    try:
+        with _timed(timings, "spool"):
+            spool = _spool(sources, work, chunk_rows, val_frac, test_frac, seed)
+        encoder = LabelEncoder().fit(spool["classes"])
+        pipeline = FeaturePipeline(RouteEncoder.from_label_encoder(encoder), derived)
+        with _timed(timings, "features"):
+            data = _build_features(spool, pipeline, work, n_jobs)
+        rows = {name: int(len(data[name][1])) for name in SPLITS}
+        if not rows["train"]:
+            raise ValueError("No training rows")
+
+        trainers = {"RandomForest": lambda X, y: train_random_forest(X, y, n_jobs, seed, rf_params),
+                    "XGBoost": lambda X, y: train_xgboost(X, y, n_jobs, seed, chunk_rows, xgb_params, xgb_rounds)}
+        results: Dict[str, Dict[str, Any]] = {}
+        models: Dict[str, Any] = {}
+        for name in candidates:
+            try:
+                with _timed(timings, f"train_{name}"):
+                    models[name], params = trainers[name](*data["train"])
+            except ImportError as e:
+                logger.warning("Skipping %s: %s", name, e)
+                continue
+            with _timed(timings, f"validate_{name}"):
+                val = evaluate(models[name], *data["val"], batch_rows=chunk_rows)
+            results[name] = {"params": params, "val": val, "train_seconds": timings[f"train_{name}"]}
+            logger.info("%s validation: %s", name, val)
+        if not models:
+            raise ValueError(f"None of {list(candidates)} could be trained")
+
+        # lower validation MAE wins (as in the notebook); no validation rows -> first candidate
+        best_name = min(models, key=lambda n: (results[n]["val"]["mae"] is None, results[n]["val"]["mae"] or 0.0))
+        best = models[best_name]
+        with _timed(timings, "test"):
+            test = evaluate(best, *data["test"], batch_rows=chunk_rows)
+
+        importances = getattr(best, "feature_importances_", None)
+        timings["total"] = round(time.perf_counter() - t_start, 3)
+        metadata = {
+            "model_type": best_name,
+            "version": version,
+            "feature_columns": pipeline.columns,
+            "feature_names": pipeline.feature_names,
+            "label_encoder_classes": encoder.classes_.tolist(),
+            "performance": {"test_mae": test["mae"], "test_mse": test["mse"], "test_r2": test["r2"]},
+            "candidates": results,
+            "feature_importances": (dict(zip(pipeline.columns, np.asarray(importances, dtype=float).tolist()))
+                                    if importances is not None else None),
+            "data": {
+                "sources": [{"path": str(p), "split": None if s is None else SPLITS[s]} for p, s in sources],
+                "rows": rows,
+                "chunks": len(spool["chunks"]),
+                "chunk_rows": chunk_rows,
+                "split": {"by": "trip_id hash", "val_frac": val_frac, "test_frac": test_frac, "seed": seed},
+                "raw_mib": spool["raw_mib"],
+                "reduced_mib": spool["reduced_mib"],
+            },
+            "timings": timings,
+            "n_jobs": n_jobs,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+        # written next to the final directory, then renamed, so the registry never sees half a version
+        tmp = versions_dir / f".{version}.tmp-{os.getpid()}"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir()
+        joblib.dump(best, tmp / MODEL_FILE)
+        joblib.dump(encoder, tmp / ENCODER_FILE)
+        with open(tmp / METADATA_FILE, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=4)
+        if out.exists():
+            if not force:
+                raise FileExistsError(f"Model version '{version}' was created while training; use --force to replace it")
+            logger.warning("Replacing existing model version %s at %s", version, out)
+            # moved aside first so `out` is only missing between two renames
+            old = versions_dir / f".{version}.old-{os.getpid()}"
+            os.replace(out, old)
+            os.replace(tmp, out)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, out)
+        if activate:
+            (versions_dir / "ACTIVE").write_text(version, encoding="utf-8")
+        logger.info("Model %s (%s) saved to %s: test %s", version, best_name, out, test)
+        return out
+    finally:
+        if own_work and not keep_work:
+            shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,263 @@
+# backend/models/tree_engine.py
+"""
+Flat-array evaluator for tree ensembles.
+
+The trees of a fitted sklearn forest (or an XGBoost booster) are copied into a few
+contiguous NumPy arrays. Prediction walks every tree for every row level by level with
+vectorized indexing, so there is no per-call sklearn validation or joblib dispatch.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, List, Optional
+
+import numpy as np
+
+from ..utils.array_store import load_arrays, save_arrays
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledForest:
+    """
+    Node arrays (global node ids; leaves have left == -1):
+      left, right       child ids
+      feature           split feature (0 on leaves)
+      threshold         split value
+      missing_left      NaN goes to the left child
+      value             leaf output
+    `roots` holds each tree's root id. Output is `base + sum(leaf) * scale`.
+    """
+
+    def __init__(
+        self,
+        left: np.ndarray,
+        right: np.ndarray,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        missing_left: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        n_features: int,
+        strict_less: bool,
+        base: float = 0.0,
+        scale: float = 1.0,
+        kind: str = "sklearn",
+    ):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.strict_less = bool(strict_less)  # xgboost: x < t goes left; sklearn: x <= t
+        self.base = float(base)
+        self.scale = float(scale)
+        self.kind = kind
+        self.source: dict = {}  # model file the arrays were compiled from (see save/load)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in (self.left, self.right, self.feature, self.threshold,
+                                          self.missing_left, self.value, self.roots)))
+
+    # ----- persistence (mapped arrays shared by worker processes) -----
+    ARRAYS = ("left", "right", "feature", "threshold", "missing_left", "value", "roots")
+
+    def save(self, out_dir, source: Optional[dict] = None):
+        meta = {
+            "kind": self.kind, "max_depth": self.max_depth, "n_features": self.n_features,
+            "strict_less": self.strict_less, "base": self.base, "scale": self.scale,
+            "source": source or {},
+        }
+        return save_arrays(out_dir, {name: getattr(self, name) for name in self.ARRAYS}, meta)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "CompiledForest":
+        arrays, meta = load_arrays(path, mmap=mmap)
+        forest = cls(
+            *(arrays[name] for name in cls.ARRAYS),
+            max_depth=meta["max_depth"], n_features=meta["n_features"], strict_less=meta["strict_less"],
+            base=meta["base"], scale=meta["scale"], kind=meta["kind"],
+        )
+        forest.source = meta.get("source", {})
+        return forest
+
+    # ----- builders -----
+    @classmethod
+    def from_model(cls, model: Any) -> "CompiledForest":
+        if hasattr(model, "get_booster"):
+            # an early-stopped XGBRegressor predicts with its first best_iteration + 1 rounds only
+            try:
+                best = model.best_iteration
+            except AttributeError:
+                best = None
+            return cls.from_xgboost(model.get_booster(), n_rounds=None if best is None else int(best) + 1)
+        if hasattr(model, "estimators_") or hasattr(model, "tree_"):
+            return cls.from_sklearn(model)
+        raise TypeError(f"Cannot compile model of type {type(model).__name__}")
+
+    @classmethod
+    def from_sklearn(cls, model: Any) -> "CompiledForest":
+        """RandomForestRegressor / ExtraTreesRegressor (mean of trees) or a single DecisionTreeRegressor."""
+        estimators = list(getattr(model, "estimators_", [model]))
+        if estimators and isinstance(estimators[0], np.ndarray):
+            raise TypeError("Gradient boosting ensembles are not supported")
+        parts: List[tuple] = []
+        offset = 0
+        roots, depth = [], 0
+        for est in estimators:
+            t = est.tree_
+            if t.value.shape[1] != 1 or t.value.shape[2] != 1:
+                raise TypeError("Only single-output regression trees are supported")
+            left = t.children_left.astype(np.int64)
+            right = t.children_right.astype(np.int64)
+            leaf = left < 0
+            mgl = getattr(t, "missing_go_to_left", None)
+            parts.append((
+                np.where(leaf, -1, left + offset),
+                np.where(leaf, -1, right + offset),
+                np.where(leaf, 0, t.feature).astype(np.int64),
+                t.threshold.astype(np.float64),
+                np.asarray(mgl, dtype=bool) if mgl is not None else np.zeros(t.node_count, dtype=bool),
+                t.value[:, 0, 0].astype(np.float64),
+            ))
+            roots.append(offset)
+            depth = max(depth, int(t.max_depth))
+            offset += t.node_count
+        arrays = [np.concatenate(col) for col in zip(*parts)]
+        return cls(*arrays, roots=np.asarray(roots, dtype=np.int64), max_depth=depth,
+                   n_features=int(getattr(model, "n_features_in_", 0)), strict_less=False,
+                   scale=1.0 / len(estimators), kind="sklearn")
+
+    @classmethod
+    def from_xgboost(cls, booster: Any, n_rounds: Optional[int] = None) -> "CompiledForest":
+        """
+        Regression booster (gbtree); prediction is base_score + sum of leaves.
+        `n_rounds` keeps only the first boosting rounds (XGBRegressor.best_iteration + 1).
+        """
+        dumps = booster.get_dump(dump_format="json")
+        if n_rounds is not None:
+            total = booster.num_boosted_rounds()
+            if not 0 < n_rounds <= total or len(dumps) % total:
+                raise TypeError(f"Cannot keep {n_rounds} of {total} boosting rounds ({len(dumps)} trees)")
+            dumps = dumps[:n_rounds * (len(dumps) // total)]
+        cfg = json.loads(booster.save_config())
+        base = cfg["learner"]["learner_model_param"]["base_score"]
+        base = float(str(base).strip("[]"))
+        feature_names = booster.feature_names
+
+        left, right, feature, threshold, missing_left, value = [], [], [], [], [], []
+        roots, depth = [], 0
+
+        def walk(node: dict, d: int) -> int:
+            nonlocal depth
+            gid = len(left)
+            left.append(-1); right.append(-1); feature.append(0)
+            threshold.append(0.0); missing_left.append(False); value.append(0.0)
+            depth = max(depth, d)
+            if "leaf" in node:
+                value[gid] = float(node["leaf"])
+                return gid
+            children = {c["nodeid"]: c for c in node["children"]}
+            split = node["split"]
+            if feature_names and split in feature_names:
+                feature[gid] = feature_names.index(split)
+            else:
+                feature[gid] = int(str(split).lstrip("f"))
+            threshold[gid] = float(node.get("split_condition", 0.0))
+            missing_left[gid] = node.get("missing") == node["yes"]
+            left[gid] = walk(children[node["yes"]], d + 1)
+            right[gid] = walk(children[node["no"]], d + 1)
+            return gid
+
+        for dump in dumps:
+            roots.append(walk(json.loads(dump), 0))
+
+        return cls(
+            np.asarray(left, dtype=np.int64), np.asarray(right, dtype=np.int64),
+            # xgboost stores split values as float32; the dump prints them rounded
+            np.asarray(feature, dtype=np.int64), np.asarray(threshold, dtype=np.float32).astype(np.float64),
+            np.asarray(missing_left, dtype=bool), np.asarray(value, dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.int64), max_depth=depth,
+            n_features=int(booster.num_features()), strict_less=True, base=base, kind="xgboost",
+        )
+
+    # ----- inference -----
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # both sklearn and xgboost split on float32 inputs
+        X = X.astype(np.float32).astype(np.float64)
+        n = X.shape[0]
+        node = np.repeat(self.roots[:, None], n, axis=1)   # (n_trees, n_rows)
+        row = np.broadcast_to(np.arange(n), node.shape)
+        for _ in range(self.max_depth):
+            lch = self.left[node]
+            active = lch >= 0
+            if not active.any():
+                break
+            x = X[row, self.feature[node]]
+            thr = self.threshold[node]
+            go_left = (x < thr) if self.strict_less else (x <= thr)
+            nan = np.isnan(x)
+            if nan.any():
+                go_left = np.where(nan, self.missing_left[node], go_left)
+            node = np.where(active, np.where(go_left, lch, self.right[node]), node)
+        leaves = self.value[node]
+        # accumulate tree by tree (same order as sklearn) so results match bit for bit
+        out = np.zeros(n, dtype=np.float64)
+        for t in range(self.n_trees):
+            out += leaves[t]
+        if self.kind == "sklearn":
+            out /= self.n_trees
+        else:
+            out = out * self.scale + self.base
+        return out
+
+
+def compile_and_validate(model: Any, n_samples: int = 512, atol: Optional[float] = None, seed: int = 0) -> Optional[CompiledForest]:
+    """
+    Compile `model` and check it against `model.predict` on synthetic rows that straddle
+    the split thresholds. Returns None (caller keeps the original model) on any mismatch.
+    Default tolerance is 1e-9 for sklearn (float64 sums) and 1e-4 for xgboost (float32 sums).
+    """
+    try:
+        forest = CompiledForest.from_model(model)
+    except Exception as e:
+        logger.warning("Tree compilation unavailable for %s: %s", type(model).__name__, e)
+        return None
+
+    rng = np.random.default_rng(seed)
+    n_features = forest.n_features or int(forest.feature.max()) + 1
+    X = np.zeros((n_samples, n_features))
+    internal = forest.left >= 0
+    for f in range(n_features):
+        thr = forest.threshold[internal & (forest.feature == f)]
+        if len(thr):
+            picks = rng.choice(thr, size=n_samples)
+            X[:, f] = picks + rng.choice([-1.0, 0.0, 1.0], size=n_samples) * np.maximum(np.abs(picks), 1.0) * 1e-3
+        else:
+            X[:, f] = rng.normal(size=n_samples)
+
+    if atol is None:
+        atol = 1e-9 if forest.kind == "sklearn" else 1e-4
+    expected = np.asarray(model.predict(X), dtype=np.float64)
+    got = forest.predict(X)
+    err = float(np.max(np.abs(expected - got))) if len(got) else 0.0
+    if not np.all(np.abs(expected - got) <= atol):
+        logger.warning("Compiled %s forest disagrees with model.predict (max abs err %.3g); not used", forest.kind, err)
+        return None
+    logger.info("Compiled %s forest: %d trees, depth %d, %.1f KiB (max abs err %.1g)",
+                forest.kind, forest.n_trees, forest.max_depth, forest.nbytes / 1024, err)
+    return forest
@@ -1,42 +1,35 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from ..schemas.prediction import PredictionRequest, PredictionResponse
-from ..services.prediction import PredictionService
-from ..services.eta import ETAService
-from ..schemas.route_eta import RouteEtaRequest, RouteEtaResponse
-from pathlib import Path
+from ..schemas.route_eta import RouteEtaRequest, RouteEtaResponse, ResponseFormat
+from ..services.executor import executor, ExecutorSaturated, ServiceUnavailable
+from ..utils.fast_json import fast_json_response
 
 router = APIRouter()
 
-# ML model service
-prediction_service = PredictionService(
-    model_path="models/trained_model.pkl",
-    encoder_path="models/route_label_encoder.pkl"
-)
-
-# ETA service — full path
-eta_service = ETAService(
-    dataset_path=Path(__file__).parent.parent / "../data/processed/bus_delay_dataset.csv"
-)
+# ML model and ETA services are built lazily by the service registry
+# (see services/registry.py) instead of at import time. The handlers are async and hand
+# the CPU work to the bounded executor (services/executor.py), so the event loop stays free.
 
 
 @router.post("/predict", response_model=PredictionResponse)
-def predict(request: PredictionRequest):
+async def predict(request: PredictionRequest):
     try:
-        return prediction_service.make_prediction(request)
+        return await executor.run("prediction", "make_prediction", request)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/predict_delay", response_model=RouteEtaResponse)
-def predict_delay(request: RouteEtaRequest):
-    if eta_service is None:
-        raise HTTPException(status_code=503, detail="ETA service not initialized")
-
+async def predict_delay(request: RouteEtaRequest, http_request: Request, format: ResponseFormat = "json"):
     try:
-        return eta_service.get_eta(request)
+        if format == "columnar":
+            # compact arrays + polyline, no per-stop models (see routes/route_eta.py)
+            payload = await executor.run("eta", "get_eta", request, True)
+            return fast_json_response(http_request, payload)
+        return await executor.run("eta", "get_eta", request)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except (ExecutorSaturated, ServiceUnavailable):
+        raise  # 503 (see main.py)
     except Exception:
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -1,22 +1,214 @@
-from fastapi import APIRouter, HTTPException
-from ..schemas.route_eta import RouteEtaRequest, RouteEtaResponse
-from ..services.ai_routing import ai_routing_service  # Make sure this exists and is initialized
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from ..schemas.route_eta import (
+    RouteEtaRequest,
+    RouteEtaResponse,
+    RouteEtaBatchRequest,
+    RouteEtaBatchItem,
+    RouteEtaBatchResponse,
+    NearbyStop,
+    NearestStopsResponse,
+    ObservationBatch,
+    ObservationBatchResponse,
+    JourneyRequest,
+    JourneyResponse,
+    ResponseFormat,
+)
+from ..services.executor import executor, ExecutorSaturated, ServiceUnavailable
+from ..services.ingest import consumer
+from ..utils.spatial_index import get_spatial_index
+from ..utils.route_index import get_stops_for_route, slice_stops_by_ids
+from ..utils.route_geometry import get_route_geometry
+from ..utils.fast_json import fast_json_response
+from ..config import ROUTE_INDEX_PATH, ROUTE_GEOMETRY_PATH, LIVE_DELAYS_ENABLED
 
 router = APIRouter()
 
 @router.post("/route_eta", response_model=RouteEtaResponse)
-def route_eta_endpoint(req: RouteEtaRequest):
+async def route_eta_endpoint(req: RouteEtaRequest, request: Request, format: ResponseFormat = "json"):
     """
     Computes ETA for a route using AI routing service.
+    `?format=columnar` returns parallel arrays + an encoded polyline (see utils/columnar.py).
     """
     try:
-        resp = ai_routing_service.compute_route_eta(req)
+        if format == "columnar":
+            payload = await executor.run("ai_routing", "compute_route_eta", req, True)
+            return fast_json_response(request, payload)
+        resp = await executor.run("ai_routing", "compute_route_eta", req)
         return resp
     except KeyError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except (ExecutorSaturated, ServiceUnavailable):
+        raise  # 503 (see main.py)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _error_status(e: Exception) -> int:
+    # same mapping as the single-request endpoint
+    if isinstance(e, KeyError):
+        return 404
+    if isinstance(e, ValueError):
+        return 400
+    if isinstance(e, FileNotFoundError):
+        return 503  # missing data files, like ServiceUnavailable
+    return 500
+
+
+@router.post("/route_eta/batch", response_model=RouteEtaBatchResponse)
+async def route_eta_batch_endpoint(req: RouteEtaBatchRequest, request: Request, format: ResponseFormat = "json"):
+    """
+    Computes ETAs for many route segments in one call; errors are reported per item.
+    """
+    columnar = format == "columnar"
+    items = []
+    results = await executor.run("ai_routing", "compute_route_eta_batch", req.requests, columnar)
+    for i, (resp, err) in enumerate(results):
+        if err is None:
+            items.append({"index": i, "status_code": 200, "result": resp} if columnar
+                         else RouteEtaBatchItem(index=i, result=resp))
+        else:
+            code = _error_status(err)
+            detail = {500: "Internal server error", 503: "Service temporarily unavailable"}.get(code, str(err))
+            items.append({"index": i, "status_code": code, "error": detail} if columnar
+                         else RouteEtaBatchItem(index=i, status_code=code, error=detail))
+    n_ok = sum(1 for _, err in results if err is None)
+    if columnar:
+        return fast_json_response(request, {"format": "columnar", "results": items,
+                                            "n_ok": n_ok, "n_failed": len(items) - n_ok})
+    return RouteEtaBatchResponse(results=items, n_ok=n_ok, n_failed=len(items) - n_ok)
+
+
+@router.post("/journey", response_model=JourneyResponse)
+async def journey_endpoint(req: JourneyRequest):
+    """
+    Fastest itineraries between two stops or coordinates across all routes, with walking
+    transfers, costed with predicted delays (services/journey.py).
+    """
+    try:
+        return await executor.run("journey", "plan", req)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/timetable/{route_short_name}")
+async def timetable_endpoint(
+    route_short_name: str,
+    request: Request,
+    date: Optional[str] = Query(None, description="Service date YYYY-MM-DD (default: today)"),
+    from_time: Optional[str] = Query(None, description="Window start HH:MM[:SS]"),
+    to_time: Optional[str] = Query(None, description="Window end HH:MM[:SS] (hours past 24 allowed)"),
+):
+    """
+    Scheduled and predicted arrivals of every trip x stop of a route for one service day,
+    per stop pattern as (trips x stops) arrays of seconds after midnight (services/timetable.py).
+    """
+    try:
+        payload = await executor.run("timetable", "timetable", route_short_name, date, from_time, to_time)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return fast_json_response(request, payload)
+
+
+@router.get("/nearest_stops", response_model=NearestStopsResponse)
+def nearest_stops_endpoint(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100, description="Max stops to return"),
+    radius_m: Optional[float] = Query(None, gt=0, description="Only stops within this radius"),
+    route_short_name: Optional[str] = Query(None, description="Restrict to one route"),
+):
+    """
+    Nearest stops (and the routes serving them) for a coordinate, network-wide or on one route.
+    """
+    try:
+        # the grid index only, so this does not load the model
+        index = get_spatial_index(str(ROUTE_INDEX_PATH))
+    except FileNotFoundError:
+        raise ServiceUnavailable("route_index")
+
+    coord = (lat, lon)
+    if route_short_name is not None:
+        if route_short_name not in index.route_lat:
+            raise HTTPException(status_code=404, detail=f"Route {route_short_name} not found in route index")
+        if radius_m is not None:
+            pos, dist = index.within_on_route(route_short_name, coord, radius_m / 1000.0)
+        else:
+            pos, dist = index.nearest_on_route(route_short_name, coord, k)
+        rows = index.route_rows[route_short_name][pos]
+        keep = rows >= 0
+        rows, dist = rows[keep], dist[keep]
+    else:
+        if radius_m is not None:
+            rows, dist = index.within(coord, radius_m / 1000.0)
+        else:
+            rows, dist = index.nearest(coord, k)
+
+    stops = [NearbyStop(**index.describe(r, d)) for r, d in zip(rows[:k].tolist(), dist[:k].tolist())]
+
+    return NearestStopsResponse(lat=lat, lon=lon, route_short_name=route_short_name, stops=stops)
+
+
+@router.get("/geometry/{route_short_name}")
+def route_geometry_endpoint(
+    route_short_name: str,
+    request: Request,
+    from_stop_id: Optional[int] = Query(None, description="Segment start (default: first stop)"),
+    to_stop_id: Optional[int] = Query(None, description="Segment end (default: last stop)"),
+):
+    """
+    Road-following path of a route (or one stop segment of it) as an encoded polyline.
+    Served from the prebuilt geometry store (scripts/build_route_geometry.py); stop pairs
+    it does not cover are straight lines. Static per route, so clients may cache it.
+    """
+    try:
+        route_stops = get_stops_for_route(route_short_name, str(ROUTE_INDEX_PATH))
+        if from_stop_id is not None or to_stop_id is not None:
+            route_stops = slice_stops_by_ids(
+                route_stops,
+                from_stop_id if from_stop_id is not None else route_stops[0]["stop_id"],
+                to_stop_id if to_stop_id is not None else route_stops[-1]["stop_id"],
+            )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except FileNotFoundError:
+        raise ServiceUnavailable("route_index")
+
+    store = get_route_geometry(str(ROUTE_GEOMETRY_PATH))
+    polyline = store.polyline(
+        [int(s["stop_id"]) for s in route_stops],
+        [float(s.get("lat") or s.get("stop_lat") or 0.0) for s in route_stops],
+        [float(s.get("lon") or s.get("stop_lon") or 0.0) for s in route_stops],
+    )
+    payload = {
+        "route_short_name": route_short_name,
+        "from_stop_id": int(route_stops[0]["stop_id"]) if route_stops else None,
+        "to_stop_id": int(route_stops[-1]["stop_id"]) if route_stops else None,
+        "stop_count": len(route_stops),
+        "router": store.meta.get("router", "straight"),
+        "polyline": polyline,
+    }
+    return fast_json_response(request, payload, headers={"Cache-Control": "public, max-age=86400"})
+
+
+@router.post("/observations", response_model=ObservationBatchResponse, status_code=202)
+def ingest_observations(batch: ObservationBatch):
+    """
+    Observed arrivals, applied to the live delay aggregates by a background consumer.
+    Returns once the batch is queued; a full queue answers 503 with Retry-After.
+    """
+    if not LIVE_DELAYS_ENABLED:
+        raise HTTPException(status_code=404, detail="Live delay ingestion is disabled")
+    queued = consumer.submit(batch.observations)
+    return ObservationBatchResponse(accepted=len(batch.observations), queued_batches=queued)
+
+
+@router.get("/observations/status")
+def observations_status():
+    return consumer.status()
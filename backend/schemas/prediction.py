@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -12,3 +13,4 @@ class PredictionRequest(BaseModel):
 class PredictionResponse(BaseModel):
     route_id: str
     prediction: float
+    model_version: Optional[str] = None
@@ -1,8 +1,13 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Tuple
+from datetime import datetime
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional, Tuple
 
 Coord = Tuple[float, float]
 
+# "json": the response models below; "columnar": parallel arrays + encoded polyline,
+# serialized without per-stop validation (utils/columnar.py, utils/fast_json.py)
+ResponseFormat = Literal["json", "columnar"]
+
 
 class RouteEtaRequest(BaseModel):
     route_short_name: str = Field(..., description="Route short name (e.g., 142)")
@@ -30,3 +35,108 @@ class RouteEtaResponse(BaseModel):
     waypoints: List[Coord]  # list of (lat, lon)
     stops: List[StopPrediction]
     summary: dict
+    geometry: Optional[str] = Field(None, description="Road-following path through the stops (encoded polyline)")
+
+
+class RouteEtaBatchRequest(BaseModel):
+    requests: List[RouteEtaRequest] = Field(..., min_length=1, max_length=1000)
+
+
+class RouteEtaBatchItem(BaseModel):
+    index: int
+    status_code: int = 200
+    result: Optional[RouteEtaResponse] = None
+    error: Optional[str] = None
+
+
+class RouteEtaBatchResponse(BaseModel):
+    results: List[RouteEtaBatchItem]
+    n_ok: int
+    n_failed: int
+
+
+class NearbyStop(BaseModel):
+    stop_id: int
+    stop_name: Optional[str]
+    lat: float
+    lon: float
+    distance_m: float
+    routes: List[str]
+
+
+class NearestStopsResponse(BaseModel):
+    lat: float
+    lon: float
+    route_short_name: Optional[str] = None
+    stops: List[NearbyStop]
+
+
+class ObservedArrival(BaseModel):
+    route_short_name: str = Field(..., description="Route short name or route_id")
+    stop_id: int
+    delay_minutes: float = Field(..., ge=-120, le=720, description="Observed arrival minus scheduled, in minutes")
+    observed_at_iso: Optional[str] = Field(None, description="When the bus arrived (defaults to now)")
+
+    @field_validator("observed_at_iso")
+    @classmethod
+    def _valid_timestamp(cls, v: Optional[str]) -> Optional[str]:
+        # picks the (day_of_week, hour) cell and the decay stamp, so a bad one must not become "now"
+        if v is not None:
+            try:
+                datetime.fromisoformat(v.replace("Z", "+00:00"))
+            except ValueError:
+                raise ValueError(f"observed_at_iso must be an ISO timestamp, got {v!r}") from None
+        return v
+
+
+class ObservationBatch(BaseModel):
+    observations: List[ObservedArrival] = Field(..., min_length=1, max_length=10000)
+
+
+class ObservationBatchResponse(BaseModel):
+    accepted: int
+    queued_batches: int
+
+
+class JourneyRequest(BaseModel):
+    from_stop_id: Optional[int] = Field(None, description="Origin stop_id (preferred)")
+    to_stop_id: Optional[int] = Field(None, description="Destination stop_id (preferred)")
+    from_coord: Optional[Coord] = Field(None, description="Origin coord (lat, lon); walks to nearby stops")
+    to_coord: Optional[Coord] = Field(None, description="Destination coord (lat, lon)")
+    depart_at_iso: Optional[str] = Field(None, description="Departure time (defaults to now)")
+    max_transfers: Optional[int] = Field(None, ge=0, le=8, description="Capped by ROUTEMINDS_JOURNEY_MAX_TRANSFERS")
+    max_walk_m: Optional[float] = Field(None, gt=0, le=5000, description="Walk to/from the first/last stop")
+    max_itineraries: int = Field(3, ge=1, le=10)
+
+
+class JourneyLeg(BaseModel):
+    mode: Literal["walk", "bus"]
+    from_stop_id: Optional[int] = None  # None: the origin/destination coordinate
+    to_stop_id: Optional[int] = None
+    from_stop_name: Optional[str] = None
+    to_stop_name: Optional[str] = None
+    route_short_name: Optional[str] = None
+    trip_id: Optional[str] = None
+    departure_iso: str
+    arrival_iso: str
+    scheduled_departure_time: Optional[str] = None
+    scheduled_arrival_time: Optional[str] = None
+    predicted_delay_minutes: Optional[float] = None
+    duration_minutes: float
+    n_stops: Optional[int] = None
+    distance_m: Optional[float] = None
+
+
+class JourneyItinerary(BaseModel):
+    departure_iso: str
+    arrival_iso: str
+    duration_minutes: float
+    n_transfers: int
+    walk_m: float
+    legs: List[JourneyLeg]
+
+
+class JourneyResponse(BaseModel):
+    depart_at_iso: str
+    itineraries: List[JourneyItinerary]
+    summary: dict
@@ -0,0 +1,22 @@
+import sys
+from pathlib import Path
+
+from backend.utils.dataset_snapshot import default_snapshot_dir, load_clean_csv, write_snapshot
+from backend.utils.delay_cube import DelayCube
+
+CSV_PATH = Path("data/processed/bus_delay_dataset.csv")
+
+
+def build_dataset_snapshot(csv_path=CSV_PATH, out_dir=None):
+    out_dir = Path(out_dir) if out_dir else default_snapshot_dir(csv_path)
+
+    df = load_clean_csv(csv_path)
+    delays = DelayCube.from_frame(df)
+    write_snapshot(df, delays, out_dir, source_path=csv_path)
+
+    print(f"Dataset snapshot saved to {out_dir} ({len(df)} rows, delay cube {delays.nbytes / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    # python -m backend.scripts.build_dataset_snapshot [csv_path] [out_dir]
+    build_dataset_snapshot(*sys.argv[1:3])
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+from backend.config import ROUTE_INDEX_PATH
+from backend.models.delay_table import DelayTable, source_identity
+from backend.models.registry import MODEL_FILE, model_registry
+from backend.utils.route_index import load_route_index
+
+
+def build_delay_table(version=None, out_dir=None, n_jobs=-1, index_path=ROUTE_INDEX_PATH):
+    # scores every (route, stop, day_of_week, hour, holiday) with the given model version
+    handle = model_registry.load(version or model_registry.default_version())
+    out_dir = Path(out_dir) if out_dir else handle.path / "delay_table"
+
+    table = DelayTable.build(
+        str(handle.path / MODEL_FILE),
+        load_route_index(str(index_path)),
+        handle.model.route_codes,
+        n_jobs=int(n_jobs),
+        model_version=handle.version,
+        feature_columns=handle.model.features.columns,
+    )
+    table.meta["route_index"] = str(index_path)
+    table.meta["route_index_source"] = source_identity(index_path)
+    table.save(out_dir)
+
+    print(f"Delay table for model {handle.version} saved to {out_dir} "
+          f"({table.meta['n_routes']} routes, {table.meta['n_slots']} stops, "
+          f"{table.nbytes / 2**20:.1f} MiB, {table.meta['build_seconds']}s)")
+
+
+if __name__ == "__main__":
+    # python -m backend.scripts.build_delay_table [version] [out_dir] [n_jobs]
+    build_delay_table(*sys.argv[1:4])
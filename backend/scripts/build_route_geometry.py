@@ -0,0 +1,58 @@
+import argparse
+from pathlib import Path
+
+from backend.config import DATASET_PATH, ROUTE_GEOMETRY_PATH, ROUTE_INDEX_PATH
+from backend.utils.array_store import read_meta
+from backend.utils.route_index import load_route_index
+from backend.utils.route_geometry import GraphRouter, StraightLineRouter, build_geometry
+
+
+def _index_sequences(index_path):
+    for stops in load_route_index(str(index_path)).values():
+        yield ([s.get("stop_id") for s in stops],
+               [s.get("lat") or s.get("stop_lat") or 0.0 for s in stops],
+               [s.get("lon") or s.get("stop_lon") or 0.0 for s in stops])
+
+
+def _dataset_sequences(dataset_path):
+    # the ETA service's own stop order (from the dataset) can differ from the route index
+    from backend.services.eta import ETAService
+    from backend.utils.dataset_snapshot import load_dataset
+
+    df, delays = load_dataset(dataset_path)
+    for table in ETAService._build_route_tables(df, delays).values():
+        yield table.stop_id.tolist(), table.stop_lat.tolist(), table.stop_lon.tolist()
+
+
+def build_route_geometry(graph_path=None, out_dir=ROUTE_GEOMETRY_PATH, index_path=ROUTE_INDEX_PATH,
+                         dataset_path=DATASET_PATH, max_snap_m=300.0, max_detour=3.0, batch_size=8):
+    router = GraphRouter(graph_path, max_snap_m=max_snap_m, max_detour=max_detour, batch_size=batch_size) \
+        if graph_path else StraightLineRouter()
+    sequences = []
+    if Path(index_path).exists():
+        sequences += list(_index_sequences(index_path))
+    if dataset_path and Path(dataset_path).exists():
+        sequences += list(_dataset_sequences(dataset_path))
+    out = build_geometry(sequences, router, out_dir,
+                         meta={"graph": str(graph_path) if graph_path else None, "route_index": str(index_path)})
+    meta = read_meta(out)
+    print(f"Route geometry saved to {out}: {meta['n_pairs']} stop pairs, {meta['n_graph']} road-snapped, "
+          f"{meta['n_points']} points ({meta['router']}, {meta['build_seconds']}s)")
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute road-following geometry between consecutive stops")
+    parser.add_argument("--graph", help="road graph .npz (node_lat, node_lon, edge_u, edge_v[, edge_length_m]); "
+                                        "without it segments are straight lines")
+    parser.add_argument("--out", default=ROUTE_GEOMETRY_PATH)
+    parser.add_argument("--route-index", default=ROUTE_INDEX_PATH)
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--max-snap-m", type=float, default=300.0, help="farthest a stop may be from the road graph")
+    parser.add_argument("--max-detour", type=float, default=3.0,
+                        help="road paths longer than this x the straight distance are drawn straight")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="start stops per shortest-path batch (memory ~12 bytes x graph nodes x batch)")
+    args = parser.parse_args()
+    build_route_geometry(args.graph, args.out, args.route_index, args.dataset, args.max_snap_m,
+                         args.max_detour, args.batch_size)
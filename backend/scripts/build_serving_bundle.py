@@ -0,0 +1,82 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.config import DATASET_PATH, ROUTE_INDEX_PATH
+from backend.models.registry import model_registry
+from backend.services.eta import ETAService
+from backend.services.journey import JourneyPlanner
+from backend.utils.route_index import (
+    COLUMNAR_STOP_FIELDS,
+    ColumnarRouteIndex,
+    load_route_index,
+    read_columnar_index,
+    write_columnar_index,
+)
+
+# Builds, once per deploy, the read-only data every uvicorn worker would otherwise build
+# (and hold) on its own. Workers open it with mmap (ROUTEMINDS_SHARED_ARTIFACTS=1), so
+# N workers share one copy through the page cache:
+#   <dataset>.snapshot/        cleaned rows + delay cube (scripts/build_dataset_snapshot.py)
+#   <dataset>.snapshot/route_tables/   ETAService per-route stop tables
+#   <dataset>.snapshot/transit_network/   trip timetable + transfers for the journey planner
+#   data/processed/route_index/        columnar route index as plain .npy files
+#   models/versions/<v>/compiled_forest/   tree arrays for ROUTEMINDS_INFERENCE_ENGINE=compiled
+#   models/versions/<v>/delay_table/       optional, see scripts/build_delay_table.py
+# Run it after the dataset, index or model changes; stale pieces are ignored by the workers.
+
+
+def export_route_index(index_path, out_dir):
+    index_path = Path(index_path)
+    if index_path.suffix == ".npz" or index_path.is_dir():
+        a = read_columnar_index(index_path)
+        keys, offsets, stops, digest, meta = (a["route_keys"], a["offsets"],
+                                              {f: a[f] for f in COLUMNAR_STOP_FIELDS}, a["route_digest"], a["meta"])
+    else:
+        index = load_route_index(str(index_path))
+        keys = list(index)
+        records = [s for k in keys for s in index[k]]
+        offsets = np.concatenate([[0], np.cumsum([len(index[k]) for k in keys])])
+        stops = {f: [r.get(f) if r.get(f) is not None else "" for r in records]
+                 for f in ("stop_name", "scheduled_arrival_time")}
+        for f in ("stop_id", "stop_sequence", "lat", "lon"):
+            stops[f] = [r.get(f) for r in records]
+        digest, meta = None, {"source": str(index_path)}
+    return write_columnar_index(out_dir, keys, offsets, stops, route_digest=digest, meta=meta)
+
+
+def build_serving_bundle(dataset_path=DATASET_PATH, index_path=ROUTE_INDEX_PATH, versions=None, delay_table=False):
+    t0 = time.perf_counter()
+    tables_dir = ETAService.save_route_tables(str(dataset_path))
+    print(f"Route tables saved to {tables_dir}")
+    network_dir = JourneyPlanner.save_network(str(dataset_path))
+    print(f"Transit network saved to {network_dir}")
+
+    index_path = Path(index_path)
+    if index_path.exists() and not isinstance(load_route_index(str(index_path)), ColumnarRouteIndex):
+        out = export_route_index(index_path, index_path.with_suffix(""))
+        print(f"Route index saved to {out}")
+
+    for version in versions or [model_registry.default_version()]:
+        handle = model_registry.load(version)
+        out = handle.model.save_compiled()
+        print(f"Compiled forest for model {version}: {out or 'not supported, workers use model.predict'}")
+        if delay_table:
+            from backend.scripts.build_delay_table import build_delay_table
+
+            build_delay_table(version, index_path=index_path)
+
+    print(f"Serving bundle built in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped serving data shared by all workers")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--route-index", default=ROUTE_INDEX_PATH)
+    parser.add_argument("--model-version", action="append", dest="versions",
+                        help="model version(s) to compile (default: the one that would be served)")
+    parser.add_argument("--delay-table", action="store_true", help="also precompute the delay table")
+    args = parser.parse_args()
+    build_serving_bundle(args.dataset, args.route_index, args.versions, args.delay_table)
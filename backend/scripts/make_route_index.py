@@ -1,31 +1,154 @@
-import pandas as pd
-import json
+import argparse
+import os
 from pathlib import Path
 
-CSV_PATH = Path("data/processed/bus_delay_dataset.csv")  
-OUT_PATH = Path("data/processed/route_index.json")       
+import numpy as np
+import pandas as pd
+
+from backend.utils.route_index import COLUMNAR_STOP_FIELDS, read_columnar_index, write_columnar_index
+
+CSV_PATH = Path("data/processed/bus_delay_dataset.csv")
+OUT_PATH = Path("data/processed/route_index.npz")
+CHUNK_ROWS = 200_000
+
+USECOLS = ["route_id", "route_short_name", "direction_id", "stop_id", "stop_name",
+           "stop_lat", "stop_lon", "stop_sequence", "scheduled_arrival_time"]
+STOP_KEY = ["route_key", "stop_sequence", "stop_id"]
+
+
+def _read_chunks(csv_path, chunk_rows):
+    header = pd.read_csv(csv_path, nrows=0).columns
+    cols = [c for c in USECOLS if c in header]
+    str_cols = {c: str for c in ("route_id", "route_short_name", "stop_name", "scheduled_arrival_time") if c in header}
+    for chunk in pd.read_csv(csv_path, usecols=cols, dtype=str_cols, chunksize=chunk_rows):
+        chunk = chunk.dropna(subset=["route_id", "stop_id", "stop_sequence"])
+        chunk["stop_id"] = pd.to_numeric(chunk["stop_id"], errors="coerce")
+        chunk["stop_sequence"] = pd.to_numeric(chunk["stop_sequence"], errors="coerce")
+        chunk = chunk.dropna(subset=["stop_id", "stop_sequence"])
+        chunk["stop_id"] = chunk["stop_id"].astype(np.int64)
+        chunk["stop_sequence"] = chunk["stop_sequence"].astype(np.int64)
+        chunk["route_key"] = _route_keys(chunk)
+        yield chunk
+
+
+def _route_keys(chunk):
+    # services look routes up by short name; route_id when a row has none
+    name = chunk["route_short_name"].fillna(chunk["route_id"]) if "route_short_name" in chunk else chunk["route_id"]
+    if "direction_id" not in chunk:
+        return name
+    # direction 0 (or unknown) keeps the plain key, other directions get "<name>/<direction>"
+    direction = pd.to_numeric(chunk["direction_id"], errors="coerce").fillna(0).astype(np.int64)
+    return name.where(direction == 0, name + "/" + direction.astype(str))
+
+
+def _add_digests(digests, chunk):
+    # order-independent per-route content hash: sum of row hashes mod 2**64
+    h = pd.util.hash_pandas_object(chunk[[c for c in USECOLS if c in chunk]], index=False)
+    for key, value in h.groupby(chunk["route_key"].to_numpy()).sum().items():
+        digests[key] = (digests.get(key, 0) + int(value)) & 0xFFFFFFFFFFFFFFFF
+    return digests
+
+
+def _aggregate(chunk):
+    # one row per (route, sequence, stop); trips serving it are counted, the earliest scheduled time kept
+    return chunk.groupby(STOP_KEY, sort=False).agg(
+        n=("stop_id", "size"),
+        stop_name=("stop_name", "first") if "stop_name" in chunk else ("stop_id", "first"),
+        lat=("stop_lat", "first"),
+        lon=("stop_lon", "first"),
+        scheduled_arrival_time=("scheduled_arrival_time", "min"),
+    )
+
+
+def _merge(acc, part):
+    if acc is None:
+        return part
+    return pd.concat([acc, part]).groupby(level=STOP_KEY, sort=False).agg(
+        {"n": "sum", "stop_name": "first", "lat": "first", "lon": "first", "scheduled_arrival_time": "min"}
+    )
+
+
+def _finalize(acc):
+    # dedup: per route and sequence keep the stop most trips serve (pattern variants collapse to one)
+    df = acc.reset_index().sort_values(["route_key", "stop_sequence", "n"], ascending=[True, True, False])
+    df = df.drop_duplicates(["route_key", "stop_sequence"])
+    df["stop_name"] = df["stop_name"].fillna("").astype(str)
+    df["scheduled_arrival_time"] = df["scheduled_arrival_time"].fillna("").astype(str)
+    return df
+
+
+def _source_meta(csv_path):
+    st = os.stat(csv_path)
+    return {"source_path": str(csv_path), "source_mtime_ns": st.st_mtime_ns, "source_size": st.st_size}
+
+
+def build_route_index(csv_path=CSV_PATH, out_path=OUT_PATH, incremental=False, chunk_rows=CHUNK_ROWS):
+    csv_path, out_path = Path(csv_path), Path(out_path)
+    meta = _source_meta(csv_path)
+    previous = read_columnar_index(out_path) if incremental and out_path.exists() else None
+
+    if previous is not None and all(previous["meta"].get(k) == v for k, v in meta.items()):
+        print(f"Route index {out_path} is up to date")
+        return out_path
+
+    # pass 1 (incremental only): per-route digests decide which routes to re-aggregate
+    digests = {}
+    changed = None
+    if previous is not None:
+        for chunk in _read_chunks(csv_path, chunk_rows):
+            _add_digests(digests, chunk)
+        old = dict(zip(previous["route_keys"].tolist(), previous["route_digest"].tolist()))
+        changed = {k for k, v in digests.items() if old.get(k) != v}
 
-def build_route_index():
-    df = pd.read_csv(CSV_PATH)
+    # pass 2: stream and aggregate (only changed routes when incremental); memory is
+    # bounded by the number of distinct route stops, not rows
+    acc = None
+    for chunk in _read_chunks(csv_path, chunk_rows):
+        if changed is None:
+            _add_digests(digests, chunk)
+        else:
+            chunk = chunk[chunk["route_key"].isin(changed)]
+        if not chunk.empty:
+            acc = _merge(acc, _aggregate(chunk))
 
-    df = df[["route_id", "stop_id", "stop_sequence"]].dropna()
+    fresh = _finalize(acc) if acc is not None else pd.DataFrame(
+        {c: pd.Series(dtype=object) for c in ("route_key", "stop_name", "scheduled_arrival_time")}
+        | {c: pd.Series(dtype=np.int64) for c in ("stop_id", "stop_sequence")}
+        | {c: pd.Series(dtype=float) for c in ("lat", "lon")}
+    )
+    columns = {f: fresh[f].to_numpy() for f in COLUMNAR_STOP_FIELDS}
+    fresh_keys = fresh["route_key"].to_numpy()
 
-    df["stop_sequence"] = pd.to_numeric(df["stop_sequence"], errors="coerce")
-    df = df.dropna(subset=["stop_sequence"])
-    df["stop_sequence"] = df["stop_sequence"].astype(int)
+    # per route: slice of the fresh arrays, or (incremental, unchanged) of the previous index
+    keys = sorted(digests)
+    previous_pos = {k: i for i, k in enumerate(previous["route_keys"].tolist())} if previous is not None else {}
+    parts = {f: [] for f in columns}
+    offsets = [0]
+    for key in keys:
+        if changed is None or key in changed:
+            lo, hi = np.searchsorted(fresh_keys, key, "left"), np.searchsorted(fresh_keys, key, "right")
+            src = columns
+        else:
+            i = previous_pos[key]
+            lo, hi = previous["offsets"][i], previous["offsets"][i + 1]
+            src = previous
+        for f in parts:
+            parts[f].append(src[f][lo:hi])
+        offsets.append(offsets[-1] + int(hi - lo))
 
-    route_index = {}
-    for route_id, group in df.groupby("route_id"):
-        ordered_stops = (
-            group.sort_values("stop_sequence")["stop_id"].astype(str).tolist()
-        )
-        route_index[str(route_id)] = ordered_stops
+    stops = {f: np.concatenate(v) if v else columns[f] for f, v in parts.items()}
+    write_columnar_index(out_path, keys, offsets, stops, route_digest=[digests[k] for k in keys], meta=meta)
 
-    OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(OUT_PATH, "w") as f:
-        json.dump(route_index, f, indent=2)
+    updated = len(keys) if changed is None else len(changed)
+    print(f"Route index saved to {out_path} ({len(keys)} routes, {offsets[-1]} stops, {updated} rebuilt)")
+    return out_path
 
-    print(f"Route index saved to {OUT_PATH}")
 
 if __name__ == "__main__":
-    build_route_index()
+    parser = argparse.ArgumentParser(description="Build the columnar route index from the processed dataset")
+    parser.add_argument("csv_path", nargs="?", default=CSV_PATH)
+    parser.add_argument("out_path", nargs="?", default=OUT_PATH)
+    parser.add_argument("--incremental", action="store_true", help="only re-aggregate routes whose rows changed")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    build_route_index(args.csv_path, args.out_path, args.incremental, args.chunk_rows)
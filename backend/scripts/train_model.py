@@ -0,0 +1,64 @@
+import argparse
+import json
+import logging
+from pathlib import Path
+
+from backend.config import DATASET_PATH, MODEL_VERSIONS_DIR
+from backend.models.training import CHUNK_ROWS, XGB_ROUNDS, train
+from backend.utils.preprocessing import DERIVED_FEATURES
+
+
+def train_model(dataset=DATASET_PATH, train_csv=None, val_csv=None, test_csv=None, **kwargs):
+    if train_csv:
+        # the notebook's pre-split files; each one is a whole split
+        sources = [(Path(p), s) for s, p in enumerate((train_csv, val_csv, test_csv)) if p]
+    else:
+        sources = [(Path(dataset), None)]
+    out = train(sources, **kwargs)
+    with open(out / "model_metadata.json", encoding="utf-8") as f:
+        meta = json.load(f)
+    perf = meta["performance"]
+    print(f"Model {meta['version']} ({meta['model_type']}) saved to {out}: "
+          f"{meta['data']['rows']['train']} training rows, test MAE {perf['test_mae']}, R² {perf['test_r2']}, "
+          f"{meta['timings']['total']}s")
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the delay model out-of-core into a new model version")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="full CSV, split into train/val/test by trip")
+    parser.add_argument("--train", help="pre-split training CSV (use with --val/--test instead of --dataset)")
+    parser.add_argument("--val")
+    parser.add_argument("--test")
+    parser.add_argument("--versions-dir", default=MODEL_VERSIONS_DIR)
+    parser.add_argument("--version", help="version name (default: a timestamp)")
+    parser.add_argument("--models", nargs="+", default=["RandomForest", "XGBoost"], choices=["RandomForest", "XGBoost"])
+    parser.add_argument("--derived", nargs="*", default=[], choices=sorted(DERIVED_FEATURES),
+                        help="derived features to add, e.g. is_peak_hour")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel workers (-1 = all cores)")
+    parser.add_argument("--val-frac", type=float, default=0.1)
+    parser.add_argument("--test-frac", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rf-max-samples", type=int, help="bootstrap rows per tree (default 2M)")
+    parser.add_argument("--rf-trees", type=int)
+    parser.add_argument("--xgb-rounds", type=int, default=XGB_ROUNDS)
+    parser.add_argument("--work-dir", help="where spooled chunks and mapped features go (default: a temp dir)")
+    parser.add_argument("--keep-work", action="store_true")
+    parser.add_argument("--activate", action="store_true", help="make this the ACTIVE version")
+    parser.add_argument("--force", action="store_true", help="replace --version if it already exists")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    rf_params = {}
+    if args.rf_max_samples:
+        rf_params["max_samples"] = args.rf_max_samples
+    if args.rf_trees:
+        rf_params["n_estimators"] = args.rf_trees
+    train_model(args.dataset, args.train, args.val, args.test, versions_dir=Path(args.versions_dir),
+                version=args.version, candidates=args.models, derived=args.derived,
+                chunk_rows=args.chunk_rows, n_jobs=args.jobs,
+                val_frac=args.val_frac, test_frac=args.test_frac, seed=args.seed,
+                work_dir=Path(args.work_dir) if args.work_dir else None, keep_work=args.keep_work,
+                rf_params=rf_params, xgb_rounds=args.xgb_rounds, activate=args.activate,
+                force=args.force)
@@ -1,29 +1,63 @@
 # backend/services/ai_routing.py
 from datetime import datetime, timedelta
-from pathlib import Path
-from typing import Any, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 import numpy as np
-from ..models.prediction import PredictionModel
-from ..utils.route_index import get_stops_for_route, find_nearest_stop, slice_stops_by_ids
-from ..utils.preprocessing import build_feature_vector
+from ..utils.route_index import get_stops_for_route, slice_stops_by_ids
+from ..utils.spatial_index import get_spatial_index
+from ..utils.response_cache import ResponseCache
+from ..utils.metrics import metrics, stage
+from ..utils.columnar import columnar_eta, hms_to_seconds
+from ..utils.route_geometry import get_route_geometry
+from ..config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, ROUTE_GEOMETRY_PATH
 
-BASE = Path(__file__).resolve().parents[1]  # backend/
-MODEL_P = BASE / "models" / "trained_model.pkl"
-ENCODER_P = BASE / "models" / "route_label_encoder.pkl"
+DELAY_TABLE_ROWS = metrics.counter(
+    "routeminds_delay_table_rows_total", "Route ETA stop predictions by source (table hit or model fallback)",
+)
 
-_model_wrapper = PredictionModel(str(MODEL_P), str(ENCODER_P))
 
 class AIRoutingService:
-    def __init__(self, model_wrapper: Optional[Any] = None, index_path: Optional[str] = None):
-        self.model_wrapper: Any = model_wrapper or _model_wrapper
+    def __init__(
+        self,
+        model_wrapper: Optional[Any] = None,
+        index_path: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        delay_table: Optional[Any] = None,
+    ):
+        # predictions keyed by (route, segment, dow, hour, holiday); see ResponseCache
+        self.cache = cache or ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+        # the model registry's active model unless one is given (loaded on first use, not at import)
+        if model_wrapper is None:
+            from ..models.registry import model_registry
+            model_wrapper = model_registry.active_model()
+        self._model_wrapper: Any = model_wrapper
         self.index_path = index_path
+        # optional precomputed grid (models/delay_table.py); used only while it matches the model version
+        self.delay_table = delay_table
 
-    def compute_route_eta(self, req: Any) -> Any:
-        from ..schemas.route_eta import RouteEtaRequest, RouteEtaResponse, StopPrediction
+    @property
+    def model_wrapper(self) -> Any:
+        return self._model_wrapper
 
-        if not isinstance(req, RouteEtaRequest):
-            req = RouteEtaRequest.model_validate(req)
+    @model_wrapper.setter
+    def model_wrapper(self, value: Any) -> None:
+        # cached predictions belong to the previous model
+        self._model_wrapper = value
+        self.cache.invalidate()
+
+    @staticmethod
+    def _cache_key(model: Any, route_name: str, stops_slice: List[dict], start_dt: datetime, holiday_flag: int) -> tuple:
+        return (
+            getattr(model, "version", None),
+            route_name,
+            int(stops_slice[0].get("stop_id")),
+            int(stops_slice[-1].get("stop_id")),
+            len(stops_slice),
+            start_dt.weekday(),
+            start_dt.hour,
+            int(holiday_flag or 0),
+        )
 
+    def _resolve_segment(self, req: Any) -> List[dict]:
         route_name = req.route_short_name
         route_stops = get_stops_for_route(route_name, self.index_path)
 
@@ -32,37 +66,81 @@ class AIRoutingService:
         else:
             if not req.from_coord or not req.to_coord:
                 raise ValueError("from_stop_id/to_stop_id or from_coord/to_coord required")
-            start_stop = find_nearest_stop(tuple(req.from_coord), route_stops)
-            end_stop = find_nearest_stop(tuple(req.to_coord), route_stops)
+            spatial = get_spatial_index(self.index_path)
+            start_stop = route_stops[int(spatial.nearest_on_route(route_name, tuple(req.from_coord))[0][0])]
+            end_stop = route_stops[int(spatial.nearest_on_route(route_name, tuple(req.to_coord))[0][0])]
             stops_slice = slice_stops_by_ids(route_stops, start_stop["stop_id"], end_stop["stop_id"])
 
         if not stops_slice:
             raise ValueError("No stops found for given route/segment")
+        return stops_slice
 
-        start_dt = datetime.fromisoformat(req.timestamp_iso) if req.timestamp_iso else datetime.now()
+    @staticmethod
+    def _segment_features(stops_slice: List[dict], start_dt: datetime, holiday_flag: int) -> np.ndarray:
+        # The segment's input columns (preprocessing.INPUT_COLUMNS) at once; the model's feature
+        # pipeline adds the route and any derived columns
+        n = len(stops_slice)
+        seq = np.fromiter((int(s.get("stop_sequence", 0)) for s in stops_slice), dtype=float, count=n)
+        lat = np.fromiter((float(s.get("lat") or s.get("stop_lat") or 0.0) for s in stops_slice), dtype=float, count=n)
+        lon = np.fromiter((float(s.get("lon") or s.get("stop_lon") or 0.0) for s in stops_slice), dtype=float, count=n)
+        X = np.column_stack([
+            seq,
+            np.full(n, start_dt.weekday(), dtype=float),
+            np.full(n, start_dt.hour, dtype=float),
+            np.full(n, int(holiday_flag or 0), dtype=float),
+            lat,
+            lon,
+        ])
+        return X
+
+    def _table_lookup(self, model: Any, route_name: str, stops_slice: List[dict], start_dt: datetime,
+                      holiday_flag: int) -> Optional[np.ndarray]:
+        """Delays from the precomputed table, NaN where a stop is missing; None if no usable table."""
+        table = self.delay_table
+        if table is None or table.model_version != getattr(model, "version", None):
+            return None
+        slots = table.slots_for(route_name, stops_slice)
+        known = slots >= 0
+        preds = np.full(len(slots), np.nan)
+        preds[known] = table.lookup(slots[known], start_dt.weekday(), start_dt.hour, int(holiday_flag or 0))
+        n_known = int(known.sum())
+        DELAY_TABLE_ROWS.inc(n_known, source="table")
+        if n_known < len(slots):
+            DELAY_TABLE_ROWS.inc(len(slots) - n_known, source="model")
+        return preds
 
-        features_rows, scheduled_times = [], []
-        for s in stops_slice:
-            feat_dict = {
-                "route_short_name": route_name,
-                "stop_sequence": s.get("stop_sequence", 0),
-                "day_of_week": start_dt.weekday(),
-                "hour_of_day": start_dt.hour,
-                "holiday_flag": int(req.holiday_flag or 0),
-                "stop_lat": float(s.get("lat") or s.get("stop_lat") or 0.0),
-                "stop_lon": float(s.get("lon") or s.get("stop_lon") or 0.0),
-            }
-            X_row = build_feature_vector(feat_dict)
-            features_rows.append(np.asarray(X_row).ravel())
-            scheduled_times.append(s.get("scheduled_arrival_time"))
-
-        if not features_rows:
-            raise ValueError("No features built for stops slice")
-
-        preds = [float(self.model_wrapper.predict(route_name, row.tolist())) for row in features_rows]
+    def _predict_segment(self, model: Any, route_name: str, stops_slice: List[dict], start_dt: datetime,
+                         holiday_flag: int) -> List[float]:
+        with stage("table_lookup", "ai_routing"):
+            preds = self._table_lookup(model, route_name, stops_slice, start_dt, holiday_flag)
+        if preds is None:
+            with stage("features", "ai_routing"):
+                X = self._segment_features(stops_slice, start_dt, holiday_flag)
+            with stage("inference", "ai_routing"):
+                return model.predict_batch(route_name, X).tolist()
+        missing = np.isnan(preds)
+        if missing.any():
+            # live model for stops the table was not built with
+            with stage("features", "ai_routing"):
+                X = self._segment_features([s for s, m in zip(stops_slice, missing) if m], start_dt, holiday_flag)
+            with stage("inference", "ai_routing"):
+                preds[missing] = model.predict_batch(route_name, X)
+        return preds.tolist()
+
+    @staticmethod
+    def _build_response(
+        route_name: str,
+        stops_slice: List[dict],
+        start_dt: datetime,
+        preds: List[float],
+        model_version: Optional[str] = None,
+        geometry: Optional[str] = None,
+    ) -> Any:
+        from ..schemas.route_eta import RouteEtaResponse, StopPrediction
 
         stops_resp, total_delay = [], 0.0
-        for s, delay, sched_time in zip(stops_slice, preds, scheduled_times):
+        for s, delay in zip(stops_slice, preds):
+            sched_time = s.get("scheduled_arrival_time")
             total_delay += float(delay)
             if sched_time:
                 try:
@@ -89,9 +167,143 @@ class AIRoutingService:
         waypoints = [(float(s.get("lat") or s.get("stop_lat") or 0.0),
                       float(s.get("lon") or s.get("stop_lon") or 0.0)) for s in stops_slice]
 
-        summary = {"segment_stop_count": len(stops_slice), "total_predicted_delay_minutes": total_delay}
+        summary = {
+            "segment_stop_count": len(stops_slice),
+            "total_predicted_delay_minutes": total_delay,
+            "model_version": model_version,
+        }
+
+        return RouteEtaResponse(route_short_name=route_name, waypoints=waypoints, stops=stops_resp, summary=summary,
+                                geometry=geometry)
+
+    @staticmethod
+    def _build_columnar(
+        route_name: str,
+        stops_slice: List[dict],
+        start_dt: datetime,
+        preds: List[float],
+        model_version: Optional[str] = None,
+        geometry: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        delays = np.asarray(preds, dtype=np.float64)
+        start_s = start_dt.hour * 3600 + start_dt.minute * 60 + start_dt.second
+        sched = [s.get("scheduled_arrival_time") for s in stops_slice]
+        return columnar_eta(
+            route_name,
+            start_dt.date().isoformat(),
+            [int(s.get("stop_id")) for s in stops_slice],
+            [int(s.get("stop_sequence", 0)) for s in stops_slice],
+            [s.get("stop_name") for s in stops_slice],
+            sched,
+            [float(s.get("lat") or s.get("stop_lat") or 0.0) for s in stops_slice],
+            [float(s.get("lon") or s.get("stop_lon") or 0.0) for s in stops_slice],
+            delays,
+            hms_to_seconds(sched, default=start_s) + delays * 60.0,
+            {
+                "segment_stop_count": len(stops_slice),
+                "total_predicted_delay_minutes": float(sum(preds)),
+                "model_version": model_version,
+            },
+            geometry,
+        )
+
+    @staticmethod
+    def _geometry(stops_slice: List[dict]) -> Optional[str]:
+        store = get_route_geometry(str(ROUTE_GEOMETRY_PATH))
+        if not store.built:
+            return None
+        return store.polyline(
+            [int(s.get("stop_id")) for s in stops_slice],
+            [float(s.get("lat") or s.get("stop_lat") or 0.0) for s in stops_slice],
+            [float(s.get("lon") or s.get("stop_lon") or 0.0) for s in stops_slice],
+        )
+
+    def compute_route_eta(self, req: Any, columnar: bool = False) -> Any:
+        from ..schemas.route_eta import RouteEtaRequest
+
+        if not isinstance(req, RouteEtaRequest):
+            req = RouteEtaRequest.model_validate(req)
+
+        with stage("resolve_segment", "ai_routing"):
+            stops_slice = self._resolve_segment(req)
+        start_dt = datetime.fromisoformat(req.timestamp_iso) if req.timestamp_iso else datetime.now()
+
+        # predictions are date independent; timestamps are rebuilt from start_dt every time
+        # one model reference per request, so a concurrent hot swap cannot mix versions
+        model = self.model_wrapper
+        key = self._cache_key(model, req.route_short_name, stops_slice, start_dt, req.holiday_flag)
+        preds = self.cache.get_or_compute(
+            key,
+            lambda: self._predict_segment(model, req.route_short_name, stops_slice, start_dt, req.holiday_flag),
+        )
+        with stage("build_response", "ai_routing"):
+            build = self._build_columnar if columnar else self._build_response
+            return build(req.route_short_name, stops_slice, start_dt, preds, getattr(model, "version", None),
+                         self._geometry(stops_slice))
+
+    def compute_route_eta_batch(self, reqs: List[Any], columnar: bool = False) -> List[Tuple[Optional[Any], Optional[Exception]]]:
+        """
+        Score many route/segment requests with a single model call.
+
+        Requests are grouped by (route, segment, day_of_week, hour, holiday) so identical
+        segments share feature rows; the rows of all groups missing from the cache are
+        stacked into one matrix. Groups fully covered by the delay table skip the model.
+        Returns one (response, error) pair per request, in input order.
+        """
+        from ..schemas.route_eta import RouteEtaRequest
 
-        return RouteEtaResponse(route_short_name=route_name, waypoints=waypoints, stops=stops_resp, summary=summary)
+        model = self.model_wrapper
+        model_version = getattr(model, "version", None)
+        results: List[Tuple[Optional[Any], Optional[Exception]]] = [(None, None)] * len(reqs)
+        groups: Dict[tuple, dict] = {}
+        for i, req in enumerate(reqs):
+            try:
+                if not isinstance(req, RouteEtaRequest):
+                    req = RouteEtaRequest.model_validate(req)
+                with stage("resolve_segment", "ai_routing"):
+                    stops_slice = self._resolve_segment(req)
+                start_dt = datetime.fromisoformat(req.timestamp_iso) if req.timestamp_iso else datetime.now()
+                key = self._cache_key(model, req.route_short_name, stops_slice, start_dt, req.holiday_flag)
+                group = groups.get(key)
+                if group is None:
+                    preds = self.cache.get(key)
+                    if preds is None:
+                        table_preds = self._table_lookup(model, req.route_short_name, stops_slice, start_dt,
+                                                         req.holiday_flag)
+                        if table_preds is not None and not np.isnan(table_preds).any():
+                            preds = table_preds.tolist()
+                            self.cache.put(key, preds)
+                    code = None if preds is not None else model.encode_route(req.route_short_name)
+                    group = groups[key] = {"code": code, "preds": preds, "members": [],
+                                           "holiday": req.holiday_flag}
+            except Exception as e:
+                results[i] = (None, e)
+                continue
+            group["members"].append((i, req.route_short_name, stops_slice, start_dt))
 
+        # one combined feature matrix and one inference pass for every group not in the cache
+        pending = [(k, g) for k, g in groups.items() if g["preds"] is None]
+        if pending:
+            with stage("features", "ai_routing"):
+                Xs = [self._segment_features(g["members"][0][2], g["members"][0][3], g["holiday"]) for _, g in pending]
+                codes = np.concatenate([np.full(len(X), g["code"], dtype=float) for X, (_, g) in zip(Xs, pending)])
+                X_all = np.vstack(Xs)
+            with stage("inference", "ai_routing"):
+                preds = model.predict_encoded(codes, X_all)
+            offset = 0
+            for X, (key, g) in zip(Xs, pending):
+                g["preds"] = preds[offset:offset + len(X)].tolist()
+                offset += len(X)
+                self.cache.put(key, g["preds"])
 
-ai_routing_service = AIRoutingService(index_path="data/processed/route_index.json")
+        build = self._build_columnar if columnar else self._build_response
+        with stage("build_response", "ai_routing"):
+            for g in groups.values():
+                group_preds = g["preds"]
+                for i, route_name, stops_slice, start_dt in g["members"]:
+                    try:
+                        results[i] = (build(route_name, stops_slice, start_dt, group_preds, model_version,
+                                            self._geometry(stops_slice)), None)
+                    except Exception as e:
+                        results[i] = (None, e)
+        return results
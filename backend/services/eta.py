@@ -2,94 +2,256 @@
 # services/eta.py
 from __future__ import annotations
 
-from typing import List, Tuple, Optional
-import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple, Optional
+import logging
 from datetime import datetime, date, time, timedelta
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
 # relative import instead of "from backend.schemas.route_eta ..."
-from ..schemas.route_eta import RouteEtaRequest, RouteEtaResponse, StopPrediction
+from ..schemas.route_eta import ObservedArrival, RouteEtaRequest, RouteEtaResponse, StopPrediction
+from ..utils.delay_cube import DelayCube
+from ..utils.dataset_snapshot import (
+    dataset_identity,
+    default_snapshot_dir,
+    load_dataset,
+    read_delay_cube,
+    snapshot_created_at,
+    snapshot_is_fresh,
+)
+from ..utils.array_store import load_arrays, read_meta, save_arrays
+from ..utils.live_delays import LiveDelays
+from ..utils.columnar import columnar_eta, hms_to_seconds
+from ..utils.route_geometry import get_route_geometry
+from ..utils.response_cache import ResponseCache
+from ..utils.metrics import stage
+from ..config import (
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    SHARED_ARTIFACTS,
+    LIVE_DELAYS_ENABLED,
+    LIVE_STATE_DIR,
+    LIVE_HALF_LIFE_HOURS,
+    LIVE_PRIOR_WEIGHT,
+    ROUTE_GEOMETRY_PATH,
+)
+
+logger = logging.getLogger(__name__)
 
 Coord = Tuple[float, float]
 
-# ... rest of the code stays the same ...
+ROUTE_TABLES_DIR = "route_tables"
 
 
+@dataclass
+class RouteStopTable:
+    """
+    Ordered, de-duplicated stops for one route key, stored column-wise.
+    Rows are sorted by stop_sequence; each stop_id appears once (its earliest scheduled row).
+    """
+    repr_route_id: str
+    repr_route_short_name: str
+    stop_id: np.ndarray            # int64
+    stop_name: np.ndarray          # object (str or None)
+    stop_sequence: np.ndarray      # int64, ascending
+    stop_lat: np.ndarray           # float64
+    stop_lon: np.ndarray           # float64
+    scheduled_arrival_time: np.ndarray  # object ("HH:MM:SS")
+    id_order: np.ndarray           # int64 row positions sorting stop_id (for position_of)
+    route_code: Optional[int]      # DelayCube route code of the representative route
+    delay_slot: np.ndarray         # int64 DelayCube slot per row (-1 if unknown)
+    # stop_id[id_order], built on the first lookup (ingestion looks up every record)
+    _sorted_ids: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return len(self.stop_id)
+
+    def position_of(self, stop_id: int) -> Optional[int]:
+        """Row position of stop_id, or None if the route does not serve it."""
+        ids = self._sorted_ids
+        if ids is None:
+            ids = self._sorted_ids = self.stop_id[self.id_order]
+        i = int(np.searchsorted(ids, stop_id))
+        if i < len(ids) and ids[i] == stop_id:
+            return int(self.id_order[i])
+        return None
+
+
+# Flat layout of all route tables (scripts/build_serving_bundle.py): per-stop columns are
+# concatenated in key order and each table is a slice [offsets[k], offsets[k + 1]), so
+# tables loaded from mapped arrays are views and worker processes share the pages.
+ROUTE_TABLE_COLUMNS = ("stop_id", "stop_name", "stop_sequence", "stop_lat", "stop_lon",
+                       "scheduled_arrival_time", "id_order", "delay_slot")
+
+
+def pack_route_tables(tables: Dict[str, RouteStopTable]) -> Dict[str, np.ndarray]:
+    keys = list(tables)
+    sizes = [len(tables[k]) for k in keys]
+    arrays: Dict[str, np.ndarray] = {
+        "keys": np.asarray(keys, dtype=str),
+        "offsets": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+        "repr_route_id": np.asarray([tables[k].repr_route_id for k in keys], dtype=str),
+        "repr_route_short_name": np.asarray([tables[k].repr_route_short_name for k in keys], dtype=str),
+        "route_code": np.asarray([-1 if tables[k].route_code is None else tables[k].route_code for k in keys],
+                                 dtype=np.int64),
+    }
+    for col in ROUTE_TABLE_COLUMNS:
+        parts = [getattr(tables[k], col) for k in keys]
+        if col in ("stop_name", "scheduled_arrival_time"):
+            # fixed-width unicode so the column can be mapped; missing names become ""
+            parts = [np.asarray(["" if v is None else str(v) for v in p.tolist()], dtype=str) for p in parts]
+        arrays[col] = np.concatenate(parts) if parts else np.empty(0)
+    return arrays
+
+
+def unpack_route_tables(arrays: Dict[str, np.ndarray]) -> Dict[str, RouteStopTable]:
+    off = arrays["offsets"].tolist()
+    tables: Dict[str, RouteStopTable] = {}
+    for i, (key, rid, rsn, code) in enumerate(zip(
+        arrays["keys"].tolist(), arrays["repr_route_id"].tolist(),
+        arrays["repr_route_short_name"].tolist(), arrays["route_code"].tolist(),
+    )):
+        sl = slice(off[i], off[i + 1])
+        tables[key] = RouteStopTable(
+            repr_route_id=rid,
+            repr_route_short_name=rsn,
+            route_code=None if code < 0 else code,
+            **{col: arrays[col][sl] for col in ROUTE_TABLE_COLUMNS},
+        )
+    return tables
+
 
 class ETAService:
     """
     Simple ETA service based on historical mean delay per stop/time slice.
 
-    - Filters the dataset by route (route_short_name OR route_id == provided string).
+    - Precompiles one ordered stop table per route key (route_short_name AND route_id) at load time,
+      or attaches to the mapped tables prebuilt by scripts/build_serving_bundle.py.
     - Optionally slices between from_stop_id and to_stop_id using stop_sequence order.
     - Computes mean delay per (stop_id, day_of_week, hour_of_day) with fallbacks.
     - Builds waypoints (lat, lon) and per-stop ETA timeline.
+    - Blends in running means from observed arrivals (`ingest`, utils/live_delays.py).
+    - Caches per-segment delays by (route, stops, dow, hour, live version) in a TTL ResponseCache.
     """
 
-    def __init__(self, dataset_path: str):
-        if not os.path.exists(dataset_path):
-            raise FileNotFoundError(f"Dataset not found at: {dataset_path}")
-
-        df = pd.read_csv(dataset_path)
-
-        required = {
-            "trip_id",
-            "route_id",
-            "route_short_name",
-            "stop_id",
-            "stop_name",
-            "stop_lat",
-            "stop_lon",
-            "stop_sequence",
-            "scheduled_arrival_time",
-            "day_of_week",
-            "hour_of_day",
-            "holiday_flag",
-            "delay_minutes",
-        }
-        missing = required - set(df.columns)
-        if missing:
-            raise ValueError(f"Dataset is missing columns: {missing}")
-
-        # Normalize types
-        df["route_id"] = df["route_id"].astype(str)
-        df["route_short_name"] = df["route_short_name"].astype(str)
-
-        # stop_id & stop_sequence sometimes read as float; coerce to Int64
-        df["stop_id"] = pd.to_numeric(df["stop_id"], errors="coerce").astype("Int64")
-        df["stop_sequence"] = pd.to_numeric(df["stop_sequence"], errors="coerce").astype("Int64")
+    def __init__(
+        self,
+        dataset_path: str,
+        snapshot_dir: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        # a new ETAService (new dataset) never serves entries computed from an older one
+        if cache is not None:
+            cache.invalidate()
+        self.cache = cache or ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+        snapshot_dir = Path(snapshot_dir) if snapshot_dir else default_snapshot_dir(dataset_path)
+        shared = self._attach_shared(dataset_path, snapshot_dir) if SHARED_ARTIFACTS else None
+        if shared is not None:
+            # prebuilt by scripts/build_serving_bundle.py: everything is a mapped view, the
+            # row-level frame is never loaded
+            self.delays, self.route_tables = shared
+            self.df = None
+        else:
+            # Cleaned, typed rows + delay aggregates; read from the binary snapshot when it is
+            # fresh, otherwise parsed from the CSV and written back as a snapshot.
+            self.df, self.delays = load_dataset(dataset_path, snapshot_dir)
+            self.route_tables: Dict[str, RouteStopTable] = self._build_route_tables(self.df, self.delays)
+        self.overall_mean_delay = self.delays.overall_mean
+        logger.info(
+            "ETAService delay cube: %d routes, %d route-stops, %.1f MiB (%s)",
+            len(self.delays.route_codes), self.delays.cube.shape[0], self.delays.nbytes / 2**20,
+            "shared" if shared is not None else "private",
+        )
 
-        # lat/lon numeric
-        df["stop_lat"] = pd.to_numeric(df["stop_lat"], errors="coerce")
-        df["stop_lon"] = pd.to_numeric(df["stop_lon"], errors="coerce")
+        # running means from observed arrivals (POST /observations), blended into lookups
+        self.live: Optional[LiveDelays] = None
+        if LIVE_DELAYS_ENABLED:
+            live_dir = LIVE_STATE_DIR or Path(dataset_path).with_suffix(".live")
+            try:
+                self.live = LiveDelays(
+                    live_dir,
+                    n_slots=self.delays.cube.shape[0],
+                    n_routes=len(self.delays.route_ids),
+                    # the CSV, not the snapshot: a rebuilt snapshot of the same data keeps the state
+                    dataset_id=dataset_identity(dataset_path, snapshot_dir),
+                    half_life_s=LIVE_HALF_LIFE_HOURS * 3600.0,
+                    prior_weight=LIVE_PRIOR_WEIGHT,
+                )
+            except OSError as e:
+                # e.g. a read-only data volume: serve historical delays, only ingestion is off
+                logger.warning("Live delays disabled, cannot use state dir %s (%s); "
+                               "set ROUTEMINDS_LIVE_STATE_DIR to a writable directory", live_dir, e)
 
-        # times as strings "HH:MM:SS"
-        df["scheduled_arrival_time"] = df["scheduled_arrival_time"].astype(str)
+    @staticmethod
+    def _attach_shared(dataset_path: str, snapshot_dir: Path) -> Optional[Tuple[DelayCube, Dict[str, RouteStopTable]]]:
+        """Mapped delay cube + route tables, if the snapshot is fresh and its tables were built from it."""
+        if not snapshot_is_fresh(snapshot_dir, dataset_path):
+            return None
+        tables_dir = snapshot_dir / ROUTE_TABLES_DIR
+        meta = read_meta(tables_dir)
+        if meta is None or meta.get("snapshot_created_at") != snapshot_created_at(snapshot_dir):
+            logger.info("No prebuilt route tables for %s; building them in this process", snapshot_dir)
+            return None
+        arrays, _ = load_arrays(tables_dir)
+        return read_delay_cube(snapshot_dir), unpack_route_tables(arrays)
+
+    @classmethod
+    def save_route_tables(cls, dataset_path: str, snapshot_dir: Optional[str] = None) -> Path:
+        """Build the route tables from a (fresh) snapshot and store them inside it."""
+        snapshot_dir = Path(snapshot_dir) if snapshot_dir else default_snapshot_dir(dataset_path)
+        df, delays = load_dataset(dataset_path, snapshot_dir)
+        tables = cls._build_route_tables(df, delays)
+        return save_arrays(snapshot_dir / ROUTE_TABLES_DIR, pack_route_tables(tables),
+                           {"snapshot_created_at": snapshot_created_at(snapshot_dir), "n_tables": len(tables)})
 
-        # basic cleanup: drop rows we cannot use
-        df = df.dropna(subset=["stop_id", "stop_sequence", "stop_lat", "stop_lon"])
+    @staticmethod
+    def _build_route_tables(df: pd.DataFrame, delays: DelayCube) -> Dict[str, RouteStopTable]:
+        """
+        Build a RouteStopTable for every distinct route_short_name and route_id.
+        A key present in both columns gets the union of their rows.
+        """
+        ordered = df.sort_values(["stop_sequence", "scheduled_arrival_time"], kind="mergesort").reset_index(drop=True)
+        by_short = ordered.groupby("route_short_name", sort=False).indices
+        by_id = ordered.groupby("route_id", sort=False).indices
+
+        tables: Dict[str, RouteStopTable] = {}
+        for key in set(by_short) | set(by_id):
+            a, b = by_short.get(key), by_id.get(key)
+            if a is not None and b is not None:
+                idx = np.union1d(a, b)
+            else:
+                idx = np.sort(a if a is not None else b)
+            sub = ordered.iloc[idx]
 
-        self.df = df.reset_index(drop=True)
+            # most frequent (route_id, route_short_name) pair represents the key
+            repr_route_id, repr_route_short = (
+                sub.groupby(["route_id", "route_short_name"])["stop_id"].count().idxmax()
+            )
 
-        # Precompute aggregates for fast lookup
-        self.delay_by_stop_dow_hour = (
-            self.df.groupby(["route_id", "route_short_name", "stop_id", "day_of_week", "hour_of_day"])["delay_minutes"]
-            .mean()
-            .to_dict()
-        )
-        self.delay_by_stop = (
-            self.df.groupby(["route_id", "route_short_name", "stop_id"])["delay_minutes"]
-            .mean()
-            .to_dict()
-        )
-        self.delay_by_route = (
-            self.df.groupby(["route_id", "route_short_name"])["delay_minutes"]
-            .mean()
-            .to_dict()
-        )
-        self.overall_mean_delay = float(self.df["delay_minutes"].mean())
+            # rows are already ordered by (stop_sequence, scheduled_arrival_time), so keep="first"
+            # picks each stop's earliest row and the result stays sorted by stop_sequence
+            stops = sub.drop_duplicates("stop_id", keep="first")
+            stop_ids = stops["stop_id"].to_numpy(dtype=np.int64)
+            route_code = delays.route_code(repr_route_id, repr_route_short)
+            names = stops["stop_name"].astype(object).where(stops["stop_name"].notna(), None).to_numpy()
+            tables[str(key)] = RouteStopTable(
+                repr_route_id=str(repr_route_id),
+                repr_route_short_name=str(repr_route_short),
+                stop_id=stop_ids,
+                stop_name=names,
+                stop_sequence=stops["stop_sequence"].to_numpy(dtype=np.int64),
+                stop_lat=stops["stop_lat"].to_numpy(dtype=np.float64),
+                stop_lon=stops["stop_lon"].to_numpy(dtype=np.float64),
+                scheduled_arrival_time=stops["scheduled_arrival_time"].to_numpy(dtype=object),
+                id_order=np.argsort(stop_ids, kind="stable"),
+                route_code=route_code,
+                delay_slot=delays.slots_for(route_code, stop_ids),
+            )
+        return tables
 
     @staticmethod
     def _parse_iso(ts: Optional[str]) -> datetime:
@@ -113,140 +275,218 @@ class ETAService:
         except Exception:
             return time(0, 0, 0)
 
-    def _filter_route_df(self, route_key: str) -> pd.DataFrame:
+    def _route_table(self, route_key: str) -> RouteStopTable:
         route_key = str(route_key).strip()
-        df = self.df
         # Match either by route_short_name or by route_id (helps if dataset uses one or the other)
-        mask = (df["route_short_name"] == route_key) | (df["route_id"] == route_key)
-        route_df = df.loc[mask].copy()
-        if route_df.empty:
+        table = self.route_tables.get(route_key)
+        if table is None:
             raise ValueError(f"No rows found for route '{route_key}' in either route_short_name or route_id.")
-        return route_df
+        return table
 
+    @staticmethod
     def _slice_stops(
-        self,
-        route_df: pd.DataFrame,
+        table: RouteStopTable,
         from_stop_id: Optional[int],
         to_stop_id: Optional[int]
-    ) -> pd.DataFrame:
-        # Use the first trip’s ordering if multiple trips exist; ordering is via stop_sequence
-        ordered = route_df.sort_values(["stop_sequence", "scheduled_arrival_time"]).copy()
-
+    ) -> slice:
+        """Return the row range of `table` between the given stops (inclusive)."""
+        full = slice(0, len(table))
         if from_stop_id is None and to_stop_id is None:
-            return ordered
+            return full
 
-        # Find sequences for given stop IDs
-        def first_seq(sid: int) -> Optional[int]:
-            ser = ordered.loc[ordered["stop_id"] == sid, "stop_sequence"]
-            return int(ser.iloc[0]) if not ser.empty else None
+        start_pos = table.position_of(int(from_stop_id)) if from_stop_id is not None else None
+        end_pos = table.position_of(int(to_stop_id)) if to_stop_id is not None else None
 
-        start_seq = first_seq(from_stop_id) if from_stop_id is not None else None
-        end_seq = first_seq(to_stop_id) if to_stop_id is not None else None
-
-        if start_seq is None and from_stop_id is not None:
+        if start_pos is None and from_stop_id is not None:
             # fallback: just return full ordered; frontend can still draw
-            return ordered
-        if end_seq is None and to_stop_id is not None:
-            return ordered
-
-        if start_seq is not None and end_seq is not None:
-            if start_seq <= end_seq:
-                sl = ordered[(ordered["stop_sequence"] >= start_seq) & (ordered["stop_sequence"] <= end_seq)].copy()
-            else:
-                sl = ordered[(ordered["stop_sequence"] >= end_seq) & (ordered["stop_sequence"] <= start_seq)].copy()
-            return sl if not sl.empty else ordered
+            return full
+        if end_pos is None and to_stop_id is not None:
+            return full
+
+        seqs = table.stop_sequence
+        if start_pos is not None and end_pos is not None:
+            lo, hi = sorted((seqs[start_pos], seqs[end_pos]))
+        elif start_pos is not None:
+            # If only one bound is provided, keep from that bound to the end (or start)
+            lo, hi = seqs[start_pos], seqs[-1]
+        else:
+            lo, hi = seqs[0], seqs[end_pos]
+
+        i = int(np.searchsorted(seqs, lo, side="left"))
+        j = int(np.searchsorted(seqs, hi, side="right"))
+        return slice(i, j) if j > i else full
 
-        # If only one bound is provided, keep from that bound to the end (or start)
-        if start_seq is not None:
-            sl = ordered[ordered["stop_sequence"] >= start_seq].copy()
-            return sl if not sl.empty else ordered
+    def _mean_delay_for_stop(self, route_id: str, route_short_name: str, stop_id: int, dow: int, hour: int) -> float:
+        # exact (route, stop, dow, hour) cell; stop/route/overall fallbacks are baked into the cube
+        route_code = self.delays.route_code(route_id, route_short_name)
+        slots = self.delays.slots_for(route_code, [stop_id])
+        return float(self.delays.lookup(route_code, slots, dow, hour)[0])
+
+    def ingest(self, records: List[ObservedArrival]) -> Dict[str, int]:
+        """Fold a batch of observed arrivals into the live aggregates; O(batch)."""
+        if self.live is None:
+            raise ValueError("Live delay ingestion is disabled (ROUTEMINDS_LIVE_DELAYS=0 or no writable state dir)")
+        n = len(records)
+        route_codes = np.full(n, -1, dtype=np.int64)
+        slots = np.full(n, -1, dtype=np.int64)
+        dow = np.zeros(n, dtype=np.int64)
+        hour = np.zeros(n, dtype=np.int64)
+        delays = np.empty(n, dtype=np.float64)
+        observed_at = np.empty(n, dtype=np.float64)
+        for i, rec in enumerate(records):
+            delays[i] = rec.delay_minutes
+            ts = self._parse_iso(rec.observed_at_iso)  # validated by ObservedArrival
+            dow[i], hour[i] = ts.weekday(), ts.hour
+            observed_at[i] = ts.timestamp()
+            table = self.route_tables.get(str(rec.route_short_name).strip())
+            if table is None or table.route_code is None:
+                continue
+            pos = table.position_of(int(rec.stop_id))
+            if pos is not None:
+                route_codes[i] = table.route_code
+                slots[i] = table.delay_slot[pos]
+        applied = self.live.update(route_codes, slots, dow, hour, delays, observed_at)
+        return {"received": n, "applied": applied, "unmatched": n - applied}
+
+    def flush_live(self) -> None:
+        # the state is shared through the mapped files, so any process can flush it
+        if self.live is not None:
+            self.live.flush()
+
+    def get_eta(self, request: RouteEtaRequest, columnar: bool = False):
+        """RouteEtaResponse, or with `columnar` the compact dict of utils/columnar.py."""
+        with stage("route_lookup", "eta"):
+            # Base time context
+            base_dt = self._parse_iso(request.timestamp_iso)
+            base_date = date(year=base_dt.year, month=base_dt.month, day=base_dt.day)
+            dow = base_dt.weekday()  # 0=Mon
+            hour = base_dt.hour
+
+            # Precompiled route table + array slice between stop ids if provided
+            table = self._route_table(request.route_short_name)
+            repr_route_id, repr_route_short = table.repr_route_id, table.repr_route_short_name
+
+        # (slice, delays) only depend on route/segment/dow/hour (and the route's live updates);
+        # timestamps use base_date below
+        live_version = self.live.version(table.route_code) if self.live is not None else 0
+        key = (str(request.route_short_name).strip(), request.from_stop_id, request.to_stop_id, dow, hour,
+               live_version)
+        cached = self.cache.get(key)
+        if cached is None:
+            with stage("slice", "eta"):
+                sl = self._slice_stops(table, request.from_stop_id, request.to_stop_id)
+            with stage("delay_lookup", "eta"):
+                # predicted delay (minutes) for the whole segment in one lookup;
+                # clamp to prevent weird negatives if your dataset has early arrivals
+                slots = table.delay_slot[sl]
+                delays = self.delays.lookup(table.route_code, slots, dow, hour)
+                if self.live is not None:
+                    delays = self.live.blend(delays, slots, dow, hour)
+                delays = np.round(np.maximum(delays.astype(np.float64), 0.0), 2)
+            cached = (sl, delays)
+            self.cache.put(key, cached)
+        sl, delays = cached
+
+        with stage("geometry", "eta"):
+            geometry = self._geometry(table, sl)
+        with stage("build_response", "eta"):
+            build = self._build_columnar if columnar else self._build_response
+            return build(request, table, sl, delays, base_date, dow, hour, repr_route_id, repr_route_short,
+                         geometry)
 
-        if end_seq is not None:
-            sl = ordered[ordered["stop_sequence"] <= end_seq].copy()
-            return sl if not sl.empty else ordered
+    @staticmethod
+    def _geometry(table: RouteStopTable, sl: slice) -> Optional[str]:
+        store = get_route_geometry(str(ROUTE_GEOMETRY_PATH))
+        if not store.built:
+            return None
+        return store.polyline(table.stop_id[sl], table.stop_lat[sl], table.stop_lon[sl])
 
-        return ordered
+    @staticmethod
+    def _summary(request: RouteEtaRequest, stop_ids: List[int], total_delay: float, dow: int, hour: int,
+                 repr_route_id: Optional[str], repr_route_short: Optional[str]) -> dict:
+        return {
+            "n_stops": len(stop_ids),
+            "start_stop_id": int(stop_ids[0]) if stop_ids else None,
+            "end_stop_id": int(stop_ids[-1]) if stop_ids else None,
+            "total_predicted_delay_minutes": float(round(total_delay, 2)),
+            "route_key_used": request.route_short_name,
+            "repr_route_id": repr_route_id,
+            "repr_route_short_name": repr_route_short,
+            "context_day_of_week": dow,
+            "context_hour_of_day": hour,
+        }
 
-    def _mean_delay_for_stop(self, route_id: str, route_short_name: str, stop_id: int, dow: int, hour: int) -> float:
-        # 1) exact (route_id, route_short_name, stop_id, dow, hour)
-        key = (route_id, route_short_name, stop_id, dow, hour)
-        v = self.delay_by_stop_dow_hour.get(key, np.nan)
-        if pd.notna(v):
-            return float(v)
-        # 2) by stop
-        key2 = (route_id, route_short_name, stop_id)
-        v2 = self.delay_by_stop.get(key2, np.nan)
-        if pd.notna(v2):
-            return float(v2)
-        # 3) by route
-        key3 = (route_id, route_short_name)
-        v3 = self.delay_by_route.get(key3, np.nan)
-        if pd.notna(v3):
-            return float(v3)
-        # 4) overall
-        return float(self.overall_mean_delay)
-
-    def get_eta(self, request: RouteEtaRequest) -> RouteEtaResponse:
-        # Base time context
-        base_dt = self._parse_iso(request.timestamp_iso)
-        base_date = date(year=base_dt.year, month=base_dt.month, day=base_dt.day)
-        dow = base_dt.weekday()  # 0=Mon
-        hour = base_dt.hour
-
-        # Filter route
-        route_df = self._filter_route_df(request.route_short_name)
-
-        # Distill a single (route_id, route_short_name) representative (there may be multiple; take the most frequent)
-        repr_route = (
-            route_df.groupby(["route_id", "route_short_name"])["stop_id"]
-            .count()
-            .sort_values(ascending=False)
-            .index[0]
-        )
-        repr_route_id, repr_route_short = repr_route
-
-        # Slice between stop ids if provided
-        sliced = self._slice_stops(route_df, request.from_stop_id, request.to_stop_id)
-        # Collapse to unique stops in order
-        stops_df = (
-            sliced.sort_values(["stop_sequence", "scheduled_arrival_time"])
-            .groupby("stop_id", as_index=False)
-            .first()
-            .sort_values("stop_sequence")
-            .reset_index(drop=True)
+    def _build_columnar(
+        self,
+        request: RouteEtaRequest,
+        table: RouteStopTable,
+        sl: slice,
+        delays: np.ndarray,
+        base_date: date,
+        dow: int,
+        hour: int,
+        repr_route_id: Optional[str],
+        repr_route_short: Optional[str],
+        geometry: Optional[str] = None,
+    ) -> dict:
+        # no per-stop objects: arrays straight from the route table
+        stop_ids = table.stop_id[sl].tolist()
+        sched = table.scheduled_arrival_time[sl].tolist()
+        eta_s = hms_to_seconds(sched, default=0.0) + delays * 60.0
+        total_delay = float(np.sum(delays)) if len(delays) else 0.0
+        return columnar_eta(
+            request.route_short_name,
+            base_date.isoformat(),
+            stop_ids,
+            table.stop_sequence[sl].tolist(),
+            [n or None for n in table.stop_name[sl].tolist()],
+            sched,
+            table.stop_lat[sl],
+            table.stop_lon[sl],
+            delays,
+            eta_s,
+            self._summary(request, stop_ids, total_delay, dow, hour, repr_route_id, repr_route_short),
+            geometry,
         )
 
+    def _build_response(
+        self,
+        request: RouteEtaRequest,
+        table: RouteStopTable,
+        sl: slice,
+        delays: np.ndarray,
+        base_date: date,
+        dow: int,
+        hour: int,
+        repr_route_id: Optional[str],
+        repr_route_short: Optional[str],
+        geometry: Optional[str] = None,
+    ) -> RouteEtaResponse:
         waypoints: List[Coord] = []
         stops_out: List[StopPrediction] = []
 
         total_delay = 0.0
-        for _, row in stops_df.iterrows():
-            sid = int(row["stop_id"])
-            lat = float(row["stop_lat"])
-            lon = float(row["stop_lon"])
-            sname = (row["stop_name"] if pd.notna(row["stop_name"]) else None)
-            seq = int(row["stop_sequence"])
-
+        for sid, sname, seq, lat, lon, sched_str, dmin_rounded in zip(
+            table.stop_id[sl].tolist(),
+            table.stop_name[sl].tolist(),
+            table.stop_sequence[sl].tolist(),
+            table.stop_lat[sl].tolist(),
+            table.stop_lon[sl].tolist(),
+            table.scheduled_arrival_time[sl].tolist(),
+            delays.tolist(),
+        ):
             # pick the stored scheduled_arrival_time string
-            sched_str = str(row["scheduled_arrival_time"])
             sched_time = self._parse_hms(sched_str)
             sched_dt = datetime.combine(base_date, sched_time)
 
-            # predicted delay (minutes)
-            dmin = self._mean_delay_for_stop(
-                repr_route_id, repr_route_short, sid, dow, hour
-            )
-            # prevent weird negatives if your dataset has early arrivals
-            dmin_rounded = float(round(max(dmin, 0.0), 2))
             total_delay += dmin_rounded
-
             eta_dt = sched_dt + timedelta(minutes=dmin_rounded)
 
             waypoints.append((lat, lon))
             stops_out.append(
                 StopPrediction(
                     stop_id=sid,
-                    stop_name=sname,
+                    stop_name=sname or None,
                     stop_sequence=seq,
                     lat=lat,
                     lon=lon,
@@ -256,21 +496,13 @@ class ETAService:
                 )
             )
 
-        summary = {
-            "n_stops": len(stops_out),
-            "start_stop_id": int(stops_out[0].stop_id) if stops_out else None,
-            "end_stop_id": int(stops_out[-1].stop_id) if stops_out else None,
-            "total_predicted_delay_minutes": float(round(total_delay, 2)),
-            "route_key_used": request.route_short_name,
-            "repr_route_id": repr_route_id,
-            "repr_route_short_name": repr_route_short,
-            "context_day_of_week": dow,
-            "context_hour_of_day": hour,
-        }
+        summary = self._summary(request, [sp.stop_id for sp in stops_out], total_delay, dow, hour,
+                                repr_route_id, repr_route_short)
 
         return RouteEtaResponse(
             route_short_name=request.route_short_name,
             waypoints=waypoints,
             stops=stops_out,
             summary=summary,
+            geometry=geometry,
         )
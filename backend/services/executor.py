@@ -0,0 +1,312 @@
+# backend/services/executor.py
+"""
+Bounded execution of CPU-heavy service calls off the event loop.
+
+Route handlers `await executor.run("eta", "get_eta", request)`; the call runs
+`registry.get("eta").get_eta(request)` either in a small thread pool in this process
+("thread") or in worker processes that load their own services at start-up
+("process", sidesteps the GIL). At most `max_concurrency` calls run at once and at
+most `max_queue` more wait; beyond that `run` raises ExecutorSaturated straight away,
+which the app turns into a 503 with Retry-After. A service that fails to load (or finds its
+data files missing) raises ServiceUnavailable: also a 503, without the cause in the body.
+
+In process mode each worker reports its pid once `_init_worker` is done, and the executor is
+ready when every worker has. If a worker dies the pool is broken: the calls in flight get
+ServiceUnavailable, the pool is rebuilt and reports not ready until its workers have loaded.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..config import (
+    EXECUTOR_MODE,
+    EXECUTOR_WORKERS,
+    EXECUTOR_MAX_CONCURRENCY,
+    EXECUTOR_MAX_QUEUE,
+    EXECUTOR_RETRY_AFTER,
+    EXECUTOR_START_METHOD,
+    WARMUP_MAX_ROUTES,
+    WARMUP_ON_STARTUP,
+)
+from ..utils.metrics import STAGE_SECONDS, metrics, record_timings, start_request_timings
+
+logger = logging.getLogger(__name__)
+
+REJECTED = metrics.counter("routeminds_executor_rejected_total", "Calls rejected because the executor was saturated")
+QUEUE_SECONDS = metrics.histogram("routeminds_executor_queue_seconds", "Time calls waited for an executor slot")
+RESTARTS = metrics.counter("routeminds_executor_restarts_total", "Process pools rebuilt after a worker died")
+
+OFFLOADED_SERVICES = ("prediction", "eta", "ai_routing", "journey", "timetable")
+
+
+class ExecutorSaturated(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Server busy, retry later")
+        self.retry_after = retry_after
+
+
+class ServiceUnavailable(Exception):
+    """A service could not be loaded (missing dataset, route index, model...); the app answers 503."""
+
+    def __init__(self, service: str):
+        # only the name travels back from worker processes; the cause is logged where it happened
+        super().__init__(service)
+        self.service = service
+
+    def __str__(self) -> str:
+        return "Service temporarily unavailable"
+
+
+# ----- worker side (runs in the pool thread / process) -----
+def _init_worker(services: Sequence[str], warmup: bool, max_routes: int, started: Any = None) -> None:
+    from .registry import registry
+
+    for name in services:
+        try:
+            registry.get(name)
+        except Exception:
+            logger.exception("Worker %d: service %s failed to load", os.getpid(), name)
+    if warmup:
+        registry.warmup(max_routes)
+    if started is not None:
+        started.put(os.getpid())  # one worker can run many tasks; the parent counts distinct pids
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+_swap_lock = threading.Lock()
+_swap_requested: Optional[str] = None
+
+
+def _follow_model_version(model_version: str) -> None:
+    """
+    Follow a hot swap made in the parent (/models/activate): the new version is loaded and
+    warmed in a background thread while this worker keeps answering with the old one, then
+    swapped in (ModelRegistry.activate). Only a worker without any model loads it inline.
+    """
+    global _swap_requested
+    from ..models.registry import model_registry
+
+    if model_registry.active_version == model_version:
+        return
+    if model_registry.active_version is None:
+        model_registry.activate(model_version)
+        return
+    with _swap_lock:
+        # once per target version; a failed load is logged and the old model stays
+        if _swap_requested == model_version:
+            return
+        _swap_requested = model_version
+    logger.info("Worker %d: loading model version %s in the background", os.getpid(), model_version)
+    model_registry.activate(model_version, background=True)
+
+
+def _call_service(service: str, method: str, model_version: Optional[str], args: tuple) -> Tuple[Any, List]:
+    from .registry import registry
+
+    if model_version is not None:
+        _follow_model_version(model_version)
+    timings = start_request_timings()
+    try:
+        instance = registry.get(service)
+    except Exception:
+        logger.exception("Service %s failed to load", service)
+        raise ServiceUnavailable(service) from None
+    try:
+        result = getattr(instance, method)(*args)
+    except FileNotFoundError:
+        # data the service reads lazily (route index, geometry...) is missing: same as a failed load
+        logger.exception("Service %s is missing data", service)
+        raise ServiceUnavailable(service) from None
+    return result, timings
+
+
+# ----- event-loop side -----
+class InferenceExecutor:
+    def __init__(
+        self,
+        mode: str = "thread",
+        workers: int = 1,
+        max_concurrency: int = 0,
+        max_queue: int = 64,
+        retry_after: int = 1,
+        start_method: str = "spawn",
+    ):
+        self.mode = mode
+        self.workers = max(1, int(workers))
+        # more concurrent calls than workers would only queue inside the pool, unbounded
+        self.max_concurrency = min(int(max_concurrency) or self.workers, self.workers)
+        self.max_queue = max(0, int(max_queue))
+        self.retry_after = int(retry_after)
+        self.start_method = start_method
+        self._pool: Optional[Executor] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._warm_futures: List[Any] = []
+        self._started: Any = None  # multiprocessing queue the workers put their pid on
+        self._ready_pids: set = set()
+        self._start_args: Tuple[bool, int] = (WARMUP_ON_STARTUP, WARMUP_MAX_ROUTES)
+        self.started_at: Optional[float] = None
+        self.completed = 0
+        self.restarts = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_concurrency + self.max_queue
+
+    def start(self, warmup: bool = WARMUP_ON_STARTUP, max_routes: int = WARMUP_MAX_ROUTES) -> None:
+        if self._pool is not None:
+            return
+        self._start_args = (warmup, max_routes)
+        if self.mode == "process":
+            ctx = multiprocessing.get_context(self.start_method)
+            self._started = ctx.Queue()
+            self._ready_pids = set()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(OFFLOADED_SERVICES, warmup, max_routes, self._started),
+            )
+            # one task per worker so every process is spawned and loaded before traffic
+            self._warm_futures = [self._pool.submit(_worker_ready) for _ in range(self.workers)]
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="routeminds-exec")
+        self.started_at = time.time()
+        logger.info("Executor started: mode=%s workers=%d concurrency=%d queue=%d",
+                    self.mode, self.workers, self.max_concurrency, self.max_queue)
+
+    def shutdown(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _restart(self, broken: Executor) -> None:
+        # concurrent calls all see the same broken pool; only the first one replaces it
+        if self._pool is not broken:
+            return
+        logger.error("Executor worker process died; rebuilding the process pool")
+        self._pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.restarts += 1
+        RESTARTS.inc()
+        self.start(*self._start_args)
+
+    @property
+    def ready(self) -> bool:
+        if self.mode != "process":
+            return True  # the pool threads use this process's services (see ServiceRegistry.ready)
+        if self._pool is None:
+            return False
+        while True:
+            try:
+                self._ready_pids.add(self._started.get_nowait())
+            except queue.Empty:
+                break
+        return len(self._ready_pids) >= self.workers
+
+    def _model_version(self) -> Optional[str]:
+        if self.mode != "process":
+            return None  # threads share this process's model registry
+        from ..models.registry import model_registry
+
+        return model_registry.active_version
+
+    def _finish(self) -> None:
+        self._sem.release()
+        self._in_flight -= 1
+        self.completed += 1
+
+    async def run(self, service: str, method: str, *args: Any) -> Any:
+        if self._pool is None:
+            self.start()
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        if self._in_flight >= self.capacity:
+            REJECTED.inc(service=service)
+            raise ExecutorSaturated(self.retry_after)
+
+        self._in_flight += 1
+        submitted = False
+        pool = self._pool
+        try:
+            t0 = time.perf_counter()
+            await self._sem.acquire()
+            QUEUE_SECONDS.observe(time.perf_counter() - t0, service=service)
+            pool = self._pool
+            try:
+                cf = pool.submit(_call_service, service, method, self._model_version(), args)
+            except BaseException:
+                self._sem.release()
+                raise
+            submitted = True
+            # the slot is freed when the work is done, even if this request was cancelled meanwhile
+            loop = asyncio.get_running_loop()
+            cf.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finish))
+            result, timings = await asyncio.wrap_future(cf)
+        except BrokenProcessPool:
+            self._restart(pool)
+            raise ServiceUnavailable(service) from None
+        finally:
+            if not submitted:
+                self._in_flight -= 1
+
+        if self.mode == "process":
+            # stage timings measured in the worker: histogram here + this request's Server-Timing
+            for name, seconds in timings:
+                svc, _, stage_name = name.rpartition(".")
+                STAGE_SECONDS.observe(seconds, service=svc, stage=stage_name)
+        record_timings(timings)
+        return result
+
+    def call(self, service: str, method: str, *args: Any) -> Any:
+        """
+        Blocking call for background threads (e.g. the observation consumer), outside the
+        request slots: in a worker process in process mode, so the parent never loads the
+        service, else inline in the calling thread.
+        """
+        if self.mode != "process":
+            return _call_service(service, method, None, args)[0]
+        if self._pool is None:
+            self.start()
+        pool = self._pool
+        try:
+            result, _ = pool.submit(_call_service, service, method, self._model_version(), args).result()
+        except BrokenProcessPool:
+            self._restart(pool)
+            raise ServiceUnavailable(service) from None
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": int(REJECTED.total()),
+            "restarts": self.restarts,
+            "ready": self.ready,
+        }
+
+
+executor = InferenceExecutor(
+    mode=EXECUTOR_MODE,
+    workers=EXECUTOR_WORKERS,
+    max_concurrency=EXECUTOR_MAX_CONCURRENCY,
+    max_queue=EXECUTOR_MAX_QUEUE,
+    retry_after=EXECUTOR_RETRY_AFTER,
+    start_method=EXECUTOR_START_METHOD,
+)
@@ -0,0 +1,117 @@
+# backend/services/ingest.py
+"""
+In-process consumer for observed arrivals.
+
+POST /api/eta/observations puts each batch on a bounded queue and returns; one
+background thread drains whatever is pending, folds it into the ETA service's live
+aggregates (ETAService.ingest) and flushes them to disk every LIVE_FLUSH_INTERVAL
+seconds and on shutdown. A full queue is reported as ExecutorSaturated (503 + Retry-After).
+The calls go through `executor.call`: in process mode they run in a worker (the live state
+is shared through its mapped files), so this process never loads an ETAService.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..config import EXECUTOR_RETRY_AFTER, LIVE_FLUSH_INTERVAL, LIVE_QUEUE_MAX
+from ..schemas.route_eta import ObservedArrival
+from ..utils.metrics import metrics, stage
+from .executor import ExecutorSaturated, executor
+
+logger = logging.getLogger(__name__)
+
+OBSERVATIONS = metrics.counter("routeminds_observations_total", "Observed arrivals by outcome")
+
+_STOP = object()
+
+
+class ObservationConsumer:
+    def __init__(self, max_queue: int = 256, flush_interval: float = 30.0):
+        self.flush_interval = float(flush_interval)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="observation-consumer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def submit(self, records: List[ObservedArrival]) -> int:
+        self.start()
+        try:
+            self._queue.put_nowait(records)
+        except queue.Full:
+            OBSERVATIONS.inc(len(records), outcome="rejected")
+            raise ExecutorSaturated(EXECUTOR_RETRY_AFTER)
+        OBSERVATIONS.inc(len(records), outcome="accepted")
+        return self._queue.qsize()
+
+    def _drain(self, first: Any) -> tuple:
+        # everything already queued goes into one update
+        records, stop = [], first is _STOP
+        if not stop:
+            records.extend(first)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return records, stop
+            if item is _STOP:
+                stop = True
+            else:
+                records.extend(item)
+
+    def _run(self) -> None:
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                first = self._queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                first = None
+            records, stop = self._drain(first) if first is not None else ([], False)
+            try:
+                if records:
+                    with stage("apply", "ingest"):
+                        counts = executor.call("eta", "ingest", records)
+                    OBSERVATIONS.inc(counts["applied"], outcome="applied")
+                    OBSERVATIONS.inc(counts["unmatched"], outcome="unmatched")
+                if stop or time.monotonic() >= next_flush:
+                    with stage("flush", "ingest"):
+                        executor.call("eta", "flush_live")
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Observation batch of %d records failed", len(records))
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_interval
+            if stop:
+                return
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queued_batches": self._queue.qsize(),
+            "accepted": int(OBSERVATIONS.value(outcome="accepted")),
+            "applied": int(OBSERVATIONS.value(outcome="applied")),
+            "unmatched": int(OBSERVATIONS.value(outcome="unmatched")),
+            "rejected": int(OBSERVATIONS.value(outcome="rejected")),
+            "last_error": self.last_error,
+        }
+
+
+consumer = ObservationConsumer(max_queue=LIVE_QUEUE_MAX, flush_interval=LIVE_FLUSH_INTERVAL)
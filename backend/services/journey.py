@@ -0,0 +1,356 @@
+# services/journey.py
+"""
+Multi-route journey planning over the dataset timetable (RAPTOR, round-based).
+
+Round k finds the earliest arrival at every stop using exactly k trips: every pattern
+serving a stop improved in round k-1 is scanned once, then walking transfers are relaxed
+from the stops it improved. Trips are costed with predicted times (scheduled + DelayCube
+mean delay for the travel day and hour), so a "fast" connection that usually runs late
+loses to a reliable one. Each round's best arrival at the destination that beats all
+rounds with fewer trips is one itinerary (the Pareto set of arrival time vs. transfers).
+"""
+from __future__ import annotations
+
+import logging
+import time as _time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..schemas.route_eta import JourneyItinerary, JourneyLeg, JourneyRequest, JourneyResponse
+from ..utils.array_store import load_arrays, read_meta, save_arrays
+from ..utils.dataset_snapshot import (
+    default_snapshot_dir,
+    load_dataset,
+    read_delay_cube,
+    snapshot_created_at,
+    snapshot_is_fresh,
+)
+from ..utils.delay_cube import DelayCube
+from ..utils.metrics import stage
+from ..utils.transit_network import TIME_BITS, TIME_MASK, TransitNetwork, gather_csr
+from ..config import (
+    SHARED_ARTIFACTS,
+    JOURNEY_ACCESS_RADIUS_M,
+    JOURNEY_MAX_TRANSFERS,
+    JOURNEY_TRANSFER_RADIUS_M,
+    JOURNEY_TRANSFER_SLACK_S,
+    JOURNEY_WALK_SPEED_MPS,
+)
+
+logger = logging.getLogger(__name__)
+
+TRANSIT_NETWORK_DIR = "transit_network"
+
+
+def _hms(seconds: float) -> str:
+    s = int(round(seconds))
+    return f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}"
+
+
+class _Round:
+    """Labels of one round: arrival by riding (or access in round 0) and by walking after it."""
+
+    def __init__(self, n: int):
+        self.ride = np.full(n, np.inf)
+        self.walk = np.full(n, np.inf)
+        self.pattern = np.full(n, -1, dtype=np.int64)
+        self.trip = np.full(n, -1, dtype=np.int64)
+        self.board = np.full(n, -1, dtype=np.int64)   # position in the pattern
+        self.alight = np.full(n, -1, dtype=np.int64)  # position in the pattern
+        self.walk_from = np.full(n, -1, dtype=np.int64)
+
+    @property
+    def best(self) -> np.ndarray:
+        return np.minimum(self.ride, self.walk)
+
+
+class JourneyPlanner:
+    def __init__(self, network: TransitNetwork, delays: DelayCube):
+        self.network = network
+        self.delays = delays
+
+    @classmethod
+    def from_dataset(cls, dataset_path: str, snapshot_dir: Optional[str] = None) -> "JourneyPlanner":
+        """Mapped network prebuilt by scripts/build_serving_bundle.py, else built from the dataset."""
+        snapshot_dir = Path(snapshot_dir) if snapshot_dir else default_snapshot_dir(dataset_path)
+        if SHARED_ARTIFACTS and snapshot_is_fresh(snapshot_dir, dataset_path):
+            meta = read_meta(snapshot_dir / TRANSIT_NETWORK_DIR)
+            if (meta is not None and meta.get("snapshot_created_at") == snapshot_created_at(snapshot_dir)
+                    and meta.get("transfer_radius_m") == float(JOURNEY_TRANSFER_RADIUS_M)):
+                arrays, meta = load_arrays(snapshot_dir / TRANSIT_NETWORK_DIR)
+                return cls(TransitNetwork(arrays, meta), read_delay_cube(snapshot_dir))
+            logger.info("No prebuilt transit network for %s; building it in this process", snapshot_dir)
+        df, delays = load_dataset(dataset_path, snapshot_dir)
+        return cls(TransitNetwork.from_frame(df, delays, JOURNEY_TRANSFER_RADIUS_M), delays)
+
+    @staticmethod
+    def save_network(dataset_path: str, snapshot_dir: Optional[str] = None) -> Path:
+        """Build the transit network from a (fresh) snapshot and store it inside it."""
+        snapshot_dir = Path(snapshot_dir) if snapshot_dir else default_snapshot_dir(dataset_path)
+        df, delays = load_dataset(dataset_path, snapshot_dir)
+        network = TransitNetwork.from_frame(df, delays, JOURNEY_TRANSFER_RADIUS_M)
+        return save_arrays(snapshot_dir / TRANSIT_NETWORK_DIR, network.arrays,
+                           {**network.meta, "snapshot_created_at": snapshot_created_at(snapshot_dir)})
+
+    # ----- endpoints of the search -----
+    def _endpoints(self, stop_id: Optional[int], coord, radius_m: float, side: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(stop indices, walking metres) an origin/destination connects to."""
+        net = self.network
+        if stop_id is not None:
+            i = net.stop_index(int(stop_id))
+            if i is None:
+                raise KeyError(f"Stop {stop_id} not found in the timetable")
+            return np.asarray([i], dtype=np.int64), np.zeros(1)
+        if coord is None:
+            raise ValueError(f"{side}_stop_id or {side}_coord required")
+        idx, dist = net.stops_within(float(coord[0]), float(coord[1]), radius_m)
+        if not len(idx):
+            raise ValueError(f"No stops within {radius_m:.0f} m of the {side} coordinate")
+        return idx, dist
+
+    # ----- search -----
+    def _raptor(self, src: np.ndarray, src_t: np.ndarray, dst: np.ndarray, dst_s: np.ndarray,
+                pred: np.ndarray, max_rounds: int, walk_speed: float) -> List[_Round]:
+        net = self.network
+        n = net.n_stops
+        best = np.full(n, np.inf)  # earliest arrival with any number of trips, for pruning
+
+        r0 = _Round(n)
+        np.minimum.at(r0.ride, src, src_t)
+        best = np.minimum(best, r0.ride)
+        self._relax_transfers(r0, np.flatnonzero(np.isfinite(r0.ride)), best, dst, dst_s, walk_speed)
+        rounds = [r0]
+
+        for k in range(1, max_rounds + 1):
+            prev = rounds[-1]
+            ready = prev.best
+            marked = np.flatnonzero(np.isfinite(ready))
+            if not len(marked):
+                break
+            if k > 1:
+                ready = ready + JOURNEY_TRANSFER_SLACK_S  # time to change buses
+            cur = _Round(n)
+            bound = float(np.min(best[dst] + dst_s))
+
+            with stage("scan_patterns", "journey"):
+                self._scan_patterns(cur, marked, ready, best, bound, pred)
+
+            improved = np.flatnonzero(np.isfinite(cur.ride))
+            if not len(improved):
+                break
+            self._relax_transfers(cur, improved, best, dst, dst_s, walk_speed)
+            rounds.append(cur)
+        return rounds
+
+    def _scan_patterns(self, cur: _Round, marked: np.ndarray, ready: np.ndarray, best: np.ndarray,
+                       bound: float, pred: np.ndarray) -> None:
+        """
+        Ride every pattern serving a marked stop, from its first marked stop on, all patterns
+        at once: their remaining stops are laid end to end (one segment per pattern).
+        """
+        net = self.network
+        # patterns serving a marked stop, each from the first marked position
+        ent, _ = gather_csr(net.stop_pattern_offsets, marked)
+        pats, pos = net.stop_pattern[ent].astype(np.int64), net.stop_pattern_pos[ent].astype(np.int64)
+        order = np.lexsort((pos, pats))
+        pats, pos = pats[order], pos[order]
+        first = np.r_[True, pats[1:] != pats[:-1]]
+        pats, lo = pats[first], pos[first]
+
+        # g: pattern stop (column of the predicted timetable), seg: its pattern, i: position from lo
+        col_lo = net.pattern_stop_offsets[pats] + lo
+        counts = net.pattern_stop_offsets[pats + 1] - col_lo
+        seg = np.repeat(np.arange(len(pats)), counts)
+        seg_start = np.cumsum(counts) - counts
+        g = np.repeat(col_lo - seg_start, counts) + np.arange(int(counts.sum()))
+        i = g - col_lo[seg]
+        stops = net.pattern_stops[g].astype(np.int64)
+        n_trips = net.column_trips[g]
+        start = net.column_start[g]
+
+        # earliest catchable trip at each stop: first predicted time >= ready in its column
+        r = np.minimum(np.ceil(ready[stops]), TIME_MASK).astype(np.int64)
+        catch = np.searchsorted(pred, (g << TIME_BITS) | r) - start
+
+        # trip ridden into position i: the earliest one caught at any earlier position. Keys of
+        # later segments are offset below all earlier ones, so one running minimum restarts
+        # at every segment; ties keep the earliest boarding position.
+        m = int(counts.max()) + 1
+        span = (int(n_trips.max()) + 1) * m
+        offset = (len(pats) - seg) * span
+        run = np.minimum.accumulate(offset + catch * m + i)
+        onboard = np.empty_like(run)
+        onboard[1:] = run[:-1]
+        onboard[seg_start] = offset[seg_start] + span - 1  # nothing boarded before a segment starts
+        local = onboard - offset
+        trip, board = local // m, local % m
+        on = trip < n_trips
+        arr = np.full(len(g), np.inf)
+        arr[on] = pred[start[on] + trip[on]] & TIME_MASK
+
+        imp = np.flatnonzero(arr < np.minimum(best[stops], bound))
+        if not len(imp):
+            return
+        # a stop can be reached by several patterns (or twice by a loop): assign worst first
+        imp = imp[np.argsort(-arr[imp], kind="stable")]
+        s = stops[imp]
+        cur.ride[s] = arr[imp]
+        cur.pattern[s] = pats[seg[imp]]
+        cur.trip[s] = trip[imp]
+        cur.board[s] = lo[seg[imp]] + board[imp]
+        cur.alight[s] = lo[seg[imp]] + i[imp]
+        np.minimum.at(best, s, arr[imp])
+
+    def _relax_transfers(self, rnd: _Round, from_stops: np.ndarray, best: np.ndarray,
+                         dst: np.ndarray, dst_s: np.ndarray, walk_speed: float) -> None:
+        net = self.network
+        ent, row = gather_csr(net.transfer_offsets, from_stops)
+        if not len(ent):
+            return
+        src = from_stops[row]
+        to = net.transfer_to[ent].astype(np.int64)
+        cand = rnd.ride[src] + net.transfer_m[ent] / walk_speed
+        bound = float(np.min(best[dst] + dst_s))
+        imp = np.flatnonzero(cand < np.minimum(best[to], bound))
+        if not len(imp):
+            return
+        imp = imp[np.argsort(-cand[imp], kind="stable")]
+        rnd.walk[to[imp]] = cand[imp]
+        rnd.walk_from[to[imp]] = src[imp]
+        np.minimum.at(best, to[imp], cand[imp])
+
+    # ----- itineraries -----
+    def _itinerary(self, rounds: List[_Round], k: int, stop: int, arrival: float, egress_m: float,
+                   start: float, access_m: Dict[int, float], base: datetime, walk_speed: float,
+                   pred: np.ndarray) -> JourneyItinerary:
+        net = self.network
+        at = lambda s: (base + timedelta(seconds=round(float(s)))).isoformat()  # noqa: E731
+        legs: List[JourneyLeg] = []
+
+        def walk_leg(a: Optional[int], b: Optional[int], t_from: float, t_to: float, metres: float) -> JourneyLeg:
+            return JourneyLeg(
+                mode="walk",
+                from_stop_id=int(net.stop_ids[a]) if a is not None else None,
+                to_stop_id=int(net.stop_ids[b]) if b is not None else None,
+                from_stop_name=(str(net.stop_name[a]) or None) if a is not None else None,
+                to_stop_name=(str(net.stop_name[b]) or None) if b is not None else None,
+                departure_iso=at(t_from), arrival_iso=at(t_to),
+                duration_minutes=round((t_to - t_from) / 60.0, 2), distance_m=round(metres, 1),
+            )
+
+        if egress_m > 0:
+            legs.append(walk_leg(stop, None, arrival - egress_m / walk_speed, arrival, egress_m))
+        s = stop
+        while True:
+            rnd = rounds[k]
+            if rnd.walk[s] < rnd.ride[s]:
+                f = int(rnd.walk_from[s])
+                metres = (rnd.walk[s] - rnd.ride[f]) * walk_speed
+                legs.append(walk_leg(f, s, rnd.ride[f], rnd.walk[s], metres))
+                s = f
+            if k == 0:
+                if access_m.get(s, 0.0) > 0:
+                    legs.append(walk_leg(None, s, start, rnd.ride[s], access_m[s]))
+                break
+            p, trip, b, a = int(rnd.pattern[s]), int(rnd.trip[s]), int(rnd.board[s]), int(rnd.alight[s])
+            s0 = int(net.pattern_stop_offsets[p])
+            sched = net.pattern_block(p)[trip]
+            columns = np.arange(s0, int(net.pattern_stop_offsets[p + 1]))
+            predicted = pred[net.column_start[columns] + trip] & TIME_MASK
+            board_stop = int(net.pattern_stops[s0 + b])
+            legs.append(JourneyLeg(
+                mode="bus",
+                route_short_name=str(net.pattern_route[p]),
+                trip_id=str(net.trip_ids[int(net.pattern_trip_offsets[p]) + trip]),
+                from_stop_id=int(net.stop_ids[board_stop]), to_stop_id=int(net.stop_ids[s]),
+                from_stop_name=str(net.stop_name[board_stop]) or None, to_stop_name=str(net.stop_name[s]) or None,
+                departure_iso=at(predicted[b]), arrival_iso=at(predicted[a]),
+                scheduled_departure_time=_hms(sched[b]), scheduled_arrival_time=_hms(sched[a]),
+                predicted_delay_minutes=round((float(predicted[a]) - float(sched[a])) / 60.0, 2),
+                duration_minutes=round((float(predicted[a]) - float(predicted[b])) / 60.0, 2),
+                n_stops=a - b,
+            ))
+            s, k = board_stop, k - 1
+        legs.reverse()
+        # leave as late as possible: the walks before the first bus end when it departs
+        bus = [j for j, leg in enumerate(legs) if leg.mode == "bus"]
+        if bus:
+            t_end = (datetime.fromisoformat(legs[bus[0]].departure_iso) - base).total_seconds()
+            for leg in reversed(legs[:bus[0]]):
+                seconds = leg.duration_minutes * 60.0
+                leg.departure_iso, leg.arrival_iso = at(t_end - seconds), at(t_end)
+                t_end -= seconds
+            start = t_end
+        return JourneyItinerary(
+            departure_iso=at(start), arrival_iso=at(arrival),
+            duration_minutes=round((arrival - start) / 60.0, 2),
+            n_transfers=max(len(bus) - 1, 0),
+            walk_m=round(sum(leg.distance_m or 0.0 for leg in legs), 1),
+            legs=legs,
+        )
+
+    def plan(self, request: JourneyRequest) -> JourneyResponse:
+        t_start = _time.perf_counter()
+        with stage("endpoints", "journey"):
+            depart = datetime.fromisoformat(request.depart_at_iso.replace("Z", "+00:00")) \
+                if request.depart_at_iso else datetime.now()
+            base = depart.replace(hour=0, minute=0, second=0, microsecond=0)
+            start = (depart - base).total_seconds()
+            radius = float(request.max_walk_m or JOURNEY_ACCESS_RADIUS_M)
+            walk_speed = float(JOURNEY_WALK_SPEED_MPS)
+            src, src_m = self._endpoints(request.from_stop_id, request.from_coord, radius, "from")
+            dst, dst_m = self._endpoints(request.to_stop_id, request.to_coord, radius, "to")
+            dst_s = dst_m / walk_speed
+            max_transfers = JOURNEY_MAX_TRANSFERS if request.max_transfers is None \
+                else min(request.max_transfers, JOURNEY_MAX_TRANSFERS)
+
+        with stage("predicted_times", "journey"):
+            pred = self.network.predicted_times(self.delays, depart.weekday())
+
+        itineraries: List[JourneyItinerary] = []
+        seen = set()
+        t = start
+        with stage("search", "journey"):
+            # later departures give alternatives once the Pareto set of one search is used up
+            while len(itineraries) < request.max_itineraries:
+                rounds = self._raptor(src, t + src_m / walk_speed, dst, dst_s, pred, max_transfers + 1, walk_speed)
+                best_so_far, next_t = np.inf, None
+                for k, rnd in enumerate(rounds):
+                    at_dst = rnd.best[dst] + dst_s
+                    j = int(np.argmin(at_dst))
+                    if not np.isfinite(at_dst[j]) or at_dst[j] >= best_so_far:
+                        continue
+                    best_so_far = float(at_dst[j])
+                    it = self._itinerary(rounds, k, int(dst[j]), best_so_far, float(dst_m[j]), t,
+                                         {int(s): float(m) for s, m in zip(src.tolist(), src_m.tolist())},
+                                         base, walk_speed, pred)
+                    # the next search leaves just late enough to miss this itinerary's first bus
+                    walked = 0.0
+                    for leg in it.legs:
+                        if leg.mode == "bus":
+                            dep = (datetime.fromisoformat(leg.departure_iso) - base).total_seconds()
+                            next_t = min(next_t, dep - walked + 1) if next_t is not None else dep - walked + 1
+                            break
+                        walked += leg.duration_minutes * 60.0
+                    signature = tuple((leg.mode, leg.trip_id, leg.from_stop_id, leg.to_stop_id) for leg in it.legs)
+                    if signature not in seen:
+                        seen.add(signature)
+                        itineraries.append(it)
+                if next_t is None or next_t <= t:
+                    break
+                t = next_t
+
+        itineraries.sort(key=lambda it: (it.arrival_iso, it.n_transfers))
+        return JourneyResponse(
+            depart_at_iso=(base + timedelta(seconds=start)).isoformat(),
+            itineraries=itineraries[:request.max_itineraries],
+            summary={
+                "n_origin_stops": int(len(src)),
+                "n_destination_stops": int(len(dst)),
+                "max_transfers": int(max_transfers),
+                "search_ms": round((_time.perf_counter() - t_start) * 1000.0, 2),
+            },
+        )
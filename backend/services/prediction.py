@@ -1,11 +1,22 @@
 from ..models.prediction import PredictionModel
 from ..schemas.prediction import PredictionRequest, PredictionResponse
 from pathlib import Path
+from typing import Optional
 
 
 class PredictionService:
-    def __init__(self, model_path: str = "models/trained_model.pkl", encoder_path: str = "models/route_label_encoder.pkl"):
+    def __init__(
+        self,
+        model_path: str = "models/trained_model.pkl",
+        encoder_path: str = "models/route_label_encoder.pkl",
+        model: Optional[PredictionModel] = None,
+    ):
+        if model is not None:
+            # shared instance from the model registry; replaced on hot swap
+            self.model = model
+            return
         base_path = Path(__file__).parent.parent  # backend/
+        # the pickles themselves come from the artifact store, shared with any other wrapper
         self.model = PredictionModel(
             model_path=base_path / model_path,
             encoder_path=base_path / encoder_path
@@ -13,9 +24,11 @@ class PredictionService:
 
     def make_prediction(self, request: PredictionRequest) -> PredictionResponse:
         features = [request.feature1, request.feature2, request.feature3]
-        prediction = self.model.predict(request.route_id, features)
+        model = self.model
+        prediction = model.predict(request.route_id, features)
 
         return PredictionResponse(
             route_id=request.route_id,
-            prediction=prediction
+            prediction=prediction,
+            model_version=getattr(model, "version", None),
         )
@@ -0,0 +1,226 @@
+# backend/services/registry.py
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from ..config import DATASET_PATH, DELAY_TABLE_DIR, PREDICTION_SOURCE, ROUTE_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """
+    Builds services on first use instead of at import time.
+
+    Each service has its own lock, so a slow dataset load does not block the model.
+    `load_all` + `warmup` are run by the app lifespan in a background thread;
+    `status()` backs the /ready endpoint.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._warmers: Dict[str, Callable[[Any, int], int]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self.warmup_enabled = False
+        self.warmed = False
+        self.warmup_stats: Dict[str, Any] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], warmer: Optional[Callable[[Any, int], int]] = None) -> None:
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        if warmer is not None:
+            self._warmers[name] = warmer
+
+    def get(self, name: str) -> Any:
+        inst = self._instances.get(name)
+        if inst is not None:
+            return inst
+        with self._locks[name]:
+            inst = self._instances.get(name)
+            if inst is None:
+                t0 = time.perf_counter()
+                try:
+                    inst = self._factories[name]()
+                except Exception as e:
+                    self._errors[name] = f"{type(e).__name__}: {e}"
+                    raise
+                self._load_seconds[name] = round(time.perf_counter() - t0, 3)
+                self._errors.pop(name, None)
+                self._instances[name] = inst
+                logger.info("Service %s loaded in %.2fs", name, self._load_seconds[name])
+        return inst
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def load_all(self) -> None:
+        for name in self._factories:
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception("Service %s failed to load", name)
+
+    def warmup(self, max_routes: int = 0) -> None:
+        """Run the registered warmers (one synthetic request per route) on every loaded service."""
+        self.warmup_enabled = True
+        for name, warmer in self._warmers.items():
+            if not self.is_loaded(name):
+                continue
+            t0 = time.perf_counter()
+            try:
+                n = warmer(self._instances[name], max_routes)
+            except Exception:
+                logger.exception("Warmup of %s failed", name)
+                n = 0
+            self.warmup_stats[name] = {"routes": n, "seconds": round(time.perf_counter() - t0, 3)}
+        self.warmed = True
+
+    def start_background(self, warmup: bool = True, max_routes: int = 0) -> threading.Thread:
+        def run():
+            self.load_all()
+            if warmup:
+                self.warmup(max_routes)
+
+        self.warmup_enabled = warmup
+        thread = threading.Thread(target=run, name="routeminds-preload", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def ready(self) -> bool:
+        loaded = all(self.is_loaded(name) for name in self._factories)
+        return loaded and (self.warmed or not self.warmup_enabled)
+
+    def status(self) -> Dict[str, Any]:
+        from ..models.registry import model_registry
+
+        return {
+            "ready": self.ready,
+            "model": model_registry.status(detail=False),  # served by the public /ready
+            "services": {
+                name: {
+                    "loaded": self.is_loaded(name),
+                    "load_seconds": self._load_seconds.get(name),
+                    "error": self._errors.get(name),
+                }
+                for name in self._factories
+            },
+            "warmup": {"enabled": self.warmup_enabled, "done": self.warmed, **self.warmup_stats},
+        }
+
+
+def _warm_eta(service: Any, max_routes: int) -> int:
+    from ..schemas.route_eta import RouteEtaRequest
+
+    n = 0
+    for key in service.route_tables:
+        if max_routes and n >= max_routes:
+            break
+        try:
+            service.get_eta(RouteEtaRequest(route_short_name=key))
+        except Exception:
+            continue
+        n += 1
+    return n
+
+
+def _warm_ai_routing(service: Any, max_routes: int) -> int:
+    from ..schemas.route_eta import RouteEtaRequest
+    from ..utils.route_index import load_route_index
+
+    n = 0
+    for key, stops in load_route_index(service.index_path).items():
+        if max_routes and n >= max_routes:
+            break
+        try:
+            service.compute_route_eta(RouteEtaRequest(
+                route_short_name=key,
+                from_stop_id=int(stops[0]["stop_id"]),
+                to_stop_id=int(stops[-1]["stop_id"]),
+            ))
+        except Exception:
+            continue
+        n += 1
+    return n
+
+
+def _make_prediction_service():
+    from .prediction import PredictionService
+    from ..models.registry import model_registry
+
+    svc = PredictionService(model=model_registry.active_model())
+    model_registry.subscribe(lambda handle: setattr(svc, "model", handle.model))
+    return svc
+
+
+def _make_eta_service():
+    from .eta import ETAService
+    return ETAService(dataset_path=str(DATASET_PATH))
+
+
+def _load_delay_table(handle: Any) -> Optional[Any]:
+    """The precomputed table for a model version, or None (the service then scores live)."""
+    if PREDICTION_SOURCE != "table":
+        return None
+    from ..models.delay_table import DelayTable
+
+    path = DELAY_TABLE_DIR or handle.path / "delay_table"
+    try:
+        table = DelayTable.load(path)
+    except FileNotFoundError:
+        logger.warning("No delay table at %s; model %s is scored live", path, handle.version)
+        return None
+    from ..models.registry import MODEL_FILE
+
+    stale = table.stale_reason(handle.version, handle.path / MODEL_FILE, ROUTE_INDEX_PATH)
+    if stale is not None:
+        logger.warning("Delay table at %s was %s; ignored, model %s is scored live (rebuild it with "
+                       "scripts/build_delay_table.py)", path, stale, handle.version)
+        return None
+    logger.info("Delay table %s: %d slots, %.1f MiB", path, len(table.values), table.nbytes / 2**20)
+    return table
+
+
+def _make_ai_routing_service():
+    from .ai_routing import AIRoutingService
+    from ..models.registry import model_registry
+
+    handle = model_registry.active
+    svc = AIRoutingService(model_wrapper=handle.model, index_path=str(ROUTE_INDEX_PATH),
+                           delay_table=_load_delay_table(handle))
+
+    def on_swap(new_handle):
+        # table first: it is only used while its version matches the model's
+        svc.delay_table = _load_delay_table(new_handle)
+        # the setter also drops predictions cached for the previous model
+        svc.model_wrapper = new_handle.model
+
+    model_registry.subscribe(on_swap)
+    return svc
+
+
+def _make_journey_planner():
+    from .journey import JourneyPlanner
+    return JourneyPlanner.from_dataset(str(DATASET_PATH))
+
+
+def _make_timetable_service():
+    from .timetable import TimetableService
+
+    # same transit network and delays as the journey planner, built once
+    planner = registry.get("journey")
+    return TimetableService(planner.network, planner.delays)
+
+
+registry = ServiceRegistry()
+registry.register("prediction", _make_prediction_service)
+registry.register("eta", _make_eta_service, warmer=_warm_eta)
+registry.register("ai_routing", _make_ai_routing_service, warmer=_warm_ai_routing)
+registry.register("journey", _make_journey_planner)
+registry.register("timetable", _make_timetable_service)
@@ -0,0 +1,120 @@
+# services/timetable.py
+"""
+Full-day timetables: predicted arrival times for every trip x stop of a route.
+
+Reads the journey planner's transit network (utils/transit_network.py): each pattern
+(one stop sequence of the route, e.g. one direction) is a (n_trips, n_stops) block of
+scheduled seconds, and the predicted blocks for the day of week come from the same cached
+column-major array the journey search uses. A request is a handful of array slices and
+one window mask per pattern; nothing loops over trips or stop rows.
+"""
+from __future__ import annotations
+
+from datetime import date as _date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..utils.delay_cube import DelayCube
+from ..utils.metrics import stage
+from ..utils.transit_network import TIME_MASK, TransitNetwork
+
+
+def _window_seconds(value: Optional[str], default: float, name: str) -> float:
+    if value is None or value == "":
+        return default
+    try:
+        parts = [int(x) for x in str(value).strip().split(":")]
+        if len(parts) not in (2, 3) or min(parts) < 0 or max(parts[1:]) >= 60:
+            raise ValueError(value)
+    except ValueError:
+        raise ValueError(f"{name} must be HH:MM[:SS] (hours past 24 allowed), got {value!r}") from None
+    return float(parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) == 3 else 0))
+
+
+class TimetableService:
+    def __init__(self, network: TransitNetwork, delays: DelayCube):
+        self.network = network
+        self.delays = delays
+        # route key -> its patterns, under both the short name and the route_id (as ETAService
+        # keys its route tables); a key present in both columns gets the union of their patterns
+        keys = np.concatenate([network.pattern_route, network.pattern_route_id]).astype(str)
+        patterns = np.tile(np.arange(len(network.pattern_route)), 2)
+        named = keys != "nan"  # a missing short name is not a key
+        keys, patterns = keys[named], patterns[named]
+        order = np.lexsort((patterns, keys))
+        keys, patterns = keys[order], patterns[order]
+        uniq, starts = np.unique(keys, return_index=True)
+        self.route_patterns: Dict[str, np.ndarray] = {
+            k: np.unique(block) for k, block in zip(uniq.tolist(), np.split(patterns, starts[1:]))
+        }
+
+    def timetable(
+        self,
+        route_short_name: str,
+        service_date: Optional[str] = None,
+        from_time: Optional[str] = None,
+        to_time: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Scheduled and predicted arrival times (seconds after midnight of `service_date`) of every
+        trip of the route that is running inside [from_time, to_time] at any of its stops.
+        The body only depends on the inputs (it is ETag'd); timings go to Server-Timing/metrics.
+        """
+        patterns = self.route_patterns.get(str(route_short_name))
+        if patterns is None:
+            raise KeyError(f"Route '{route_short_name}' not found in timetable")
+        day = _date.fromisoformat(service_date) if service_date else _date.today()
+        lo = _window_seconds(from_time, 0.0, "from_time")
+        hi = _window_seconds(to_time, float(TIME_MASK), "to_time")
+        if hi < lo:
+            raise ValueError("to_time must not be before from_time")
+
+        net = self.network
+        with stage("predicted_times", "timetable"):
+            pred = net.predicted_times(self.delays, day.weekday())
+        out: List[Dict[str, Any]] = []
+        n_trips = n_stop_times = 0
+        with stage("slice", "timetable"):
+            for p in patterns.tolist():
+                s_lo, s_hi = int(net.pattern_stop_offsets[p]), int(net.pattern_stop_offsets[p + 1])
+                t_lo, t_hi = int(net.pattern_time_offsets[p]), int(net.pattern_time_offsets[p + 1])
+                scheduled = net.pattern_block(p)
+                # the predicted block is stored stop-major (see TransitNetwork.predicted_times)
+                predicted = (pred[t_lo:t_hi] & TIME_MASK).reshape(s_hi - s_lo, -1).T
+                # times never decrease along a trip: first/last stop bound the trip's span
+                keep = (np.maximum(scheduled[:, -1], predicted[:, -1]) >= lo) & \
+                       (np.minimum(scheduled[:, 0], predicted[:, 0]) <= hi)
+                if not keep.any():
+                    continue
+                stops = net.pattern_stops[s_lo:s_hi]
+                trips = net.trip_ids[int(net.pattern_trip_offsets[p]):int(net.pattern_trip_offsets[p + 1])]
+                sched_kept = np.ascontiguousarray(scheduled[keep], dtype=np.int64)
+                pred_kept = np.ascontiguousarray(predicted[keep], dtype=np.int64)
+                n_trips += int(keep.sum())
+                n_stop_times += int(sched_kept.size)
+                out.append({
+                    "route_id": str(net.pattern_route_id[p]),
+                    "stop_ids": net.stop_ids[stops],
+                    "stop_names": net.stop_name[stops].tolist(),
+                    "trip_ids": trips[keep].tolist(),
+                    # rows = trips (in departure order), columns = stops
+                    "scheduled_arrival_s": sched_kept,
+                    "predicted_arrival_s": pred_kept,
+                    "predicted_delay_s": pred_kept - sched_kept,
+                })
+
+        return {
+            "format": "timetable",
+            "route_short_name": route_short_name,
+            "service_date": day.isoformat(),
+            "day_of_week": day.weekday(),
+            "from_s": int(lo),
+            "to_s": int(hi) if hi < TIME_MASK else None,
+            "patterns": out,
+            "summary": {
+                "n_patterns": len(out),
+                "n_trips": n_trips,
+                "n_stop_times": n_stop_times,
+            },
+        }
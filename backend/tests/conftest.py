@@ -0,0 +1,9 @@
+import os
+
+# settings are read at import (backend/config.py): local auth instead of Firebase, no
+# background preload, services in this process
+os.environ.setdefault("ROUTEMINDS_AUTH_BACKEND", "local")
+os.environ.setdefault("ROUTEMINDS_LOCAL_AUTH_SECRET", "test-secret-for-hs256-tokens-0123456789")
+os.environ.setdefault("ROUTEMINDS_ADMIN_UIDS", "ops")
+os.environ.setdefault("ROUTEMINDS_PRELOAD", "0")
+os.environ.setdefault("ROUTEMINDS_EXECUTOR", "thread")
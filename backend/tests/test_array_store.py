@@ -0,0 +1,51 @@
+import numpy as np
+
+from backend.utils.array_store import KEEP_VERSIONS, load_arrays, remove_dir, save_arrays
+from backend.utils.dataset_snapshot import dataset_identity, load_dataset, snapshot_created_at
+
+
+def test_rebuild_swaps_a_link_and_keeps_old_readers_working(tmp_path):
+    out = tmp_path / "store"
+    save_arrays(out, {"a": np.arange(3)}, {"n": 1})
+    old, _ = load_arrays(out)
+    for n in range(2, 5):
+        save_arrays(out, {"a": np.arange(3) * n}, {"n": n})
+
+    assert out.is_symlink()
+    arrays, meta = load_arrays(out)
+    assert meta["n"] == 4 and arrays["a"].tolist() == [0, 4, 8]
+    # mapped before the rebuilds: still readable after its version was pruned
+    assert old["a"].tolist() == [0, 1, 2]
+    assert len(list(tmp_path.glob("store.v-*"))) == KEEP_VERSIONS
+    assert not list(tmp_path.glob(".store.tmp-*"))
+
+    remove_dir(out)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".store.lock"]
+
+
+def test_plain_directory_is_replaced(tmp_path):
+    out = tmp_path / "store"
+    out.mkdir()
+    (out / "stale.npy").write_bytes(b"")
+    save_arrays(out, {"a": np.arange(2)})
+    assert out.is_symlink() and load_arrays(out)[0]["a"].tolist() == [0, 1]
+
+
+def test_dataset_identity_survives_a_snapshot_rebuild(tmp_path):
+    csv = tmp_path / "ds.csv"
+    csv.write_text(
+        "trip_id,route_id,route_short_name,stop_id,stop_name,stop_lat,stop_lon,stop_sequence,"
+        "scheduled_arrival_time,day_of_week,hour_of_day,holiday_flag,delay_minutes\n"
+        "t1,r1,142,1,A,1.0,2.0,1,08:00:00,1,8,0,2.5\n"
+        "t1,r1,142,2,B,1.1,2.1,2,08:05:00,1,8,0,3.0\n"
+    )
+    snapshot = tmp_path / "ds.snapshot"
+    load_dataset(str(csv), snapshot)
+    first = (dataset_identity(str(csv), snapshot), snapshot_created_at(snapshot))
+    remove_dir(snapshot)
+    load_dataset(str(csv), snapshot)
+
+    assert snapshot_created_at(snapshot) != first[1]
+    assert dataset_identity(str(csv), snapshot) == first[0]
+    # without the CSV, the identity recorded in the snapshot
+    assert dataset_identity(None, snapshot) == first[0]
@@ -0,0 +1,51 @@
+import json
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from backend.models.delay_table import DelayTable, source_identity
+
+
+@pytest.fixture
+def built(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 10, size=(200, 7))
+    model_path = tmp_path / "trained_model.pkl"
+    joblib.dump(RandomForestRegressor(n_estimators=3, random_state=0).fit(X, X[:, 3]), model_path)
+    index_path = tmp_path / "route_index.json"
+    index = {"142": [{"stop_id": 1, "stop_sequence": 1, "lat": 28.6, "lon": 77.2},
+                     {"stop_id": 2, "stop_sequence": 2, "lat": 28.7, "lon": 77.3}]}
+    index_path.write_text(json.dumps(index))
+    table = DelayTable.build(str(model_path), index, {"142": 0}, n_jobs=1, model_version="legacy")
+    table.meta["route_index_source"] = source_identity(index_path)
+    table = DelayTable.load(table.save(tmp_path / "delay_table"))
+    return table, model_path, index_path
+
+
+def test_fresh_table_accepted(built):
+    table, model_path, index_path = built
+    assert table.stale_reason("legacy", model_path, index_path) is None
+    assert table.values.shape == (2, 7, 24, 2)
+
+
+def test_other_version_rejected(built):
+    table, model_path, index_path = built
+    assert "v2" in table.stale_reason("v2", model_path, index_path)
+
+
+def test_retrained_model_with_same_version_rejected(built):
+    table, model_path, index_path = built
+    st = os.stat(model_path)
+    os.utime(model_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert "retrained" in table.stale_reason("legacy", model_path, index_path)
+
+
+def test_rebuilt_route_index_rejected(built):
+    table, model_path, index_path = built
+    index_path.write_text(index_path.read_text() + " ")
+    assert "route index" in table.stale_reason("legacy", model_path, index_path)
+    index_path.unlink()
+    assert table.stale_reason("legacy", model_path, index_path) is not None
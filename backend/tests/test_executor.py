@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from backend.services import executor as executor_module
+from backend.services.executor import ExecutorSaturated, InferenceExecutor, ServiceUnavailable
+
+
+def _wait_ready(ex, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while not ex.ready:
+        assert time.monotonic() < deadline, "workers did not report ready"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def process_executor(monkeypatch):
+    # workers load no services, so they start fast and need no data
+    monkeypatch.setattr(executor_module, "OFFLOADED_SERVICES", ())
+    ex = InferenceExecutor(mode="process", workers=2, max_queue=4)
+    ex.start(warmup=False, max_routes=0)
+    yield ex
+    ex.shutdown()
+
+
+def test_ready_counts_distinct_workers(process_executor):
+    ex = process_executor
+    _wait_ready(ex)
+    assert len(ex._ready_pids) == 2
+    assert ex.status()["ready"] is True
+
+
+def test_rebuilds_pool_after_worker_crash(process_executor):
+    ex = process_executor
+    _wait_ready(ex)
+    old_pids = set(ex._ready_pids)
+    crashed = ex._pool.submit(os._exit, 1)
+    with pytest.raises(Exception):
+        crashed.result(timeout=30)
+
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(ex.run("eta", "get_eta", None))
+    assert ex.restarts == 1
+    assert not ex.ready  # until the new workers have loaded
+
+    _wait_ready(ex)
+    assert ex._ready_pids.isdisjoint(old_pids)
+    assert ex._pool.submit(os.getpid).result(timeout=30) in ex._ready_pids
+
+
+def test_thread_mode_rejects_beyond_capacity():
+    ex = InferenceExecutor(mode="thread", workers=1, max_queue=0)
+    ex.start(warmup=False, max_routes=0)
+
+    async def main():
+        ex._in_flight = ex.capacity  # every slot taken
+        with pytest.raises(ExecutorSaturated):
+            await ex.run("eta", "get_eta", None)
+
+    try:
+        asyncio.run(main())
+        assert ex.ready
+    finally:
+        ex.shutdown()
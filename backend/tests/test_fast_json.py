@@ -0,0 +1,40 @@
+import json
+
+import numpy as np
+import pytest
+from starlette.requests import Request
+
+from backend.utils import fast_json
+
+PAYLOAD = {"a": float("nan"), "b": [1.5, float("inf"), np.float32("nan")], "c": np.array([2.0, -np.inf]),
+           "d": (np.int64(3), None), "e": "x"}
+
+
+def _request(**headers):
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                    "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]})
+
+
+@pytest.mark.parametrize("with_orjson", [True, False])
+def test_non_finite_floats_become_null(monkeypatch, with_orjson):
+    if not with_orjson:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    elif fast_json.orjson is None:
+        pytest.skip("orjson not installed")
+    out = json.loads(fast_json.dumps(PAYLOAD))  # strict: no bare NaN
+    assert out == {"a": None, "b": [1.5, None, None], "c": [2.0, None], "d": [3, None], "e": "x"}
+
+
+def test_gzip_representation_has_its_own_etag():
+    payload = {"rows": list(range(1000))}
+    plain = fast_json.fast_json_response(_request(), payload)
+    gz = fast_json.fast_json_response(_request(accept_encoding="gzip"), payload)
+    assert gz.headers["content-encoding"] == "gzip" and "content-encoding" not in plain.headers
+    assert gz.headers["etag"] == plain.headers["etag"][:-1] + '-gz"'
+
+    # each representation revalidates against its own tag only
+    assert fast_json.fast_json_response(_request(accept_encoding="gzip", if_none_match=gz.headers["etag"]),
+                                        payload).status_code == 304
+    assert fast_json.fast_json_response(_request(if_none_match=gz.headers["etag"]), payload).status_code == 200
+    assert fast_json.fast_json_response(_request(accept_encoding="gzip", if_none_match=plain.headers["etag"]),
+                                        payload).status_code == 200
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from backend.schemas.route_eta import ObservedArrival, RouteEtaRequest
+from backend.services.eta import ETAService
+
+MONDAY_8 = "2025-01-06T08:10:00"
+HEADER = ("trip_id,route_id,route_short_name,stop_id,stop_name,stop_lat,stop_lon,stop_sequence,"
+          "scheduled_arrival_time,day_of_week,hour_of_day,holiday_flag,delay_minutes\n")
+
+
+@pytest.fixture
+def service(tmp_path):
+    csv = tmp_path / "ds.csv"
+    rows = [f"t{t},R1,142,{stop},S{stop},28.6,77.2,{stop},08:{stop:02d}:00,0,8,0,{2.0 + t}\n"
+            for t in range(2) for stop in (1, 2, 3)]
+    csv.write_text(HEADER + "".join(rows))
+    svc = ETAService(str(csv), str(tmp_path / "ds.snapshot"))
+    assert svc.live is not None and svc.live.state_dir == tmp_path / "ds.live"
+    return svc
+
+
+def _delays(svc):
+    resp = svc.get_eta(RouteEtaRequest(route_short_name="142", timestamp_iso=MONDAY_8))
+    return [s.predicted_delay_minutes for s in resp.stops]
+
+
+def test_observations_blend_into_the_eta(service):
+    code = service.route_tables["142"].route_code
+    hist = _delays(service)
+    assert hist == [2.5, 2.5, 2.5]
+    version = service.live.version(code)
+
+    obs = [ObservedArrival(route_short_name="142", stop_id=2, delay_minutes=d, observed_at_iso=MONDAY_8)
+           for d in (10.0, 14.0)]
+    assert service.ingest(obs) == {"received": 2, "applied": 2, "unmatched": 0}
+
+    # the cached response was keyed on the old route version
+    assert service.live.version(code) == version + 1
+    k, w, live = service.live.prior_weight, 2.0, 12.0
+    after = _delays(service)
+    assert after[1] == pytest.approx(round((k * hist[1] + w * live) / (k + w), 2))
+    assert after[0] == hist[0] and after[2] == hist[2]
+
+
+def test_blend_leaves_unseen_and_unknown_slots(service):
+    hist = np.array([1.0, 2.0, 3.0])
+    out = service.live.blend(hist, np.array([0, -1, 1]), 0, 8)
+    assert out.tolist() == hist.tolist()
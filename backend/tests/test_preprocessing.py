@@ -0,0 +1,44 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from backend.utils.preprocessing import FeaturePipeline, RouteEncoder, route_keys
+
+
+def _csv(text: str) -> pd.DataFrame:
+    # read like the notebook does: no dtype, so blanks turn numeric short names into floats
+    return pd.read_csv(io.StringIO(text))
+
+
+def test_route_keys_numeric_names_with_blanks():
+    df = _csv("route_short_name,route_id\n142,R1\n,R2\n150,R3\n")
+    assert df["route_short_name"].dtype.kind == "f"
+    assert route_keys(df).tolist() == ["142", "R2", "150"]
+
+
+def test_route_keys_match_string_read():
+    text = "route_short_name,route_id\n142,R1\n,R2\n7A,R3\n"
+    as_str = pd.read_csv(io.StringIO(text), dtype={"route_short_name": str, "route_id": str})
+    assert route_keys(_csv(text)).tolist() == route_keys(as_str).tolist() == ["142", "R2", "7A"]
+
+
+def test_route_keys_numeric_route_id_fallback():
+    df = pd.DataFrame({"route_short_name": np.array([np.nan, 3.0], dtype=np.float32), "route_id": [12.0, 5.0]})
+    assert route_keys(df).tolist() == ["12", "3"]
+
+
+def test_route_keys_non_integral_floats_kept():
+    df = pd.DataFrame({"route_short_name": [1.5, np.nan], "route_id": [np.nan, np.nan]})
+    assert route_keys(df).tolist() == ["1.5", "nan"]
+
+
+def test_encoder_fit_on_float_read_serves_string_routes():
+    # the notebook fits on route_keys(train_df); serving encodes "142"
+    train = _csv("route_short_name,route_id,stop_sequence,day_of_week,hour_of_day,holiday_flag,stop_lat,stop_lon\n"
+                 "142,R1,1,0,8,0,28.6,77.2\n,R2,2,0,8,0,28.6,77.2\n")
+    encoder = RouteEncoder(sorted(set(route_keys(train))))
+    pipeline = FeaturePipeline(encoder)
+    X = pipeline.transform({"route_short_name": "142", "stop_sequence": 1, "day_of_week": 0, "hour_of_day": 8,
+                            "holiday_flag": 0, "stop_lat": 28.6, "stop_lon": 77.2})
+    assert X[0, 0] == encoder.code("142")
@@ -0,0 +1,164 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.utils.token_cache import LocalTokenVerifier, VerifiedTokenCache
+
+
+class CountingVerifier:
+    def __init__(self, ttl_s: float = 3600.0):
+        self.ttl_s = ttl_s
+        self.calls = 0
+        self.during = None  # called inside verification, to simulate concurrent work
+
+    def __call__(self, token: str):
+        self.calls += 1
+        if token.startswith("bad"):
+            raise ValueError("invalid token")
+        if self.during is not None:
+            self.during()
+        uid = token.split(":")[0]
+        return {"uid": uid, "exp": time.time() + self.ttl_s, "firebase": {"sign_in_provider": "password"}}
+
+
+def test_hit_returns_a_copy():
+    verifier = CountingVerifier()
+    cache = VerifiedTokenCache(verifier, maxsize=10)
+    first = cache.verify("u1:a")
+    first["uid"] = "changed"
+    first["firebase"]["sign_in_provider"] = "changed"
+    second = cache.verify("u1:a")
+    second["admin"] = True
+    third = cache.verify("u1:a")
+    assert verifier.calls == 1
+    assert third == {"uid": "u1", "exp": third["exp"], "firebase": {"sign_in_provider": "password"}}
+    assert cache.stats()["hits"] == 2
+
+
+def test_expiry_capped_by_max_ttl(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    verifier = CountingVerifier(ttl_s=3600)
+    cache = VerifiedTokenCache(verifier, maxsize=10, max_ttl_s=60)
+    cache.verify("u1:a")
+    now[0] += 59
+    cache.verify("u1:a")
+    assert verifier.calls == 1
+    now[0] += 2  # past max_ttl_s, long before exp
+    cache.verify("u1:a")
+    assert verifier.calls == 2
+    assert cache.stats()["expirations"] == 1
+
+
+def test_token_past_exp_is_not_cached():
+    verifier = CountingVerifier(ttl_s=-1)
+    cache = VerifiedTokenCache(verifier, maxsize=10)
+    cache.verify("u1:a")
+    cache.verify("u1:a")
+    assert verifier.calls == 2
+    assert cache.stats()["size"] == 0
+
+
+def test_failures_are_never_cached():
+    verifier = CountingVerifier()
+    cache = VerifiedTokenCache(verifier, maxsize=10)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            cache.verify("bad:a")
+    assert verifier.calls == 2
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_uid_drops_only_that_user():
+    verifier = CountingVerifier()
+    cache = VerifiedTokenCache(verifier, maxsize=10)
+    for token in ("u1:a", "u1:b", "u2:a"):
+        cache.verify(token)
+    assert cache.invalidate_uid("u1") == 2
+    assert cache.stats()["size"] == 1
+    cache.verify("u2:a")
+    assert verifier.calls == 3
+    cache.verify("u1:a")
+    assert verifier.calls == 4
+
+
+def test_invalidate_uid_during_verify_is_not_undone():
+    verifier = CountingVerifier()
+    cache = VerifiedTokenCache(verifier, maxsize=10)
+    verifier.during = lambda: cache.invalidate_uid("u1")
+    assert cache.verify("u1:a")["uid"] == "u1"
+    verifier.during = None
+    assert cache.stats()["size"] == 0
+    cache.verify("u1:a")
+    assert cache.stats()["size"] == 1  # later verifications are cached again
+
+
+def test_clear_during_verify_is_not_undone():
+    verifier = CountingVerifier()
+    cache = VerifiedTokenCache(verifier, maxsize=10)
+    verifier.during = cache.clear
+    cache.verify("u1:a")
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction():
+    verifier = CountingVerifier()
+    cache = VerifiedTokenCache(verifier, maxsize=2)
+    cache.verify("u1:a")
+    cache.verify("u2:a")
+    cache.verify("u1:a")  # u1 is now the most recent
+    cache.verify("u3:a")  # evicts u2
+    assert cache.stats()["evictions"] == 1
+    calls = verifier.calls
+    cache.verify("u1:a")
+    assert verifier.calls == calls
+    cache.verify("u2:a")
+    assert verifier.calls == calls + 1
+
+
+def test_local_verifier_roundtrip():
+    verifier = LocalTokenVerifier("test-secret-for-hs256-tokens-0123456789")
+    claims = verifier(verifier.issue("u1", admin=True))
+    assert claims["uid"] == "u1" and claims["admin"] is True
+
+
+@pytest.fixture(scope="module")
+def client():
+    from backend.main import app
+    return TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def issue():
+    from backend.main import token_cache
+    return token_cache.verifier.issue
+
+
+@pytest.mark.parametrize("path", ["/auth/token_cache", "/cache/stats", "/models"])
+def test_require_admin(client, issue, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": f"Bearer {issue('u1')}"}).status_code == 403
+    assert client.get(path, headers={"Authorization": f"Bearer {issue('u1', admin=True)}"}).status_code == 200
+    assert client.get(path, headers={"Authorization": f"Bearer {issue('ops')}"}).status_code == 200  # allow-listed
+    # the claim has to be true, not just present
+    assert client.get(path, headers={"Authorization": f"Bearer {issue('u1', admin='yes')}"}).status_code == 403
+
+
+def test_ready_does_not_report_server_paths(client):
+    r = client.get("/ready")
+    assert set(r.json()["model"]) == {"active", "loading", "failed"}
+    assert '"path"' not in r.text
+
+
+def test_invalidate_endpoint(client, issue):
+    from backend.main import token_cache
+
+    user_token = issue("u9")
+    assert client.get("/protected", headers={"Authorization": f"Bearer {user_token}"}).status_code == 200
+    admin = {"Authorization": f"Bearer {issue('ops')}"}
+    assert client.post("/auth/token_cache/invalidate", params={"uid": "u9"},
+                       headers={"Authorization": f"Bearer {user_token}"}).status_code == 403
+    r = client.post("/auth/token_cache/invalidate", params={"uid": "u9"}, headers=admin)
+    assert r.status_code == 200 and r.json() == {"uid": "u9", "dropped": 1}
+    assert token_cache.invalidate_uid("u9") == 0
@@ -0,0 +1,34 @@
+import pytest
+
+from backend.models.registry import ENCODER_FILE, MODEL_FILE, ModelRegistry
+from backend.models.training import train
+
+
+def _fake_version(path):
+    path.mkdir(parents=True)
+    (path / MODEL_FILE).write_bytes(b"")
+    (path / ENCODER_FILE).write_bytes(b"")
+
+
+def test_existing_version_is_refused_without_force(tmp_path):
+    _fake_version(tmp_path / "v1")
+    with pytest.raises(FileExistsError):
+        train([(tmp_path / "missing.csv", None)], tmp_path, version="v1")
+    # refused before any work: nothing touched, no scratch left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["v1"]
+
+
+def test_invalid_version_names(tmp_path):
+    for name in (".hidden", "a/b"):
+        with pytest.raises(ValueError):
+            train([(tmp_path / "missing.csv", None)], tmp_path, version=name)
+
+
+def test_list_versions_skips_scratch_dirs(tmp_path):
+    versions = tmp_path / "versions"
+    _fake_version(versions / "v1")
+    _fake_version(versions / ".v2.tmp-123")
+    _fake_version(versions / ".train-v2-abc")
+    reg = ModelRegistry(tmp_path / "legacy", versions)
+    assert [v["version"] for v in reg.list_versions()] == ["v1"]
+    assert reg.default_version() == "v1"
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from backend.models.tree_engine import CompiledForest, compile_and_validate
+
+xgb = pytest.importorskip("xgboost")
+
+COLUMNS = ["route_encoded", "stop_sequence", "day_of_week", "hour_of_day", "holiday_flag", "stop_lat", "stop_lon"]
+
+
+def _data(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(0, 40, n), rng.integers(1, 60, n), rng.integers(0, 7, n), rng.integers(0, 24, n),
+        rng.integers(0, 2, n), rng.uniform(28.4, 28.9, n), rng.uniform(76.9, 77.4, n),
+    ]).astype(np.float64)
+    y = 2.0 * np.sin(X[:, 0]) + 0.05 * X[:, 1] + (X[:, 3] > 16) * 3.0 + 10 * (X[:, 5] - 28.6) + rng.normal(0, 0.5, n)
+    return X, y
+
+
+def _probe(forest, X, seed=1):
+    # real rows, rows sitting exactly on split thresholds, and a few NaNs
+    rng = np.random.default_rng(seed)
+    on_split = X[:200].copy()
+    internal = forest.left >= 0
+    for f in range(X.shape[1]):
+        thr = forest.threshold[internal & (forest.feature == f)]
+        if len(thr):
+            on_split[:, f] = rng.choice(thr, size=len(on_split))
+    with_nan = X[:50].copy()
+    with_nan[rng.random(with_nan.shape) < 0.2] = np.nan
+    return np.vstack([X[:500], on_split, with_nan])
+
+
+def test_random_forest_bit_identical():
+    X, y = _data()
+    model = RandomForestRegressor(n_estimators=25, max_depth=12, random_state=0, n_jobs=1).fit(X, y)
+    forest = CompiledForest.from_model(model)
+    P = _probe(forest, X)
+    np.testing.assert_array_equal(forest.predict(P), model.predict(P))
+    assert compile_and_validate(model) is not None
+
+
+@pytest.mark.parametrize("params", [{}, {"base_score": 3.5}], ids=["default", "base_score"])
+def test_xgboost_parity(params):
+    X, y = _data()
+    model = xgb.XGBRegressor(n_estimators=60, max_depth=5, learning_rate=0.2, random_state=0, **params).fit(X, y)
+    forest = CompiledForest.from_model(model)
+    P = _probe(forest, X)
+    np.testing.assert_allclose(forest.predict(P), model.predict(P), rtol=0, atol=1e-5)
+    if params:
+        assert forest.base == pytest.approx(params["base_score"])
+
+
+def test_xgboost_named_features():
+    X, y = _data()
+    frame = pd.DataFrame(X, columns=COLUMNS)
+    model = xgb.XGBRegressor(n_estimators=40, max_depth=4, random_state=0).fit(frame, y)
+    assert model.get_booster().feature_names == COLUMNS
+    forest = CompiledForest.from_model(model)
+    P = _probe(forest, X)
+    np.testing.assert_allclose(forest.predict(P), model.predict(pd.DataFrame(P, columns=COLUMNS)), rtol=0, atol=1e-5)
+
+
+def test_xgboost_best_iteration_respected():
+    X, y = _data()
+    Xv, yv = _data(500, seed=3)
+    model = xgb.XGBRegressor(n_estimators=400, learning_rate=0.3, max_depth=6, random_state=0,
+                             early_stopping_rounds=5).fit(X, y, eval_set=[(Xv, yv)], verbose=False)
+    assert model.best_iteration + 1 < model.get_booster().num_boosted_rounds()
+    forest = CompiledForest.from_model(model)
+    assert forest.n_trees == model.best_iteration + 1
+    P = _probe(forest, X)
+    np.testing.assert_allclose(forest.predict(P), model.predict(P), rtol=0, atol=1e-5)
+    assert compile_and_validate(model) is not None
+
+
+def test_xgboost_bad_round_count_rejected():
+    X, y = _data(300)
+    booster = xgb.XGBRegressor(n_estimators=5, max_depth=3).fit(X, y).get_booster()
+    with pytest.raises(TypeError):
+        CompiledForest.from_xgboost(booster, n_rounds=6)
@@ -0,0 +1,116 @@
+# backend/utils/array_store.py
+"""
+Directories of plain .npy arrays + meta.json, for read-only serving data.
+
+Arrays are opened with mmap (read-only), so every process that loads the same directory
+shares one copy in the OS page cache instead of holding its own. Strings must be stored
+as fixed-width unicode arrays (object arrays cannot be mapped).
+
+A store path is a symlink to a versioned sibling directory (`<name>.v-<ns>`); a rebuild
+writes a new version and swaps the link with a rename (`publish_dir`), so readers in other
+processes see the old or the new store, never a missing or half-written one.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+META_FILE = "meta.json"
+KEEP_VERSIONS = 2  # the previous one stays for readers still opening its files
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    # serializes writers across processes; readers never take it
+    with open(path, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _versions(out_dir: Path) -> list:
+    prefix = f"{out_dir.name}.v-"
+    found = [p for p in out_dir.parent.glob(f"{out_dir.name}.v-*") if p.name[len(prefix):].isdigit()]
+    return sorted(found, key=lambda p: int(p.name[len(prefix):]))
+
+
+def publish_dir(tmp: Path, out_dir) -> Path:
+    """Swap the finished directory `tmp` in at `out_dir` (see the module docstring)."""
+    out_dir = Path(out_dir)
+    # concurrent rebuilds each publish a complete version; the lock only orders the swaps
+    # and keeps one writer from pruning a version another is about to link
+    with file_lock(out_dir.with_name(f".{out_dir.name}.lock")):
+        target = out_dir.with_name(f"{out_dir.name}.v-{time.time_ns()}")
+        os.replace(tmp, target)
+        link = out_dir.with_name(f".{out_dir.name}.link-{os.getpid()}")
+        if os.path.lexists(link):
+            os.unlink(link)
+        os.symlink(target.name, link)
+        if out_dir.is_dir() and not out_dir.is_symlink():
+            shutil.rmtree(out_dir)  # plain directory written before stores were versioned
+        os.replace(link, out_dir)
+        for old in _versions(out_dir)[:-KEEP_VERSIONS]:
+            shutil.rmtree(old, ignore_errors=True)
+    return out_dir
+
+
+def remove_dir(path) -> None:
+    """Delete a published directory and all its versions."""
+    path = Path(path)
+    if path.is_symlink():
+        os.unlink(path)
+    elif path.is_dir():
+        shutil.rmtree(path)
+    for old in _versions(path):
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def save_arrays(out_dir, arrays: Dict[str, np.ndarray], meta: Optional[Dict[str, Any]] = None) -> Path:
+    """Write `arrays` next to `out_dir` and swap the directory in at the end."""
+    out_dir = Path(out_dir)
+    tmp = out_dir.with_name(f".{out_dir.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    for name, arr in arrays.items():
+        arr = np.asarray(arr)
+        if arr.dtype == object:
+            raise TypeError(f"Array '{name}' has dtype object; store strings as fixed-width unicode")
+        np.save(tmp / f"{name}.npy", np.ascontiguousarray(arr))
+    with open(tmp / META_FILE, "w", encoding="utf-8") as f:
+        json.dump({**(meta or {}), "arrays": sorted(arrays)}, f, indent=2)
+    return publish_dir(tmp, out_dir)
+
+
+def read_meta(path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(Path(path) / META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_arrays(path, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    path = Path(path)
+    meta = read_meta(path)
+    if meta is None:
+        raise FileNotFoundError(f"No array store at {path}")
+    arrays = {}
+    for name in meta["arrays"]:
+        try:
+            arrays[name] = np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+        except ValueError:
+            # empty arrays cannot be mapped
+            arrays[name] = np.load(path / f"{name}.npy")
+    return arrays, meta
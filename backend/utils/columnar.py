@@ -0,0 +1,95 @@
+# backend/utils/columnar.py
+"""
+Compact ("columnar") route ETA payloads: parallel arrays instead of one object per stop,
+and the stop coordinates as a single encoded polyline.
+
+Polylines use Google's encoded polyline algorithm (precision 5, ~1 m), which map
+clients decode natively. ETAs are seconds after midnight of `service_date`.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+def encode_polyline(lats: Sequence[float], lons: Sequence[float], precision: int = 5) -> str:
+    factor = 10 ** precision
+    lat_i = np.round(np.asarray(lats, dtype=np.float64) * factor).astype(np.int64)
+    lon_i = np.round(np.asarray(lons, dtype=np.float64) * factor).astype(np.int64)
+    if not len(lat_i):
+        return ""
+    # interleaved (lat, lon) deltas, zig-zag encoded
+    deltas = np.column_stack([np.diff(lat_i, prepend=0), np.diff(lon_i, prepend=0)]).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist()
+    out: List[str] = []
+    for v in values:
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[tuple]:
+    coords, values, shift, acc = [], [], 0, 0
+    for ch in encoded:
+        b = ord(ch) - 63
+        acc |= (b & 0x1F) << shift
+        shift += 5
+        if b < 0x20:
+            values.append(~(acc >> 1) if acc & 1 else acc >> 1)
+            shift, acc = 0, 0
+    lat = lon = 0
+    factor = 10 ** precision
+    for dlat, dlon in zip(values[0::2], values[1::2]):
+        lat += dlat
+        lon += dlon
+        coords.append((lat / factor, lon / factor))
+    return coords
+
+
+def hms_to_seconds(values: Iterable[Optional[str]], default: float = np.nan) -> np.ndarray:
+    """'HH:MM[:SS]' -> seconds after midnight; unparseable/missing values get `default`."""
+    out = []
+    for v in values:
+        try:
+            parts = [int(p) for p in str(v).split(":")]
+            if len(parts) not in (2, 3) or not (0 <= parts[0] < 24):
+                raise ValueError(v)
+            out.append(parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) == 3 else 0))
+        except (TypeError, ValueError):
+            out.append(default)
+    return np.asarray(out, dtype=np.float64)
+
+
+def columnar_eta(
+    route_short_name: str,
+    service_date: str,
+    stop_ids: Sequence[int],
+    stop_sequences: Sequence[int],
+    stop_names: Sequence[Optional[str]],
+    scheduled: Sequence[Optional[str]],
+    lats: Sequence[float],
+    lons: Sequence[float],
+    delays: np.ndarray,
+    eta_s: np.ndarray,
+    summary: Dict[str, Any],
+    geometry: Optional[str] = None,
+) -> Dict[str, Any]:
+    payload = {
+        "format": "columnar",
+        "route_short_name": route_short_name,
+        "service_date": service_date,
+        "stop_ids": list(stop_ids),
+        "stop_sequences": list(stop_sequences),
+        "stop_names": list(stop_names),
+        "scheduled_arrival_times": list(scheduled),
+        "predicted_delay_minutes": np.asarray(delays, dtype=np.float64).tolist(),
+        "predicted_eta_s": np.round(np.asarray(eta_s, dtype=np.float64), 1).tolist(),
+        "polyline": encode_polyline(lats, lons),
+        "summary": summary,
+    }
+    if geometry is not None:
+        payload["geometry"] = geometry  # road-following path (utils/route_geometry.py)
+    return payload
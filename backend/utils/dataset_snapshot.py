@@ -0,0 +1,242 @@
+# backend/utils/dataset_snapshot.py
+"""
+Binary snapshot of the cleaned bus_delay_dataset plus its delay aggregates.
+
+A snapshot is a directory of .npy files (one per column, string columns stored as
+int32 codes + a category array) and a DelayCube, described by `meta.json`.
+Numeric arrays are opened with mmap so loading skips CSV parsing and groupbys.
+Like the array stores, the snapshot path is a symlink swapped on rebuild (array_store.publish_dir).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .array_store import publish_dir
+from .delay_cube import DelayCube
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".snapshot"
+
+REQUIRED_COLUMNS = (
+    "trip_id",
+    "route_id",
+    "route_short_name",
+    "stop_id",
+    "stop_name",
+    "stop_lat",
+    "stop_lon",
+    "stop_sequence",
+    "scheduled_arrival_time",
+    "day_of_week",
+    "hour_of_day",
+    "holiday_flag",
+    "delay_minutes",
+)
+STRING_COLUMNS = ("trip_id", "route_id", "route_short_name", "stop_name", "scheduled_arrival_time")
+
+PathLike = Union[str, Path]
+
+
+def default_snapshot_dir(csv_path: PathLike) -> Path:
+    """`data/processed/bus_delay_dataset.csv` -> `data/processed/bus_delay_dataset.snapshot/`"""
+    return Path(csv_path).with_suffix(SNAPSHOT_SUFFIX)
+
+
+def load_clean_csv(csv_path: PathLike) -> pd.DataFrame:
+    """Read the dataset CSV, check required columns and normalize dtypes."""
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Dataset not found at: {csv_path}")
+
+    # ids as text: a numeric short name in a column with blanks would otherwise read as 142.0
+    df = pd.read_csv(csv_path, dtype={"trip_id": str, "route_id": str, "route_short_name": str})
+
+    missing = set(REQUIRED_COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"Dataset is missing columns: {missing}")
+
+    # Normalize types
+    df["trip_id"] = df["trip_id"].astype(str)
+    df["route_id"] = df["route_id"].astype(str)
+    df["route_short_name"] = df["route_short_name"].astype(str)
+
+    # stop_id & stop_sequence sometimes read as float; coerce to Int64
+    df["stop_id"] = pd.to_numeric(df["stop_id"], errors="coerce").astype("Int64")
+    df["stop_sequence"] = pd.to_numeric(df["stop_sequence"], errors="coerce").astype("Int64")
+
+    # lat/lon numeric
+    df["stop_lat"] = pd.to_numeric(df["stop_lat"], errors="coerce")
+    df["stop_lon"] = pd.to_numeric(df["stop_lon"], errors="coerce")
+
+    # times as strings "HH:MM:SS"
+    df["scheduled_arrival_time"] = df["scheduled_arrival_time"].astype(str)
+
+    # basic cleanup: drop rows we cannot use
+    df = df.dropna(subset=["stop_id", "stop_sequence", "stop_lat", "stop_lon"])
+    df["stop_id"] = df["stop_id"].astype(np.int64)
+    df["stop_sequence"] = df["stop_sequence"].astype(np.int64)
+
+    return df.reset_index(drop=True)
+
+
+def _read_meta(snapshot_dir: Path) -> Optional[dict]:
+    try:
+        with open(snapshot_dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == SNAPSHOT_VERSION else None
+
+
+def snapshot_is_fresh(snapshot_dir: PathLike, csv_path: Optional[PathLike] = None) -> bool:
+    """True if a readable snapshot exists and the CSV (if any) is not newer than it."""
+    meta = _read_meta(Path(snapshot_dir))
+    if meta is None:
+        return False
+    if csv_path is None or not os.path.exists(csv_path):
+        return True
+    st = os.stat(csv_path)
+    return st.st_mtime_ns <= meta.get("source_mtime_ns", -1) and st.st_size == meta.get("source_size")
+
+
+def write_snapshot(
+    df: pd.DataFrame,
+    delays: DelayCube,
+    snapshot_dir: PathLike,
+    source_path: Optional[PathLike] = None,
+) -> Path:
+    """
+    Write the cleaned frame and its aggregates. Rows are stored pre-sorted by
+    (stop_sequence, scheduled_arrival_time) so route tables build without a full sort.
+    The directory is written next to the target and swapped in at the end.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    tmp_dir = snapshot_dir.with_name(f".{snapshot_dir.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    (tmp_dir / "columns").mkdir(parents=True)
+    (tmp_dir / "delays").mkdir()
+
+    ordered = df.sort_values(["stop_sequence", "scheduled_arrival_time"], kind="mergesort")
+    columns = {}
+    for col in REQUIRED_COLUMNS:
+        ser = ordered[col]
+        if col in STRING_COLUMNS:
+            codes, cats = pd.factorize(ser, use_na_sentinel=True)
+            np.save(tmp_dir / "columns" / f"{col}.codes.npy", codes.astype(np.int32))
+            np.save(tmp_dir / "columns" / f"{col}.categories.npy", np.asarray(cats, dtype=str))
+            columns[col] = "category"
+        else:
+            arr = ser.to_numpy()
+            np.save(tmp_dir / "columns" / f"{col}.npy", arr)
+            columns[col] = str(arr.dtype)
+
+    for name, arr in delays.to_arrays().items():
+        np.save(tmp_dir / "delays" / f"{name}.npy", arr)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "n_rows": int(len(ordered)),
+        "columns": columns,
+        "created_at": time.time(),
+    }
+    if source_path is not None and os.path.exists(source_path):
+        st = os.stat(source_path)
+        meta.update(source_path=str(source_path), source_mtime_ns=st.st_mtime_ns, source_size=st.st_size)
+    with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    return publish_dir(tmp_dir, snapshot_dir)
+
+
+def read_snapshot(snapshot_dir: PathLike, mmap: bool = True) -> Tuple[pd.DataFrame, DelayCube]:
+    snapshot_dir = Path(snapshot_dir)
+    meta = _read_meta(snapshot_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No usable dataset snapshot at {snapshot_dir}")
+    mode = "r" if mmap else None
+
+    data = {}
+    for col, kind in meta["columns"].items():
+        if kind == "category":
+            codes = np.load(snapshot_dir / "columns" / f"{col}.codes.npy", mmap_mode=mode)
+            cats = np.load(snapshot_dir / "columns" / f"{col}.categories.npy")
+            data[col] = pd.Categorical.from_codes(codes, categories=cats).astype(object)
+        else:
+            data[col] = np.load(snapshot_dir / "columns" / f"{col}.npy", mmap_mode=mode)
+    df = pd.DataFrame(data, columns=list(meta["columns"]))
+    return df, read_delay_cube(snapshot_dir, mmap=mmap)
+
+
+def read_delay_cube(snapshot_dir: PathLike, mmap: bool = True) -> DelayCube:
+    """Only the delay aggregates of a snapshot (all arrays mapped, nothing copied)."""
+    snapshot_dir = Path(snapshot_dir)
+    if _read_meta(snapshot_dir) is None:
+        raise FileNotFoundError(f"No usable dataset snapshot at {snapshot_dir}")
+    arrays = {
+        p.stem: np.load(p, mmap_mode="r" if mmap else None)
+        for p in (snapshot_dir / "delays").glob("*.npy")
+    }
+    return DelayCube.from_arrays(arrays)
+
+
+def snapshot_created_at(snapshot_dir: PathLike) -> Optional[float]:
+    meta = _read_meta(Path(snapshot_dir))
+    return meta.get("created_at") if meta else None
+
+
+def dataset_identity(csv_path: Optional[PathLike], snapshot_dir: PathLike) -> Optional[str]:
+    """
+    "<size>:<mtime_ns>" of the source CSV (or of the one the snapshot was built from).
+    Unlike `snapshot_created_at` it survives regenerating the snapshot from an unchanged CSV.
+    """
+    if csv_path is not None and os.path.exists(csv_path):
+        st = os.stat(csv_path)
+        return f"{st.st_size}:{st.st_mtime_ns}"
+    meta = _read_meta(Path(snapshot_dir))
+    if meta is None:
+        return None
+    if "source_size" in meta:
+        return f"{meta['source_size']}:{meta['source_mtime_ns']}"
+    return str(meta.get("created_at"))
+
+
+def load_dataset(
+    csv_path: PathLike,
+    snapshot_dir: Optional[PathLike] = None,
+    write: bool = True,
+) -> Tuple[pd.DataFrame, DelayCube]:
+    """
+    Load the serving dataset, preferring a fresh snapshot.
+    Falls back to the CSV when there is no snapshot or the CSV is newer, and then
+    (re)writes the snapshot unless `write` is False.
+    """
+    snapshot_dir = Path(snapshot_dir) if snapshot_dir else default_snapshot_dir(csv_path)
+    if snapshot_is_fresh(snapshot_dir, csv_path):
+        t0 = time.perf_counter()
+        df, delays = read_snapshot(snapshot_dir)
+        logger.info("Loaded dataset snapshot %s (%d rows) in %.2fs", snapshot_dir, len(df), time.perf_counter() - t0)
+        return df, delays
+
+    t0 = time.perf_counter()
+    df = load_clean_csv(csv_path)
+    delays = DelayCube.from_frame(df)
+    logger.info("Loaded dataset CSV %s (%d rows) in %.2fs", csv_path, len(df), time.perf_counter() - t0)
+    if write:
+        try:
+            write_snapshot(df, delays, snapshot_dir, source_path=csv_path)
+            logger.info("Wrote dataset snapshot %s", snapshot_dir)
+        except OSError as e:
+            logger.warning("Could not write dataset snapshot %s: %s", snapshot_dir, e)
+    return df, delays
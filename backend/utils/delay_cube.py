@@ -0,0 +1,160 @@
+# backend/utils/delay_cube.py
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+N_DOW = 7
+N_HOUR = 24
+
+
+class DelayCube:
+    """
+    Dense historical mean delay store.
+
+    Every distinct (route_id, route_short_name, stop_id) gets a slot; `cube[slot, dow, hour]`
+    is a float32 mean delay in minutes. Empty cells are filled at build time with the
+    stop mean, then the route mean, then the overall mean, so lookups never branch.
+    """
+
+    def __init__(
+        self,
+        cube: np.ndarray,
+        stop_mean: np.ndarray,
+        slot_route: np.ndarray,
+        slot_stop: np.ndarray,
+        route_mean: np.ndarray,
+        route_ids: np.ndarray,
+        route_short_names: np.ndarray,
+        overall_mean: float,
+    ):
+        self.cube = cube                # (n_slots, 7, 24) float32
+        self.stop_mean = stop_mean      # (n_slots,) float32, already filled with fallbacks
+        self.slot_route = slot_route    # (n_slots,) int32 route code of each slot
+        self.slot_stop = slot_stop      # (n_slots,) int64 stop_id of each slot
+        self.route_mean = route_mean    # (n_routes,) float32, already filled with overall mean
+        self.route_ids = route_ids      # (n_routes,) str, route_id of each route code
+        self.route_short_names = route_short_names  # (n_routes,) str
+        self.overall_mean = float(overall_mean)
+
+        # key tables for translating ids into codes
+        self.route_codes: Dict[Tuple[str, str], int] = {
+            (str(rid), str(rsn)): i for i, (rid, rsn) in enumerate(zip(route_ids.tolist(), route_short_names.tolist()))
+        }
+        self._stop_slots: Optional[List[Dict[int, int]]] = None
+
+    @property
+    def stop_slots(self) -> List[Dict[int, int]]:
+        # stop_id -> slot per route; built on first use (prebuilt route tables never need it)
+        if self._stop_slots is None:
+            stop_slots: List[Dict[int, int]] = [dict() for _ in range(len(self.route_ids))]
+            for s, (r, sid) in enumerate(zip(self.slot_route.tolist(), self.slot_stop.tolist())):
+                stop_slots[r][sid] = s
+            self._stop_slots = stop_slots
+        return self._stop_slots
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "DelayCube":
+        """Aggregate `delay_minutes` by route/stop/day_of_week/hour_of_day in one vectorized pass."""
+        delay = pd.to_numeric(df["delay_minutes"], errors="coerce").to_numpy(dtype=np.float64)
+        valid = ~np.isnan(delay)
+        overall = float(delay[valid].mean()) if valid.any() else 0.0
+
+        route_grp = df.groupby(["route_id", "route_short_name"], sort=True)
+        route_code = route_grp.ngroup().to_numpy(dtype=np.int64)
+        n_routes = route_grp.ngroups
+
+        slot_grp = df.groupby(["route_id", "route_short_name", "stop_id"], sort=True)
+        slot = slot_grp.ngroup().to_numpy(dtype=np.int64)
+        n_slots = slot_grp.ngroups
+
+        w = np.where(valid, delay, 0.0)
+        c = valid.astype(np.float64)
+
+        route_sum = np.bincount(route_code, weights=w, minlength=n_routes)
+        route_cnt = np.bincount(route_code, weights=c, minlength=n_routes)
+        route_mean = np.full(n_routes, overall, dtype=np.float64)
+        np.divide(route_sum, route_cnt, out=route_mean, where=route_cnt > 0)
+
+        slot_route = np.zeros(n_slots, dtype=np.int64)
+        slot_route[slot] = route_code
+        slot_sum = np.bincount(slot, weights=w, minlength=n_slots)
+        slot_cnt = np.bincount(slot, weights=c, minlength=n_slots)
+        stop_mean = route_mean[slot_route].copy()
+        np.divide(slot_sum, slot_cnt, out=stop_mean, where=slot_cnt > 0)
+
+        # exact (slot, dow, hour) cells; rows with out-of-range dow/hour only feed the fallbacks
+        dow = pd.to_numeric(df["day_of_week"], errors="coerce").to_numpy(dtype=np.float64)
+        hour = pd.to_numeric(df["hour_of_day"], errors="coerce").to_numpy(dtype=np.float64)
+        in_range = valid & (dow >= 0) & (dow < N_DOW) & (hour >= 0) & (hour < N_HOUR)
+        cell = (slot[in_range] * N_DOW + dow[in_range].astype(np.int64)) * N_HOUR + hour[in_range].astype(np.int64)
+        size = n_slots * N_DOW * N_HOUR
+        cell_sum = np.bincount(cell, weights=delay[in_range], minlength=size)
+        cell_cnt = np.bincount(cell, minlength=size)
+        cube = np.repeat(stop_mean, N_DOW * N_HOUR)
+        np.divide(cell_sum, cell_cnt, out=cube, where=cell_cnt > 0)
+
+        route_keys = route_grp.size().index
+        slot_keys = slot_grp.size().index
+        return cls(
+            cube=cube.astype(np.float32).reshape(n_slots, N_DOW, N_HOUR),
+            stop_mean=stop_mean.astype(np.float32),
+            slot_route=slot_route.astype(np.int32),
+            slot_stop=np.asarray(slot_keys.get_level_values(2), dtype=np.int64),
+            route_mean=route_mean.astype(np.float32),
+            route_ids=np.asarray(route_keys.get_level_values(0).astype(str), dtype=str),
+            route_short_names=np.asarray(route_keys.get_level_values(1).astype(str), dtype=str),
+            overall_mean=overall,
+        )
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Plain arrays for persisting; inverse of `from_arrays`."""
+        return {
+            "cube": self.cube,
+            "stop_mean": self.stop_mean,
+            "slot_route": self.slot_route,
+            "slot_stop": self.slot_stop,
+            "route_mean": self.route_mean,
+            "route_ids": self.route_ids,
+            "route_short_names": self.route_short_names,
+            "overall_mean": np.asarray([self.overall_mean], dtype=np.float64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "DelayCube":
+        return cls(
+            cube=arrays["cube"],
+            stop_mean=arrays["stop_mean"],
+            slot_route=arrays["slot_route"],
+            slot_stop=arrays["slot_stop"],
+            route_mean=arrays["route_mean"],
+            route_ids=arrays["route_ids"],
+            route_short_names=arrays["route_short_names"],
+            overall_mean=float(arrays["overall_mean"][0]),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in self.to_arrays().values()))
+
+    def route_code(self, route_id: str, route_short_name: str) -> Optional[int]:
+        return self.route_codes.get((str(route_id), str(route_short_name)))
+
+    def slots_for(self, route_code: Optional[int], stop_ids: Iterable[int]) -> np.ndarray:
+        """Map stop ids to slots of the given route; unknown stops get -1."""
+        slots = self.stop_slots[route_code] if route_code is not None else {}
+        return np.fromiter((slots.get(int(sid), -1) for sid in stop_ids), dtype=np.int64)
+
+    def lookup(self, route_code: Optional[int], slots: np.ndarray, dow: int, hour: int) -> np.ndarray:
+        """Mean delay for many slots of one route at a (dow, hour), with fallbacks for unknown slots."""
+        slots = np.asarray(slots, dtype=np.int64)
+        fallback = self.route_mean[route_code] if route_code is not None else self.overall_mean
+        out = np.full(len(slots), fallback, dtype=np.float32)
+        known = slots >= 0
+        if 0 <= dow < N_DOW and 0 <= hour < N_HOUR:
+            out[known] = self.cube[slots[known], dow, hour]
+        else:
+            out[known] = self.stop_mean[slots[known]]
+        return out
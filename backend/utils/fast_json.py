@@ -0,0 +1,78 @@
+# backend/utils/fast_json.py
+"""
+Pre-serialized JSON responses for hot endpoints: orjson when installed (falls back to
+the stdlib encoder), a content ETag so repeated identical requests get a bodiless 304,
+and gzip when the client accepts it and the body is worth compressing. The gzip
+representation has its own ETag (`-gz` suffix), as the bytes differ.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import math
+from typing import Any, Dict, Optional
+
+import numpy as np
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib fallback below gives the same output, slower
+    orjson = None
+
+GZIP_MIN_BYTES = 1024
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite(obj: Any) -> Any:
+    # NaN/inf -> None, as orjson does; json.dumps would write bare NaN (invalid JSON)
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if isinstance(obj, (np.generic, np.ndarray)):
+        return _finite(_default(obj))
+    return obj
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        text = json.dumps(obj, separators=(",", ":"), default=_default, allow_nan=False)
+    except ValueError:
+        # only payloads with a non-finite float pay for the copy
+        text = json.dumps(_finite(obj), separators=(",", ":"), default=_default, allow_nan=False)
+    return text.encode("utf-8")
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+
+def fast_json_response(request: Request, payload: Any, status_code: int = 200,
+                       headers: Optional[Dict[str, str]] = None) -> Response:
+    body = dumps(payload)
+    compress = len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", "")
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + ("-gz" if compress else "") + '"'
+    headers = {**(headers or {}), "ETag": etag, "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if compress:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
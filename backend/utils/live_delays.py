@@ -0,0 +1,179 @@
+# backend/utils/live_delays.py
+"""
+Running delay aggregates from observed arrivals, on top of the historical DelayCube.
+
+State is one cell per DelayCube (slot, day_of_week, hour_of_day): a weighted sum and
+weight of observed delays plus the time the cell was last updated. With a half-life,
+both decay exponentially, so recent observations dominate. An update only touches the
+cells in its batch. `blend` reads a cell under the in-process lock, so it never pairs a
+new sum with an old weight written by this process; updates from other processes are
+not excluded (that would be a file lock per lookup), and such a torn read can be off by
+one batch in one cell until the next lookup. Cached ETAs are keyed on `route_version`,
+which is bumped after the cells are written, so a torn result is not kept.
+
+The arrays live in a writable memory-mapped directory, so every process serving the
+same dataset (uvicorn workers, executor processes) reads the same values, and the state
+survives a restart. `flush()` writes dirty pages back (the periodic snapshot).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .array_store import file_lock
+
+logger = logging.getLogger(__name__)
+
+N_DOW, N_HOUR = 7, 24
+LIVE_VERSION = 1
+
+
+class LiveDelays:
+    def __init__(self, state_dir, n_slots: int, n_routes: int, dataset_id: Any = None,
+                 half_life_s: float = 0.0, prior_weight: float = 5.0):
+        self.state_dir = Path(state_dir)
+        self.n_slots = int(n_slots)
+        self.n_routes = int(n_routes)
+        self.dataset_id = dataset_id
+        self.half_life_s = float(half_life_s)
+        self.prior_weight = float(prior_weight)
+        self._lock = threading.Lock()
+        self._lock_path = self.state_dir / ".lock"
+        self.applied = 0  # observations folded in by this process
+        self.flushed_at: Optional[float] = None
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(self._lock_path):
+            if not self._matches():
+                self._create()
+            self._open()
+
+    # ----- files -----
+    def _matches(self) -> bool:
+        # slots are DelayCube slots, so the state is only valid for the dataset it was built on
+        try:
+            with open(self.state_dir / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return (meta.get("version") == LIVE_VERSION and meta.get("dataset_id") == self.dataset_id
+                and meta.get("n_slots") == self.n_slots and meta.get("n_routes") == self.n_routes)
+
+    def _create(self) -> None:
+        shape = (self.n_slots, N_DOW, N_HOUR)
+        for name, dtype, shp in (("sum", np.float32, shape), ("weight", np.float32, shape),
+                                 ("stamp", np.float64, shape), ("route_version", np.int64, (self.n_routes,))):
+            arr = np.lib.format.open_memmap(self.state_dir / f"{name}.npy", mode="w+", dtype=dtype, shape=shp)
+            arr.flush()
+            del arr
+        self._write_meta()
+        logger.info("Created live delay state at %s (%d slots)", self.state_dir, self.n_slots)
+
+    def _open(self) -> None:
+        load = lambda name: np.load(self.state_dir / f"{name}.npy", mmap_mode="r+")  # noqa: E731
+        self.sum, self.weight, self.stamp = load("sum"), load("weight"), load("stamp")
+        self.route_version = load("route_version")
+        # flat views for scatter updates
+        self._sum, self._weight, self._stamp = (a.reshape(-1) for a in (self.sum, self.weight, self.stamp))
+
+    def _write_meta(self) -> None:
+        meta = {"version": LIVE_VERSION, "dataset_id": self.dataset_id, "n_slots": self.n_slots,
+                "n_routes": self.n_routes, "flushed_at": time.time()}
+        tmp = self.state_dir / f"meta.json.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, self.state_dir / "meta.json")
+
+    def _decay(self, age_s: np.ndarray) -> np.ndarray:
+        if self.half_life_s <= 0:
+            return np.ones_like(age_s)
+        return np.exp2(-np.maximum(age_s, 0.0) / self.half_life_s)
+
+    # ----- writes -----
+    def update(self, route_codes: np.ndarray, slots: np.ndarray, dow: np.ndarray, hour: np.ndarray,
+               delays: np.ndarray, observed_at: Optional[np.ndarray] = None, now: Optional[float] = None) -> int:
+        """
+        Fold one batch of observations in; O(batch). Rows with slot < 0 are skipped.
+        `observed_at` (epoch seconds, default now) ages each observation, so a backfilled one
+        counts as old: a cell's stamp is its newest observation, older ones are added decayed.
+        """
+        now = time.time() if now is None else float(now)
+        keep = (slots >= 0) & np.isfinite(delays)
+        if not keep.any():
+            return 0
+        cells = (slots[keep] * N_DOW + dow[keep]) * N_HOUR + hour[keep]
+        t = np.full(len(cells), now) if observed_at is None else \
+            np.minimum(np.asarray(observed_at, dtype=np.float64)[keep], now)  # no stamps in the future
+        touched, where = np.unique(cells, return_inverse=True)
+        # file lock first: readers in this process only wait for our own writes
+        with file_lock(self._lock_path), self._lock:
+            old = self._stamp[touched]
+            stamp = old.copy()
+            np.maximum.at(stamp, where, t)
+            f = self._decay(stamp - old).astype(np.float32)
+            self._sum[touched] *= f
+            self._weight[touched] *= f
+            w = self._decay(stamp[where] - t).astype(np.float32)
+            np.add.at(self._sum, cells, delays[keep].astype(np.float32) * w)
+            np.add.at(self._weight, cells, w)
+            self._stamp[touched] = stamp
+            # bumps the version of every touched route so cached ETAs for it are not reused
+            np.add.at(self.route_version, np.unique(route_codes[keep]), 1)
+        n = int(keep.sum())
+        self.applied += n
+        return n
+
+    def flush(self) -> None:
+        with self._lock:
+            for arr in (self.sum, self.weight, self.stamp, self.route_version):
+                arr.flush()
+            self._write_meta()
+            self.flushed_at = time.time()
+
+    # ----- reads -----
+    def version(self, route_code: Optional[int]) -> int:
+        return int(self.route_version[route_code]) if route_code is not None and route_code >= 0 else 0
+
+    def blend(self, historical: np.ndarray, slots: np.ndarray, dow: int, hour: int,
+              now: Optional[float] = None) -> np.ndarray:
+        """
+        Historical means pulled towards the observed ones: (k * hist + w * live) / (k + w),
+        where w is the (decayed) observation weight of each cell and k the prior weight.
+        """
+        out = np.asarray(historical, dtype=np.float64).copy()
+        known = slots >= 0
+        if not known.any():
+            return out
+        s = slots[known]
+        with self._lock:
+            w = self.weight[s, dow, hour].astype(np.float64)
+            total = self.sum[s, dow, hour].astype(np.float64)
+            stamp = self.stamp[s, dow, hour]
+        seen = w > 0
+        if not seen.any():
+            return out
+        now = time.time() if now is None else float(now)
+        live_mean = np.divide(total, w, out=np.zeros_like(w), where=seen)
+        w_eff = w * self._decay(now - stamp)
+        hist = out[known]
+        denom = self.prior_weight + w_eff
+        out[known] = np.where(seen & (denom > 0),
+                              (self.prior_weight * hist + w_eff * live_mean) / np.where(denom > 0, denom, 1.0),
+                              hist)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state_dir": str(self.state_dir),
+            "applied": self.applied,
+            "flushed_at": self.flushed_at,
+            "half_life_s": self.half_life_s,
+            "prior_weight": self.prior_weight,
+        }
@@ -0,0 +1,240 @@
+# backend/utils/metrics.py
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters and histograms are plain thread-safe objects in a module-level registry; values
+that already live elsewhere (cache stats, model status) are read by collectors at scrape
+time. `stage("name")` times one step of a request: it feeds the
+`routeminds_stage_seconds` histogram and, while a request is active (see
+MetricsMiddleware), the per-request timings used for the Server-Timing header.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# seconds; request latencies are mostly sub-second, dataset loads are not
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                    for k, v in items)
+    return "{" + body + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(labels), 0.0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        lines += [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_labels(labels))
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        for key, counts, total, n in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', _fmt_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return lines
+
+
+# collectors yield (name, type, help, [(labels, value), ...]) read at scrape time
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue
+            for name, kind, help, values in samples:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_fmt_labels(_labels(lbl))} {_fmt_value(v)}" for lbl, v in values]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "routeminds_stage_seconds", "Time spent in one stage of request handling",
+)
+
+# per-request stage timings: [(stage, seconds)], set by MetricsMiddleware
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("routeminds_timings", default=None)
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def stage(name: str, service: str = "") -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, service=service, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((f"{service}.{name}" if service else name, elapsed))
+
+
+def record_timings(timings: List[Tuple[str, float]]) -> None:
+    """Add timings measured elsewhere (a worker thread/process) to the current request."""
+    current = _request_timings.get()
+    if current is not None and current is not timings:
+        current.extend(timings)
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total_s: float) -> str:
+    # Server-Timing: name;dur=<ms>; repeated stages (batch requests) are summed
+    merged: Dict[str, float] = {}
+    for name, s in timings:
+        merged[name] = merged.get(name, 0.0) + s
+    parts = [f"{name.replace('.', '_')};dur={s * 1000:.3f}" for name, s in merged.items()]
+    parts.append(f"total;dur={total_s * 1000:.3f}")
+    return ", ".join(parts)
+
+
+REQUEST_SECONDS = metrics.histogram(
+    "routeminds_http_request_duration_seconds", "HTTP request latency by route template",
+)
+REQUESTS_TOTAL = metrics.counter("routeminds_http_requests_total", "HTTP requests by route template and status")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: per-endpoint latency histogram + request counter, labelled with
+    the matched route template (not the raw path, to keep label cardinality bounded).
+    With `server_timing`, stage timings recorded during the request are sent as a
+    Server-Timing header (the remainder of `total` is validation/serialization).
+    """
+
+    def __init__(self, app, server_timing: bool = False, exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.server_timing = server_timing
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        timings = start_request_timings()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    header = server_timing_header(timings, time.perf_counter() - t0)
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = getattr(scope.get("route"), "path", None)
+            if path is None:
+                path = "unmatched"
+            elif "{" not in path:
+                # no path params: the request path is the full template (router prefix included)
+                path = scope.get("path", path)
+            elapsed = time.perf_counter() - t0
+            REQUEST_SECONDS.observe(elapsed, method=scope.get("method", ""), route=path)
+            REQUESTS_TOTAL.inc(method=scope.get("method", ""), route=path, status=str(status_code))
@@ -1,36 +1,210 @@
+# backend/utils/preprocessing.py
+"""
+The model's feature pipeline, shared by training (models/training.py, the notebook) and
+every serving path (PredictionModel, the delay table build).
+
+Columns are [route_encoded, stop_sequence, day_of_week, hour_of_day, holiday_flag,
+stop_lat, stop_lon] followed by any derived features the model was trained with
+(e.g. is_peak_hour). Derived features are recorded in the model's metadata
+`feature_columns`, so serving rebuilds exactly the matrix the model saw.
+
+Everything works on whole columns: a DataFrame, a dict of arrays (scalars broadcast),
+or the legacy (n, 6) input matrix. Routes are encoded through a hash table over the
+encoder classes instead of LabelEncoder.transform per row.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Sequence, Tuple, Union
+
 import numpy as np
 import pandas as pd
-import joblib
-from ..config import ENCODER_PATH
 
-try:
-    route_encoder = joblib.load(ENCODER_PATH)
-except Exception:
-    route_encoder = None
+BASE_COLUMNS = ["route_encoded", "stop_sequence", "day_of_week", "hour_of_day", "holiday_flag", "stop_lat", "stop_lon"]
+INPUT_COLUMNS = BASE_COLUMNS[1:]  # everything the caller provides besides the route
+FEATURE_NAMES = {
+    "route_encoded": "Route", "stop_sequence": "Stop Sequence", "day_of_week": "Day of Week",
+    "hour_of_day": "Hour of Day", "holiday_flag": "Holiday Flag", "stop_lat": "Latitude", "stop_lon": "Longitude",
+    "is_peak_hour": "Peak Hour",
+}
+
+
+def is_peak_hour(hour):
+    """1 during the morning (7-10) and evening (17-20) peaks; works on scalars and arrays."""
+    h = np.asarray(hour)
+    peak = ((h >= 7) & (h <= 10)) | ((h >= 17) & (h <= 20))
+    return peak.astype(np.int8) if peak.ndim else int(peak)
+
+
+# derived feature -> (input columns it reads, vectorized function)
+DERIVED_FEATURES: Dict[str, Tuple[Tuple[str, ...], Callable[..., Any]]] = {
+    "is_peak_hour": (("hour_of_day",), is_peak_hour),
+}
+
+
+def _key_text(col: pd.Series) -> pd.Series:
+    # a CSV read without dtype=str gives numeric short names as floats when the column has
+    # blanks (142 -> 142.0); keys are the text the route index and serving use ("142")
+    text = col.astype("string")
+    if pd.api.types.is_float_dtype(col):
+        whole = col.notna() & (col % 1 == 0)
+        text = text.mask(whole, col[whole].astype(np.int64).astype("string"))
+    return text
+
+
+def route_keys(df: pd.DataFrame) -> pd.Series:
+    # same key the route index uses: short name, route_id when a row has none
+    name = _key_text(df["route_short_name"])
+    if "route_id" in df:
+        name = name.fillna(_key_text(df["route_id"]))
+    return name.fillna("nan").astype(str)
+
+
+class RouteEncoder:
+    """Route key <-> code with the codes of the fitted LabelEncoder (code = position in classes)."""
+
+    def __init__(self, classes: Iterable[Any]):
+        self.classes = np.asarray([str(c) for c in classes])
+        self.codes: Dict[str, int] = {c: i for i, c in enumerate(self.classes.tolist())}
+        self._index = pd.Index(self.classes)
+
+    @classmethod
+    def from_label_encoder(cls, encoder) -> "RouteEncoder":
+        return cls(encoder.classes_)
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def __contains__(self, route) -> bool:
+        return str(route) in self.codes
+
+    def code(self, route) -> int:
+        code = self.codes.get(str(route))
+        if code is None:
+            raise ValueError(f"Route ID '{route}' not found in encoder classes.")
+        return code
+
+    def encode(self, routes, unknown: Optional[int] = None) -> np.ndarray:
+        """Codes for many routes at once; unknown routes raise, or get `unknown` if given."""
+        codes = self._index.get_indexer(pd.Index(np.asarray(routes).astype(str)))
+        missing = codes < 0
+        if missing.any():
+            if unknown is None:
+                raise ValueError(f"Route ID '{np.asarray(routes)[missing][0]}' not found in encoder classes.")
+            codes[missing] = unknown
+        return codes.astype(np.int64)
+
+
+class FeaturePipeline:
+    def __init__(self, routes: Optional[RouteEncoder] = None, derived: Sequence[str] = ()):
+        unknown = [d for d in derived if d not in DERIVED_FEATURES]
+        if unknown:
+            raise ValueError(f"Unknown derived features: {unknown} (known: {sorted(DERIVED_FEATURES)})")
+        self.routes = routes
+        self.derived = list(derived)
+        self.columns = BASE_COLUMNS + self.derived
+
+    @classmethod
+    def for_columns(cls, routes: Optional[RouteEncoder], feature_columns: Optional[Sequence[str]]) -> "FeaturePipeline":
+        """The pipeline for a model trained on `feature_columns` (its metadata); None = the base columns."""
+        columns = list(feature_columns or BASE_COLUMNS)
+        if columns[:len(BASE_COLUMNS)] != BASE_COLUMNS:
+            raise ValueError(f"Unsupported feature columns {columns}; expected {BASE_COLUMNS} first")
+        return cls(routes, columns[len(BASE_COLUMNS):])
+
+    @property
+    def n_features(self) -> int:
+        return len(self.columns)
+
+    @property
+    def feature_names(self) -> list:
+        return [FEATURE_NAMES.get(c, c) for c in self.columns]
+
+    def matrix(self, route_codes, stop_sequence, day_of_week, hour_of_day, holiday_flag, stop_lat, stop_lon,
+               dtype=np.float64) -> np.ndarray:
+        """Assemble the feature matrix from already-encoded routes and input columns (scalars broadcast)."""
+        inputs = dict(zip(INPUT_COLUMNS, (stop_sequence, day_of_week, hour_of_day, holiday_flag, stop_lat, stop_lon)))
+        values = np.broadcast_arrays(np.asarray(route_codes), *(np.asarray(v) for v in inputs.values()))
+        n = len(values[0]) if values[0].ndim else 1
+        X = np.empty((n, self.n_features), dtype=dtype)
+        for j, v in enumerate(values):
+            X[:, j] = v
+        for j, name in enumerate(self.derived, start=len(BASE_COLUMNS)):
+            args, fn = DERIVED_FEATURES[name]
+            X[:, j] = fn(*(X[:, BASE_COLUMNS.index(a)] for a in args))
+        return X
+
+    def from_inputs(self, route_codes, inputs: np.ndarray, dtype=np.float64) -> np.ndarray:
+        """Legacy layout: `inputs` is (n, 6) in INPUT_COLUMNS order, the routes are prepended."""
+        inputs = np.asarray(inputs, dtype=dtype)
+        if inputs.ndim == 1:
+            inputs = inputs.reshape(1, -1)
+        if inputs.shape[1] != len(INPUT_COLUMNS):
+            raise ValueError(f"Expected {len(INPUT_COLUMNS)} input columns {INPUT_COLUMNS}, got {inputs.shape[1]}")
+        return self.matrix(route_codes, *inputs.T, dtype=dtype)
+
+    def transform(self, data: Union[pd.DataFrame, Mapping[str, Any]], dtype=np.float64,
+                  unknown_route: Optional[int] = None) -> np.ndarray:
+        """
+        Feature matrix for a DataFrame or dict of columns. Routes come from `route_encoded`
+        if present, else from `route_short_name` (falling back to `route_id`) via the encoder.
+        """
+        if "route_encoded" in data:
+            codes = np.asarray(data["route_encoded"])
+        else:
+            if self.routes is None:
+                raise ValueError("Routes need encoding but the pipeline has no route encoder")
+            frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(
+                {k: np.atleast_1d(data[k]) for k in ("route_short_name", "route_id") if k in data})
+            codes = self.routes.encode(route_keys(frame).to_numpy(), unknown=unknown_route)
+        missing = [c for c in INPUT_COLUMNS if c not in data]
+        if missing:
+            raise ValueError(f"Missing feature columns: {missing}")
+        return self.matrix(codes, *(np.asarray(data[c]) for c in INPUT_COLUMNS), dtype=dtype)
+
+
+def _active_model():
+    # the model registry's active model; None if no model can be loaded
+    from ..models.registry import model_registry
+
+    try:
+        return model_registry.active_model()
+    except Exception:
+        return None
+
+
+def get_route_encoder():
+    # the serving model's own encoder, not a second copy loaded from disk
+    model = _active_model()
+    return model.encoder if model is not None else None
+
+
+def get_feature_pipeline() -> FeaturePipeline:
+    model = _active_model()
+    return model.features if model is not None else FeaturePipeline()
+
 
 def encode_route(route_short_name: str):
-    if route_encoder is None:
+    pipeline = get_feature_pipeline()
+    if pipeline.routes is None:
         try:
             return int(route_short_name)
         except Exception:
             return 0
+    return pipeline.routes.code(route_short_name)
 
-    return int(route_encoder.transform([str(route_short_name)])[0])
 
 def build_feature_vector(req_dict: dict):
     """
     Input: dict with keys matching DelayRequest fields.
-    Output: 1D numpy array shaped like training features order.
-    Training features used:
-      ['route_encoded', 'stop_sequence', 'day_of_week', 'hour_of_day', 'holiday_flag', 'stop_lat', 'stop_lon']
+    Output: (1, n_features) array in training feature order (see FeaturePipeline).
     """
-    route_enc = encode_route(req_dict.get("route_short_name", ""))
-    stop_seq = int(req_dict.get("stop_sequence", 0))
-    day = int(req_dict.get("day_of_week", 0))
-    hour = int(req_dict.get("hour_of_day", 0))
-    holiday = int(req_dict.get("holiday_flag", 0))
-    lat = float(req_dict.get("stop_lat", 0.0))
-    lon = float(req_dict.get("stop_lon", 0.0))
-
-    arr = np.array([route_enc, stop_seq, day, hour, holiday, lat, lon], dtype=float)
-    return arr.reshape(1, -1)
+    pipeline = get_feature_pipeline()
+    return pipeline.matrix(
+        encode_route(req_dict.get("route_short_name", "")),
+        int(req_dict.get("stop_sequence", 0)),
+        int(req_dict.get("day_of_week", 0)),
+        int(req_dict.get("hour_of_day", 0)),
+        int(req_dict.get("holiday_flag", 0)),
+        float(req_dict.get("stop_lat", 0.0)),
+        float(req_dict.get("stop_lon", 0.0)),
+    )
@@ -0,0 +1,248 @@
+# backend/utils/route_geometry.py
+"""
+Road-following geometry between consecutive stops, built offline and served from a cache.
+
+Geometry is stored per stop pair (from_stop_id, to_stop_id), not per route, so routes
+sharing a street segment share its points and any stop sequence (ETA route tables or
+the route index) can be drawn. Points are fixed-point 1e-5 degrees (the encoded
+polyline precision) in flat int32 arrays with offsets, opened with mmap.
+
+Routers turn two stop coordinates into a path:
+- StraightLineRouter: the stand-in, a straight segment between the stops.
+- GraphRouter: shortest path over a local road graph (.npz with node_lat, node_lon,
+  edge_u, edge_v and optional edge_length_m, e.g. exported from OpenStreetMap).
+Pairs missing from the store are drawn as straight lines at request time.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .array_store import load_arrays, save_arrays
+from .columnar import encode_polyline
+from .response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+SCALE = 1e5
+SOURCE_STRAIGHT, SOURCE_GRAPH = 0, 1
+_KEY_BITS = 31  # stop ids above 2**31 cannot be packed into a pair key
+
+
+def _haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    # element-wise, in metres
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    x = np.sin((phi2 - phi1) / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lon2 - lon1) / 2.0) ** 2
+    return 2 * 6371_000.0 * np.arcsin(np.sqrt(np.clip(x, 0.0, 1.0)))
+
+
+def _pair_key(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (np.asarray(a, dtype=np.int64) << _KEY_BITS) | np.asarray(b, dtype=np.int64)
+
+
+class StraightLineRouter:
+    name = "straight"
+
+    def paths(self, pairs: Sequence[Tuple[Tuple[float, float], Tuple[float, float]]]) -> List[Tuple[np.ndarray, int]]:
+        return [(np.asarray([a, b], dtype=np.float64), SOURCE_STRAIGHT) for a, b in pairs]
+
+
+class GraphRouter:
+    """Shortest paths on a local road graph; stops snap to their nearest graph node."""
+
+    name = "graph"
+
+    def __init__(self, graph_path, max_snap_m: float = 300.0, max_detour: float = 3.0, batch_size: int = 8):
+        from scipy.sparse import csr_matrix
+        from scipy.spatial import cKDTree
+
+        with np.load(graph_path) as g:
+            self.lat = g["node_lat"].astype(np.float64)
+            self.lon = g["node_lon"].astype(np.float64)
+            u, v = g["edge_u"].astype(np.int64), g["edge_v"].astype(np.int64)
+            length = g["edge_length_m"].astype(np.float64) if "edge_length_m" in g.files else None
+        if length is None:
+            length = _haversine_m(self.lat[u], self.lon[u], self.lat[v], self.lon[v])
+        n = len(self.lat)
+        # roads are treated as two-way; bus lanes on one-way streets are rare enough for ETA maps
+        self.graph = csr_matrix((np.concatenate([length, length]), (np.concatenate([u, v]), np.concatenate([v, u]))),
+                                shape=(n, n))
+        # equirectangular projection for nearest-node snapping
+        self._kx = np.cos(np.radians(self.lat.mean() if n else 0.0))
+        self._tree = cKDTree(np.column_stack([self.lon * self._kx, self.lat]))
+        self.max_snap_m = float(max_snap_m)
+        # a road path longer than max_detour x the straight leg is not searched (drawn straight)
+        self.max_detour = float(max_detour)
+        # sources per Dijkstra call: each returns (batch_size, n_nodes) distances + predecessors,
+        # ~12 bytes per node per source, so a city graph needs small batches
+        self.batch_size = max(1, int(batch_size))
+
+    def _snap(self, coords: np.ndarray) -> np.ndarray:
+        d, idx = self._tree.query(np.column_stack([coords[:, 1] * self._kx, coords[:, 0]]))
+        return np.where(d * 111_320.0 <= self.max_snap_m, idx, -1)
+
+    def paths(self, pairs):
+        from scipy.sparse.csgraph import dijkstra
+
+        if not pairs:
+            return []
+        a_xy = np.asarray([a for a, _ in pairs], dtype=np.float64)
+        b_xy = np.asarray([b for _, b in pairs], dtype=np.float64)
+        starts, ends = self._snap(a_xy), self._snap(b_xy)
+        # longest road path worth searching per pair (snapping can add up to max_snap_m per end)
+        reach = self.max_detour * _haversine_m(a_xy[:, 0], a_xy[:, 1], b_xy[:, 0], b_xy[:, 1]) + 2 * self.max_snap_m
+
+        nodes_of: List[Optional[List[int]]] = [None] * len(pairs)
+        routable = np.flatnonzero((starts >= 0) & (ends >= 0))
+        routable = routable[np.argsort(starts[routable], kind="stable")]  # pairs grouped by start node
+        sources, first = np.unique(starts[routable], return_index=True)
+        groups = np.split(routable, first[1:]) if len(sources) else []
+        for lo in range(0, len(sources), self.batch_size):
+            batch = sources[lo:lo + self.batch_size]
+            batch_groups = groups[lo:lo + self.batch_size]
+            limit = float(max(reach[g].max() for g in batch_groups))
+            # one search per distinct start node, shared by every pair leaving it, cut off at the longest leg
+            dist, pred = dijkstra(self.graph, directed=True, indices=batch, return_predecessors=True, limit=limit)
+            for row, (s, g) in enumerate(zip(batch.tolist(), batch_groups)):
+                for i in g.tolist():
+                    nodes_of[i] = self._walk(pred[row], s, int(ends[i]))
+            del dist, pred  # only one batch of rows is alive at a time
+
+        out = []
+        for (a, b), nodes in zip(pairs, nodes_of):
+            if nodes is None:
+                out.append((np.asarray([a, b], dtype=np.float64), SOURCE_STRAIGHT))
+                continue
+            pts = np.column_stack([self.lat[nodes], self.lon[nodes]])
+            out.append((np.vstack([[a], pts, [b]]), SOURCE_GRAPH))
+        return out
+
+    @staticmethod
+    def _walk(pred: Optional[np.ndarray], s: int, t: int) -> Optional[List[int]]:
+        if pred is None:
+            return None
+        nodes = [t]
+        while nodes[-1] != s:
+            p = int(pred[nodes[-1]])
+            if p < 0:
+                return None  # unreachable (or beyond the search limit)
+            nodes.append(p)
+        return nodes[::-1]
+
+
+def build_geometry(
+    sequences: Iterable[Tuple[Sequence[int], Sequence[float], Sequence[float]]],
+    router,
+    out_dir,
+    meta: Optional[dict] = None,
+) -> Path:
+    """Route every distinct consecutive stop pair of `sequences` (stop_ids, lats, lons) and save."""
+    t0 = time.perf_counter()
+    pairs: Dict[Tuple[int, int], Tuple[Tuple[float, float], Tuple[float, float]]] = {}
+    for ids, lats, lons in sequences:
+        for i in range(len(ids) - 1):
+            a, b = int(ids[i]), int(ids[i + 1])
+            if a == b or not (0 <= a < 2 ** _KEY_BITS and 0 <= b < 2 ** _KEY_BITS):
+                continue
+            pairs.setdefault((a, b), ((float(lats[i]), float(lons[i])), (float(lats[i + 1]), float(lons[i + 1]))))
+
+    keys = sorted(pairs)
+    paths = router.paths([pairs[k] for k in keys])
+    sizes = [len(p) for p, _ in paths]
+    points = np.vstack([p for p, _ in paths]) if paths else np.zeros((0, 2))
+    arrays = {
+        "pair_key": _pair_key([k[0] for k in keys], [k[1] for k in keys]) if keys else np.zeros(0, dtype=np.int64),
+        "offsets": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+        "lat_e5": np.round(points[:, 0] * SCALE).astype(np.int32),
+        "lon_e5": np.round(points[:, 1] * SCALE).astype(np.int32),
+        "source": np.asarray([src for _, src in paths], dtype=np.uint8),
+    }
+    n_graph = int((arrays["source"] == SOURCE_GRAPH).sum())
+    meta = {**(meta or {}), "router": router.name, "n_pairs": len(keys), "n_graph": n_graph,
+            "n_points": int(len(points)), "built_at": time.time(),
+            "build_seconds": round(time.perf_counter() - t0, 2)}
+    return save_arrays(out_dir, arrays, meta)
+
+
+class RouteGeometry:
+    """Mapped stop-pair geometry + an LRU of encoded polylines per stop sequence."""
+
+    def __init__(self, arrays: Optional[Dict[str, np.ndarray]] = None, meta: Optional[dict] = None,
+                 cache_size: int = 4096):
+        self.arrays = arrays
+        self.meta = meta or {}
+        # geometry never expires; the store is immutable once loaded
+        self.cache = ResponseCache(cache_size, float("inf"))
+
+    @classmethod
+    def load(cls, path, **kwargs) -> "RouteGeometry":
+        arrays, meta = load_arrays(path)
+        return cls(arrays, meta, **kwargs)
+
+    @property
+    def built(self) -> bool:
+        return self.arrays is not None
+
+    def _find(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        keys = self.arrays["pair_key"]
+        want = _pair_key(a, b)
+        if not len(keys):
+            return np.full(len(want), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(keys, want), len(keys) - 1)
+        return np.where(keys[pos] == want, pos, -1)
+
+    def path(self, stop_ids: Sequence[int], lats: Sequence[float], lons: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """(lats, lons) of the path through the stops, in order; unknown pairs are straight lines."""
+        ids = np.asarray(stop_ids, dtype=np.int64)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if len(ids) < 2 or not self.built:
+            return lats, lons
+        valid = (ids >= 0) & (ids < 2 ** _KEY_BITS)
+        packed = np.where(valid, ids, 0)
+        a, b = packed[:-1], packed[1:]
+        pair_ok = valid[:-1] & valid[1:]
+        fwd = np.where(pair_ok, self._find(a, b), -1)
+        rev = np.where(pair_ok, self._find(b, a), -1)
+        off = self.arrays["offsets"]
+        out_lat, out_lon = [lats[:1]], [lons[:1]]
+        for i, (f, r) in enumerate(zip(fwd.tolist(), rev.tolist())):
+            if f >= 0:
+                seg = slice(off[f], off[f + 1])
+                plat, plon = self.arrays["lat_e5"][seg] / SCALE, self.arrays["lon_e5"][seg] / SCALE
+            elif r >= 0:
+                seg = slice(off[r], off[r + 1])
+                plat, plon = self.arrays["lat_e5"][seg][::-1] / SCALE, self.arrays["lon_e5"][seg][::-1] / SCALE
+            else:
+                plat, plon = lats[i:i + 2], lons[i:i + 2]
+            # the first point of each segment repeats the previous segment's last one
+            out_lat.append(plat[1:])
+            out_lon.append(plon[1:])
+        return np.concatenate(out_lat), np.concatenate(out_lon)
+
+    def polyline(self, stop_ids: Sequence[int], lats: Sequence[float], lons: Sequence[float]) -> str:
+        key = np.asarray(stop_ids, dtype=np.int64).tobytes()
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = encode_polyline(*self.path(stop_ids, lats, lons))
+            self.cache.put(key, cached)
+        return cached
+
+
+@lru_cache(maxsize=2)
+def get_route_geometry(path=None) -> RouteGeometry:
+    """The geometry store at `path`, or an empty one (straight lines) if it was never built."""
+    if path:
+        try:
+            geometry = RouteGeometry.load(path)
+            logger.info("Route geometry %s: %d stop pairs (%s)", path,
+                        geometry.meta.get("n_pairs", 0), geometry.meta.get("router"))
+            return geometry
+        except FileNotFoundError:
+            logger.info("No route geometry at %s; drawing straight lines between stops", path)
+    return RouteGeometry()
@@ -2,7 +2,10 @@
 import json
 from pathlib import Path
 import math
+from collections.abc import Mapping
 from functools import lru_cache
+import numpy as np
+from .array_store import load_arrays, save_arrays
 
 BASE_DIR = Path(__file__).resolve().parents[1]  # backend/
 DEFAULT_INDEX_PATH = BASE_DIR / "data" / "route_stops_index.json"
@@ -19,12 +22,116 @@ def haversine_km(a, b):
     x = math.sin(dphi / 2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2.0) ** 2
     return 2 * R * math.asin(math.sqrt(x))
 
+def haversine_km_vec(lat, lon, lats, lons):
+    # one point (lat, lon) against arrays of lats/lons, in km
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons) - math.radians(lon)
+    x = np.sin(dphi / 2.0) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2.0) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(x, 0.0, 1.0)))
+
+# Columnar index (.npz, written by scripts/make_route_index.py): route keys + offsets
+# into flat per-stop arrays, so loading is a few array reads instead of JSON parsing.
+COLUMNAR_STOP_FIELDS = ("stop_id", "stop_name", "stop_sequence", "lat", "lon", "scheduled_arrival_time")
+
+def write_columnar_index(path, route_keys, offsets, stops, route_digest=None, meta=None):
+    # stops: dict of equal-length arrays keyed by COLUMNAR_STOP_FIELDS, grouped by route in key order.
+    # A path without the .npz suffix is written as a directory of .npy files that loads with mmap.
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {
+        "route_keys": np.asarray(route_keys, dtype=str),
+        "offsets": np.asarray(offsets, dtype=np.int64),
+        "route_digest": np.asarray(route_digest if route_digest is not None else np.zeros(len(route_keys)), dtype=np.uint64),
+        "meta": np.asarray(json.dumps(meta or {})),
+        "stop_id": np.asarray(stops["stop_id"], dtype=np.int64),
+        "stop_sequence": np.asarray(stops["stop_sequence"], dtype=np.int64),
+        "lat": np.asarray(stops["lat"], dtype=np.float64),
+        "lon": np.asarray(stops["lon"], dtype=np.float64),
+        "stop_name": np.asarray(stops["stop_name"], dtype=str),
+        "scheduled_arrival_time": np.asarray(stops["scheduled_arrival_time"], dtype=str),
+    }
+    if p.suffix != ".npz":
+        meta_json = arrays.pop("meta")
+        return save_arrays(p, arrays, {"index_meta": json.loads(str(meta_json))})
+    tmp = p.with_name(p.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    tmp.replace(p)
+    return p
+
+def read_columnar_index(path, mmap=True):
+    # raw arrays (incl. route_digest/meta) for incremental rebuilds
+    if Path(path).is_dir():
+        arrays, store_meta = load_arrays(path, mmap=mmap)
+        return {**arrays, "meta": store_meta.get("index_meta", {})}
+    with np.load(path, allow_pickle=False) as z:
+        arrays = {k: z[k] for k in z.files}
+    arrays["meta"] = json.loads(str(arrays["meta"]))
+    return arrays
+
+class ColumnarRouteIndex(Mapping):
+    """
+    Read-only {route: [stop dict, ...]} view over mapped columnar arrays.
+    A route's stop dicts are only built when it is first looked up, so processes
+    attached to the same index directory share the arrays and keep just the routes they serve.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.keys_list = arrays["route_keys"].tolist()
+        self.offsets = arrays["offsets"].tolist()
+        self._pos = {k: i for i, k in enumerate(self.keys_list)}
+        self._records = {}
+
+    def __getitem__(self, key):
+        records = self._records.get(key)
+        if records is None:
+            i = self._pos[key]  # KeyError for unknown routes, like a dict
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            cols = [self.arrays[f][lo:hi].tolist() for f in COLUMNAR_STOP_FIELDS]
+            records = self._records[key] = [
+                {"stop_id": sid, "stop_name": name, "stop_sequence": seq, "lat": lat, "lon": lon,
+                 "scheduled_arrival_time": sched or None}
+                for sid, name, seq, lat, lon, sched in zip(*cols)
+            ]
+        return records
+
+    def __iter__(self):
+        return iter(self.keys_list)
+
+    def __len__(self):
+        return len(self.keys_list)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def route_slice(self, key):
+        i = self._pos[key]
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+def _load_columnar(p):
+    a = read_columnar_index(p)
+    cols = [a[f].tolist() for f in COLUMNAR_STOP_FIELDS]
+    records = [
+        {"stop_id": sid, "stop_name": name, "stop_sequence": seq, "lat": lat, "lon": lon,
+         "scheduled_arrival_time": sched or None}
+        for sid, name, seq, lat, lon, sched in zip(*cols)
+    ]
+    off = a["offsets"].tolist()
+    return {key: records[off[i]:off[i + 1]] for i, key in enumerate(a["route_keys"].tolist())}
+
 @lru_cache(maxsize=1)
 def load_route_index(path=None):
     p = Path(path) if path else DEFAULT_INDEX_PATH
     if not p.exists():
         # return empty dict rather than error so editor/type checkers don't complain.
         raise FileNotFoundError(f"Route index file not found at {p}")
+    if p.is_dir():
+        return ColumnarRouteIndex(read_columnar_index(p))
+    if p.suffix == ".npz":
+        return _load_columnar(p)
     with open(p, "r", encoding="utf-8") as f:
         data = json.load(f)
     return data
@@ -38,17 +145,11 @@ def get_stops_for_route(route_short_name, index_path=None):
 def find_nearest_stop(coord, route_stops):
     if not route_stops:
         raise ValueError("route_stops empty")
-    best = None
-    best_d = float("inf")
-    for s in route_stops:
-        # expecting s has keys "lat","lon"
-        lat = float(s.get("lat") or s.get("stop_lat") or 0.0)
-        lon = float(s.get("lon") or s.get("stop_lon") or 0.0)
-        d = haversine_km(coord, (lat, lon))
-        if d < best_d:
-            best_d = d
-            best = s
-    return best
+    # expecting s has keys "lat","lon"
+    lats = np.fromiter((float(s.get("lat") or s.get("stop_lat") or 0.0) for s in route_stops), dtype=float)
+    lons = np.fromiter((float(s.get("lon") or s.get("stop_lon") or 0.0) for s in route_stops), dtype=float)
+    d = haversine_km_vec(coord[0], coord[1], lats, lons)
+    return route_stops[int(np.argmin(d))]
 
 def slice_stops_by_ids(route_stops, from_id, to_id):
     ids = [int(s["stop_id"]) for s in route_stops]
@@ -0,0 +1,218 @@
+# backend/utils/spatial_index.py
+from __future__ import annotations
+
+import math
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .route_index import ColumnarRouteIndex, load_route_index, haversine_km_vec
+
+EARTH_R_KM = 6371.0
+DEFAULT_CELL_KM = 0.5
+
+
+def _stop_lat_lon(s: dict) -> Tuple[float, float]:
+    return float(s.get("lat") or s.get("stop_lat") or 0.0), float(s.get("lon") or s.get("stop_lon") or 0.0)
+
+
+class StopSpatialIndex:
+    """
+    Uniform grid over equirectangular-projected stop coordinates.
+
+    - Network-wide stops are de-duplicated by stop_id and remember which routes serve them.
+    - Grid buckets narrow k-nearest / radius queries to a few cells; exact distances are
+      then computed with vectorized haversine.
+    - Per-route queries scan that route's own (small) coordinate arrays directly.
+    """
+
+    MAX_RING = 8
+
+    def __init__(self, route_index: Dict[str, list], cell_km: float = DEFAULT_CELL_KM):
+        self.cell_km = float(cell_km)
+        if isinstance(route_index, ColumnarRouteIndex):
+            self._init_columnar(route_index)
+        else:
+            self._init_records(route_index)
+
+        # projection + grid buckets
+        self.lat0 = float(self.lat.mean()) if len(self.lat) else 0.0
+        self._kx = EARTH_R_KM * math.cos(math.radians(self.lat0)) * math.pi / 180.0
+        self._ky = EARTH_R_KM * math.pi / 180.0
+        cx, cy = self._cell(self.lat, self.lon)
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+        if len(self.stop_id):
+            order = np.lexsort((cy, cx))
+            keys = np.stack([cx[order], cy[order]], axis=1)
+            bounds = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+            for chunk in np.split(order, bounds):
+                self.cells[(int(cx[chunk[0]]), int(cy[chunk[0]]))] = chunk
+
+    def _init_columnar(self, index: ColumnarRouteIndex) -> None:
+        # same layout as _init_records, built from the flat arrays; per-route coordinates
+        # are views of the (mapped) index columns
+        a = index.arrays
+        stop_ids = np.asarray(a["stop_id"], dtype=np.int64)
+        uniq, first, inverse = np.unique(stop_ids, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind="stable")  # network rows in first-seen order
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        rows = rank[inverse.ravel()]
+        first = first[order]
+
+        self.stop_id = uniq[order]
+        self.stop_name = a["stop_name"][first].tolist()
+        self.lat = np.asarray(a["lat"][first], dtype=np.float64)
+        self.lon = np.asarray(a["lon"][first], dtype=np.float64)
+        self.routes: List[List[str]] = [[] for _ in range(len(first))]
+        self.route_lat: Dict[str, np.ndarray] = {}
+        self.route_lon: Dict[str, np.ndarray] = {}
+        self.route_rows: Dict[str, np.ndarray] = {}
+        for route in index:
+            sl = index.route_slice(route)
+            self.route_lat[str(route)] = a["lat"][sl]
+            self.route_lon[str(route)] = a["lon"][sl]
+            self.route_rows[str(route)] = rows[sl]
+            for pos in dict.fromkeys(rows[sl].tolist()):
+                self.routes[pos].append(str(route))
+
+    def _init_records(self, route_index: Dict[str, list]) -> None:
+        pos_by_stop: Dict[int, int] = {}
+        stop_ids: List[int] = []
+        names: List[Optional[str]] = []
+        lats: List[float] = []
+        lons: List[float] = []
+        routes: List[List[str]] = []
+        # per-route coordinates, aligned with the route's own stop list
+        self.route_lat: Dict[str, np.ndarray] = {}
+        self.route_lon: Dict[str, np.ndarray] = {}
+        self.route_rows: Dict[str, np.ndarray] = {}  # network row of each route stop (-1 if unusable)
+
+        for route, stops in route_index.items():
+            r_lat, r_lon, r_rows = [], [], []
+            for s in stops:
+                lat, lon = _stop_lat_lon(s) if isinstance(s, dict) else (0.0, 0.0)
+                r_lat.append(lat)
+                r_lon.append(lon)
+                if not isinstance(s, dict) or s.get("stop_id") is None:
+                    r_rows.append(-1)
+                    continue
+                sid = int(s["stop_id"])
+                pos = pos_by_stop.get(sid)
+                if pos is None:
+                    pos = pos_by_stop[sid] = len(stop_ids)
+                    stop_ids.append(sid)
+                    names.append(s.get("stop_name"))
+                    lats.append(lat)
+                    lons.append(lon)
+                    routes.append([])
+                if str(route) not in routes[pos]:
+                    routes[pos].append(str(route))
+                r_rows.append(pos)
+            self.route_lat[str(route)] = np.asarray(r_lat, dtype=np.float64)
+            self.route_rows[str(route)] = np.asarray(r_rows, dtype=np.int64)
+            self.route_lon[str(route)] = np.asarray(r_lon, dtype=np.float64)
+
+        self.stop_id = np.asarray(stop_ids, dtype=np.int64)
+        self.stop_name = names
+        self.lat = np.asarray(lats, dtype=np.float64)
+        self.lon = np.asarray(lons, dtype=np.float64)
+        self.routes = routes
+
+    def __len__(self) -> int:
+        return len(self.stop_id)
+
+    def _cell(self, lat, lon):
+        cx = np.floor(np.asarray(lon) * self._kx / self.cell_km).astype(np.int64)
+        cy = np.floor(np.asarray(lat) * self._ky / self.cell_km).astype(np.int64)
+        return cx, cy
+
+    def _candidates(self, cx: int, cy: int, ring: int, inner: int = -1) -> List[np.ndarray]:
+        """Bucket contents for cells with Chebyshev distance in (inner, ring] from (cx, cy)."""
+        out = []
+        for dx in range(-ring, ring + 1):
+            for dy in range(-ring, ring + 1):
+                if max(abs(dx), abs(dy)) <= inner:
+                    continue
+                rows = self.cells.get((cx + dx, cy + dy))
+                if rows is not None:
+                    out.append(rows)
+        return out
+
+    def within(self, coord, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Network stops within radius_km of coord -> (rows, distances_km), nearest first."""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        lat, lon = coord
+        cx, cy = self._cell(lat, lon)
+        ring = int(math.ceil(radius_km / self.cell_km))
+        parts = self._candidates(int(cx), int(cy), ring)
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows = np.concatenate(parts)
+        d = haversine_km_vec(lat, lon, self.lat[rows], self.lon[rows])
+        keep = d <= radius_km
+        rows, d = rows[keep], d[keep]
+        order = np.argsort(d, kind="stable")
+        return rows[order], d[order]
+
+    def nearest(self, coord, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest network stops -> (rows, distances_km), nearest first."""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        lat, lon = coord
+        cx, cy = (int(c) for c in self._cell(lat, lon))
+        k = min(int(k), len(self))
+        parts: List[np.ndarray] = []
+        # grow rings of cells; past MAX_RING a full vectorized scan is cheaper than more cells
+        for ring in range(self.MAX_RING + 1):
+            parts.extend(self._candidates(cx, cy, ring, ring - 1))
+            if sum(len(p) for p in parts) < k:
+                continue
+            rows = np.concatenate(parts)
+            d = haversine_km_vec(lat, lon, self.lat[rows], self.lon[rows])
+            order = np.argsort(d, kind="stable")[:k]
+            # every stop closer than ring * cell_km is guaranteed to be among the candidates
+            if d[order[-1]] <= ring * self.cell_km:
+                return rows[order], d[order]
+        d = haversine_km_vec(lat, lon, self.lat, self.lon)
+        order = np.argsort(d, kind="stable")[:k]
+        return order, d[order]
+
+    def nearest_on_route(self, route: str, coord, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest stops of one route -> (positions in the route's stop list, distances_km)."""
+        lats = self.route_lat.get(str(route))
+        if lats is None or not len(lats):
+            raise ValueError("route_stops empty")
+        d = haversine_km_vec(coord[0], coord[1], lats, self.route_lon[str(route)])
+        if k == 1:
+            i = int(np.argmin(d))
+            return np.asarray([i]), d[[i]]
+        order = np.argsort(d, kind="stable")[:k]
+        return order, d[order]
+
+    def within_on_route(self, route: str, coord, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        lats = self.route_lat.get(str(route))
+        if lats is None or not len(lats):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        d = haversine_km_vec(coord[0], coord[1], lats, self.route_lon[str(route)])
+        rows = np.flatnonzero(d <= radius_km)
+        order = np.argsort(d[rows], kind="stable")
+        return rows[order], d[rows][order]
+
+    def describe(self, row: int, distance_km: float) -> dict:
+        return {
+            "stop_id": int(self.stop_id[row]),
+            "stop_name": self.stop_name[row],
+            "lat": float(self.lat[row]),
+            "lon": float(self.lon[row]),
+            "distance_m": round(float(distance_km) * 1000.0, 1),
+            "routes": list(self.routes[row]),
+        }
+
+
+@lru_cache(maxsize=4)
+def get_spatial_index(index_path=None) -> StopSpatialIndex:
+    """Build (once per index file) the spatial index over a route index."""
+    return StopSpatialIndex(load_route_index(index_path))
@@ -0,0 +1,165 @@
+# backend/utils/token_cache.py
+from __future__ import annotations
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Set, Tuple
+
+TokenVerifier = Callable[[str], Dict[str, Any]]
+
+
+def firebase_verifier(token: str) -> Dict[str, Any]:
+    from firebase_admin import auth
+    return auth.verify_id_token(token)
+
+
+class LocalTokenVerifier:
+    """
+    Stand-in for Firebase in tests/benchmarks: HS256 JWTs signed with a shared secret.
+    Decoded claims look like Firebase's (uid is taken from `uid` or `sub`).
+    """
+
+    def __init__(self, secret: str):
+        self.secret = secret
+
+    def __call__(self, token: str) -> Dict[str, Any]:
+        import jwt  # PyJWT
+
+        claims = jwt.decode(token, self.secret, algorithms=["HS256"], options={"require": ["exp"]})
+        claims.setdefault("uid", claims.get("sub"))
+        return claims
+
+    def issue(self, uid: str, ttl_s: int = 3600, **claims: Any) -> str:
+        import jwt
+
+        now = int(time.time())
+        return jwt.encode({"uid": uid, "sub": uid, "iat": now, "exp": now + ttl_s, **claims}, self.secret, algorithm="HS256")
+
+
+class VerifiedTokenCache:
+    """
+    LRU of already-verified ID tokens.
+
+    - Keyed by SHA-256 of the token, so raw tokens are never kept in memory as keys.
+    - An entry expires at the token's `exp` claim, capped at `max_ttl_s` so revocations
+      propagate within that window even without explicit invalidation.
+    - `invalidate_uid` drops every cached token of a user (POST /auth/token_cache/invalidate,
+      e.g. after revoking the user's sessions); a verification already in flight for that
+      user is not cached afterwards either. `clear` does the same for everyone.
+    - Failed verifications are never cached.
+    """
+
+    def __init__(self, verifier: TokenVerifier, maxsize: int = 10_000, max_ttl_s: float = 300.0):
+        self.verifier = verifier
+        self.maxsize = int(maxsize)
+        self.max_ttl_s = float(max_ttl_s)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._by_uid: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        # bumped by every invalidation; a verify that started before an invalidation of its
+        # uid (or a clear) returns its claims but does not cache them
+        self._epoch = 0
+        self._uid_invalidated_at: Dict[str, int] = {}
+        self._cleared_at = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _drop(self, key: str) -> None:
+        _, claims = self._entries.pop(key)
+        uid = claims.get("uid")
+        keys = self._by_uid.get(uid)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_uid[uid]
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        key = self._key(token)
+        now = time.time()
+        cached = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    cached = entry[1]
+                else:
+                    self._drop(key)
+                    self.expirations += 1
+            if cached is None:
+                self.misses += 1
+                started = self._epoch
+        if cached is not None:
+            # every caller gets its own copy: a handler editing `user` must not change later requests
+            return copy.deepcopy(cached)
+
+        # verify outside the lock; concurrent misses for one token just verify twice
+        claims = self.verifier(token)
+
+        exp = claims.get("exp")
+        if exp is None:
+            return claims
+        expires_at = min(float(exp), now + self.max_ttl_s)
+        if expires_at <= now or self.maxsize <= 0:
+            return claims
+        stored = copy.deepcopy(claims)
+        uid = claims.get("uid")
+        with self._lock:
+            if self._cleared_at > started or self._uid_invalidated_at.get(uid, 0) > started:
+                return claims  # invalidated while this token was being verified
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (expires_at, stored)
+            if uid is not None:
+                self._by_uid.setdefault(uid, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return claims
+
+    def invalidate(self, token: str) -> bool:
+        key = self._key(token)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+                return True
+        return False
+
+    def invalidate_uid(self, uid: str) -> int:
+        with self._lock:
+            self._epoch += 1
+            self._uid_invalidated_at[uid] = self._epoch
+            keys = list(self._by_uid.get(uid, ()))
+            for key in keys:
+                self._drop(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._cleared_at = self._epoch
+            self._uid_invalidated_at.clear()  # covered by _cleared_at from here on
+            self._entries.clear()
+            self._by_uid.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,295 @@
+# backend/utils/transit_network.py
+"""
+Trip-level timetable of the dataset, laid out for round-based journey planning (RAPTOR).
+
+Trips with the same route and the same stop sequence form a *pattern*. Per pattern the
+scheduled arrival times of all its trips are one (n_trips, n_stops) block of int32 seconds
+after midnight, trips ordered by departure, stored row-major in one flat `times` array.
+Stops are numbered 0..n_stops-1 (sorted by stop_id); every stop lists the patterns
+serving it (CSR `stop_pattern_*`) and the stops within walking distance (CSR `transfer_*`).
+
+Predicted times are the scheduled ones plus the DelayCube mean delay of each
+(route, stop, day_of_week, hour) cell, computed once per day of week and cached
+column-major (see `predicted_times`).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .delay_cube import DelayCube
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371_000.0
+TIME_BITS = 21  # seconds after midnight fit in 21 bits (24 days)
+TIME_MASK = (1 << TIME_BITS) - 1
+PREDICTED_CACHE_DAYS = 2  # predicted timetables kept (one per day of week)
+
+NETWORK_ARRAYS = (
+    "stop_ids", "stop_lat", "stop_lon", "stop_name",
+    "pattern_route", "pattern_route_id", "pattern_code",
+    "pattern_stop_offsets", "pattern_stops", "pattern_slot",
+    "pattern_trip_offsets", "trip_ids", "pattern_time_offsets", "times",
+    "stop_pattern_offsets", "stop_pattern", "stop_pattern_pos",
+    "transfer_offsets", "transfer_to", "transfer_m",
+)
+
+
+def hms_series_to_seconds(values: pd.Series) -> np.ndarray:
+    """'HH:MM[:SS]' -> seconds after midnight, hours past 24 allowed (GTFS); NaN if unparseable."""
+    parts = values.astype(str).str.extract(r"^\s*(\d{1,3}):(\d{1,2})(?::(\d{1,2}))?\s*$")
+    h = pd.to_numeric(parts[0], errors="coerce")
+    m = pd.to_numeric(parts[1], errors="coerce")
+    s = pd.to_numeric(parts[2], errors="coerce").fillna(0)
+    return (h * 3600 + m * 60 + s).to_numpy(dtype=np.float64)
+
+
+def _haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    x = np.sin((phi2 - phi1) / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lon2 - lon1) / 2.0) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(x, 0.0, 1.0)))
+
+
+def _csr(rows: np.ndarray, n_rows: int, *columns: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Offsets + columns sorted by row."""
+    order = np.argsort(rows, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_rows))]).astype(np.int64)
+    return (offsets,) + tuple(c[order] for c in columns)
+
+
+def gather_csr(offsets: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Positions of every entry of the given CSR rows, concatenated (and their row index)."""
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    row_of = np.repeat(np.arange(len(rows)), counts)
+    first = np.cumsum(counts) - counts
+    return starts[row_of] + (np.arange(total) - first[row_of]), row_of
+
+
+class TransitNetwork:
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Optional[dict] = None):
+        self.arrays = arrays
+        self.meta = meta or {}
+        for name in NETWORK_ARRAYS:
+            setattr(self, name, arrays[name])
+        self._predicted: Dict[int, np.ndarray] = {}
+        self._predicted_lock = threading.Lock()
+        self._tree = None
+        # column g (pattern stop) of the column-major predicted timetable
+        sizes = np.diff(self.pattern_stop_offsets)
+        n_trips = np.diff(self.pattern_trip_offsets)
+        pattern_of = np.repeat(np.arange(len(sizes)), sizes)
+        pos = np.arange(len(self.pattern_stops)) - np.repeat(self.pattern_stop_offsets[:-1], sizes)
+        self.column_trips = n_trips[pattern_of]
+        self.column_start = self.pattern_time_offsets[:-1][pattern_of] + pos * self.column_trips
+        # equirectangular projection (metres) for the KD-tree
+        self._kx = float(np.cos(np.radians(np.mean(self.stop_lat)))) if len(self.stop_lat) else 1.0
+
+    @property
+    def n_stops(self) -> int:
+        return len(self.stop_ids)
+
+    @property
+    def n_patterns(self) -> int:
+        return len(self.pattern_route)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in self.arrays.values()))
+
+    # ----- build -----
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, delays: DelayCube, transfer_radius_m: float = 300.0) -> "TransitNetwork":
+        t0 = time.perf_counter()
+        seconds = hms_series_to_seconds(df["scheduled_arrival_time"])
+        keep = np.isfinite(seconds)
+        rows = pd.DataFrame({
+            "trip_id": df["trip_id"].astype(str).to_numpy()[keep],
+            "route_id": df["route_id"].astype(str).to_numpy()[keep],
+            "route_short_name": df["route_short_name"].astype(str).to_numpy()[keep],
+            "stop_id": df["stop_id"].to_numpy(dtype=np.int64)[keep],
+            "stop_sequence": df["stop_sequence"].to_numpy(dtype=np.int64)[keep],
+            "t": seconds[keep].astype(np.int64),
+        })
+        # one row per trip stop (the dataset repeats them across observed days)
+        rows = rows.sort_values(["trip_id", "stop_sequence", "t"], kind="mergesort")
+        rows = rows.drop_duplicates(["trip_id", "stop_sequence"]).reset_index(drop=True)
+
+        # stops
+        stops = (df.loc[keep, ["stop_id", "stop_lat", "stop_lon", "stop_name"]]
+                 .drop_duplicates("stop_id").sort_values("stop_id"))
+        stop_ids = stops["stop_id"].to_numpy(dtype=np.int64)
+        stop_idx = np.searchsorted(stop_ids, rows["stop_id"].to_numpy())
+
+        # trips -> patterns (same route, same stop sequence)
+        trip_col = rows["trip_id"].to_numpy()
+        bounds = np.flatnonzero(np.r_[True, trip_col[1:] != trip_col[:-1], True])
+        t_all = rows["t"].to_numpy()
+        rid_col, rsn_col = rows["route_id"].to_numpy(), rows["route_short_name"].to_numpy()
+        pattern_of: Dict[tuple, int] = {}
+        pattern_keys, pattern_trips = [], []
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            if hi - lo < 2:
+                continue  # a single stop cannot be ridden
+            key = (rid_col[lo], rsn_col[lo], stop_idx[lo:hi].astype(np.int32).tobytes())
+            p = pattern_of.get(key)
+            if p is None:
+                p = pattern_of[key] = len(pattern_keys)
+                pattern_keys.append(key)
+                pattern_trips.append([])
+            # arrival times never decrease along a trip
+            pattern_trips[p].append((trip_col[lo], np.maximum.accumulate(t_all[lo:hi])))
+
+        p_route, p_route_id, p_code, p_stops, p_slot, trip_ids, blocks = [], [], [], [], [], [], []
+        for (rid, rsn, stop_bytes), trips in zip(pattern_keys, pattern_trips):
+            pstops = np.frombuffer(stop_bytes, dtype=np.int32)
+            code = delays.route_code(rid, rsn)
+            p_route.append(rsn)
+            p_route_id.append(rid)
+            p_code.append(-1 if code is None else code)
+            p_stops.append(pstops)
+            p_slot.append(delays.slots_for(code, stop_ids[pstops]))
+            trips.sort(key=lambda tr: (int(tr[1][0]), int(tr[1][-1])))
+            trip_ids.extend(tr[0] for tr in trips)
+            blocks.append(np.vstack([tr[1] for tr in trips]).astype(np.int32).ravel())
+
+        sizes = [len(s) for s in p_stops]
+        n_stops, n_patterns = len(stop_ids), len(p_stops)
+        pattern_stops = np.concatenate(p_stops).astype(np.int32) if p_stops else np.zeros(0, np.int32)
+        pattern_stop_offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+        # stop -> (pattern, position) incidence
+        inc_pattern = np.repeat(np.arange(n_patterns, dtype=np.int32), sizes)
+        inc_pos = (np.arange(len(pattern_stops)) - np.repeat(pattern_stop_offsets[:-1], sizes)).astype(np.int32)
+        stop_pattern_offsets, stop_pattern, stop_pattern_pos = _csr(pattern_stops, n_stops, inc_pattern, inc_pos)
+
+        lat = stops["stop_lat"].to_numpy(dtype=np.float64)
+        lon = stops["stop_lon"].to_numpy(dtype=np.float64)
+        transfer_offsets, transfer_to, transfer_m = cls._transfers(lat, lon, transfer_radius_m)
+
+        arrays = {
+            "stop_ids": stop_ids,
+            "stop_lat": lat,
+            "stop_lon": lon,
+            "stop_name": np.asarray(stops["stop_name"].fillna("").astype(str).to_numpy(), dtype=str),
+            "pattern_route": np.asarray(p_route, dtype=str),
+            "pattern_route_id": np.asarray(p_route_id, dtype=str),
+            "pattern_code": np.asarray(p_code, dtype=np.int64),
+            "pattern_stop_offsets": pattern_stop_offsets,
+            "pattern_stops": pattern_stops,
+            "pattern_slot": np.concatenate(p_slot).astype(np.int64) if p_slot else np.zeros(0, np.int64),
+            "pattern_trip_offsets": np.concatenate([[0], np.cumsum([len(t) for t in pattern_trips])]).astype(np.int64),
+            "trip_ids": np.asarray(trip_ids, dtype=str),
+            "pattern_time_offsets": np.concatenate([[0], np.cumsum([len(b) for b in blocks])]).astype(np.int64),
+            "times": np.concatenate(blocks) if blocks else np.zeros(0, np.int32),
+            "stop_pattern_offsets": stop_pattern_offsets,
+            "stop_pattern": stop_pattern,
+            "stop_pattern_pos": stop_pattern_pos,
+            "transfer_offsets": transfer_offsets,
+            "transfer_to": transfer_to,
+            "transfer_m": transfer_m,
+        }
+        meta = {
+            "n_stops": n_stops,
+            "n_patterns": n_patterns,
+            "n_trips": len(trip_ids),
+            "n_transfers": int(len(transfer_to)),
+            "transfer_radius_m": float(transfer_radius_m),
+            "build_seconds": round(time.perf_counter() - t0, 2),
+        }
+        logger.info("Transit network: %d stops, %d patterns, %d trips, %d transfers (%.2fs)",
+                    n_stops, n_patterns, len(trip_ids), len(transfer_to), meta["build_seconds"])
+        return cls(arrays, meta)
+
+    @staticmethod
+    def _transfers(lat: np.ndarray, lon: np.ndarray, radius_m: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Walkable stop pairs (both directions) within radius_m, straight-line distance."""
+        from scipy.spatial import cKDTree
+
+        n = len(lat)
+        if n < 2 or radius_m <= 0:
+            return np.zeros(n + 1, np.int64), np.zeros(0, np.int32), np.zeros(0, np.float32)
+        kx = np.cos(np.radians(lat.mean()))
+        xy = np.column_stack([np.radians(lon) * kx, np.radians(lat)]) * EARTH_RADIUS_M
+        pairs = cKDTree(xy).query_pairs(radius_m, output_type="ndarray")
+        a = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        b = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        dist = _haversine_m(lat[a], lon[a], lat[b], lon[b])
+        within = dist <= radius_m
+        offsets, to, dist = _csr(a[within], n, b[within].astype(np.int32), dist[within].astype(np.float32))
+        return offsets, to, dist
+
+    # ----- lookups -----
+    def stop_index(self, stop_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.stop_ids, stop_id))
+        return i if i < len(self.stop_ids) and self.stop_ids[i] == stop_id else None
+
+    def stops_within(self, lat: float, lon: float, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(stop indices, metres) of the stops within radius_m of a coordinate, nearest first."""
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+
+            xy = np.column_stack([np.radians(self.stop_lon) * self._kx, np.radians(self.stop_lat)]) * EARTH_RADIUS_M
+            self._tree = cKDTree(xy)
+        q = np.array([np.radians(lon) * self._kx, np.radians(lat)]) * EARTH_RADIUS_M
+        idx = np.asarray(self._tree.query_ball_point(q, radius_m * 1.01), dtype=np.int64)
+        dist = _haversine_m(lat, lon, self.stop_lat[idx], self.stop_lon[idx])
+        keep = dist <= radius_m
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def pattern_block(self, p: int) -> np.ndarray:
+        """(n_trips, n_stops) scheduled times of pattern p."""
+        n_stops = int(self.pattern_stop_offsets[p + 1] - self.pattern_stop_offsets[p])
+        return self.times[self.pattern_time_offsets[p]:self.pattern_time_offsets[p + 1]].reshape(-1, n_stops)
+
+    def predicted_times(self, delays: DelayCube, dow: int) -> np.ndarray:
+        """
+        Scheduled times plus the mean delay of each (route, stop, dow, hour) cell, as one sorted
+        int64 array of `column << TIME_BITS | seconds`, column-major: column g (= index into
+        pattern_stops) holds its pattern's trips in order at [column_start[g], + column_trips[g]).
+        Early arrivals are not predicted (delays clamp at 0), and a trip never arrives before
+        the one ahead of it, so each column is sorted and one searchsorted finds the first
+        catchable trip at any number of stops.
+        """
+        cached = self._predicted.get(dow)
+        if cached is not None:
+            return cached
+        with self._predicted_lock:
+            cached = self._predicted.get(dow)
+            if cached is None:
+                cached = self._predict(delays, dow)
+                while len(self._predicted) >= PREDICTED_CACHE_DAYS:
+                    self._predicted.pop(next(iter(self._predicted)))
+                self._predicted[dow] = cached
+        return cached
+
+    def _predict(self, delays: DelayCube, dow: int) -> np.ndarray:
+        t0 = time.perf_counter()
+        out = np.empty(len(self.times), dtype=np.int64)
+        hours = (self.times // 3600) % 24
+        for p in range(self.n_patterns):
+            lo, hi = int(self.pattern_stop_offsets[p]), int(self.pattern_stop_offsets[p + 1])
+            tlo, thi = int(self.pattern_time_offsets[p]), int(self.pattern_time_offsets[p + 1])
+            sched = self.times[tlo:thi].reshape(-1, hi - lo)
+            slots = np.broadcast_to(self.pattern_slot[lo:hi], sched.shape)
+            code = int(self.pattern_code[p])
+            fallback = delays.route_mean[code] if code >= 0 else delays.overall_mean
+            delay = np.where(slots >= 0,
+                             delays.cube[np.maximum(slots, 0), dow, hours[tlo:thi].reshape(sched.shape)],
+                             fallback)
+            pred = sched + np.round(np.maximum(delay, 0.0) * 60.0).astype(np.int64)
+            pred = np.maximum.accumulate(pred, axis=0).T  # (n_stops, n_trips)
+            out[tlo:thi] = ((np.arange(lo, hi, dtype=np.int64)[:, None] << TIME_BITS) | pred).ravel()
+        logger.info("Predicted timetable for day %d in %.2fs", dow, time.perf_counter() - t0)
+        return out